@@ -2,59 +2,130 @@
 """
 Serveur Flask avec Socket.IO pour visualisation temps réel des données ESP32
 - Thread UDP non-bloquant (port 3333)
-- Broadcasting WebSocket vers tous les clients web
-- Buffer circulaire 60 secondes
+- Broadcasting WebSocket par lots (sensor_batch) vers tous les clients web ou un appareil
+- Session par appareil: buffers circulaires bornés, anomalies, compteurs
 - Logging CSV optionnel
 """
 
 import eventlet
 eventlet.monkey_patch()
+from eventlet import tpool
 
+import bisect
 import os
-import sys
-import json
 import socket
 import threading
-import csv
+import logging
 from datetime import datetime
-from collections import deque
 from flask import Flask, render_template, request
-from flask_socketio import SocketIO, emit
+from flask_socketio import SocketIO, emit, join_room, leave_room
+
+from src.services.anomaly_snapshots import MAX_POINTS as ANOMALY_MAX_POINTS, AnomalySnapshots, new_anomaly_id
+from src.services.anomaly_store import AnomalyStore
+from src.services.anomaly_writer import AnomalyWriter
+from src.services.classification import format_anomaly_log
+from src.services.devices import ALL_DEVICES_ROOM, DeviceRegistry, device_room
+from src.services.emit_scheduler import EmitScheduler
+from src.services.ingest_workers import IngestWorkerPool
+from src.services.logs import PeriodicSummary, setup_logging
+from src.services.packets import decode_datagram, normalize_packet
+from src.services.columnar import SENSOR_SCHEMA
+from src.services.recorder import ColumnarRecorder, CsvRecorder
+from src.services.ringstore import to_epoch
+from src.services.sensor_queries import parse_time
+from src.services.udp_batch import IngestCounters, configure_socket, drain
 
 # Configuration
 UDP_PORT = 3333
 UDP_HOST = '0.0.0.0'
 SAMPLE_RATE = 10  # Hz
+UDP_BATCH_SIZE = int(os.environ.get('UDP_BATCH_SIZE', '64'))  # Datagrammes max par lot
+UDP_RCVBUF = int(os.environ.get('UDP_RCVBUF', str(1024 * 1024)))  # Tampon noyau demandé (octets)
+INGEST_WORKERS = int(os.environ.get('INGEST_WORKERS', '0'))  # 0 = ingestion dans ce processus
+INGEST_SOCKET = os.environ.get('INGEST_SOCKET', '/tmp/esp32_ingest.sock')  # Socket Unix workers -> serveur
+BUFFER_RETENTION_SECONDS = float(os.environ.get('BUFFER_RETENTION_SECONDS', '900'))  # Par appareil
+BUFFER_RETENTION_SAMPLES = int(os.environ.get('BUFFER_RETENTION_SAMPLES', '0')) or None  # Prioritaire si défini
+BUFFER_SPILL_DIR = os.environ.get('BUFFER_SPILL_DIR', 'buffer_spill')  # Vide = pas de déversement disque
+HISTORY_WINDOW_SECONDS = float(os.environ.get('HISTORY_WINDOW_SECONDS', '300'))  # Fenêtre envoyée à la connexion
+HISTORY_DISPLAY_POINTS = int(os.environ.get('HISTORY_DISPLAY_POINTS', '3000'))  # Points max par série
+HISTORY_MAX_POINTS = 20000  # Plafond accepté pour get_history
+HISTORY_LOD_CAPACITY = int(os.environ.get('HISTORY_LOD_CAPACITY', '1024'))  # Seaux par niveau de pyramide
+MAX_DEVICES = int(os.environ.get('MAX_DEVICES', '512'))
+DEVICE_MEMORY_MB = float(os.environ.get('DEVICE_MEMORY_MB', '256'))  # Budget des buffers de tous les appareils (0 = MAX_DEVICES seul)
+UI_FRAME_RATE = int(os.environ.get('UI_FRAME_RATE', '30'))  # Hz par défaut des sensor_batch (20-60)
+CSV_FLUSH_ROWS = int(os.environ.get('CSV_FLUSH_ROWS', '500'))  # Flush après N lignes en attente...
+CSV_FLUSH_INTERVAL = float(os.environ.get('CSV_FLUSH_INTERVAL', '1'))  # ... ou après N secondes
+CSV_FSYNC_INTERVAL = float(os.environ.get('CSV_FSYNC_INTERVAL', '10'))  # Secondes entre deux fsync (0 = jamais)
+CSV_ROTATE_MB = float(os.environ.get('CSV_ROTATE_MB', '0'))  # Rotation par taille (0 = désactivée)
+CSV_ROTATE_SECONDS = float(os.environ.get('CSV_ROTATE_SECONDS', '0'))  # Rotation par durée (0 = désactivée)
+CSV_COMPRESS = os.environ.get('CSV_COMPRESS', '0') == '1'  # gzip des segments fermés
+RECORD_FORMATS = [f.strip() for f in os.environ.get('RECORD_FORMAT', 'csv').split(',') if f.strip()]  # csv, columnar
+COLUMNAR_CHUNK_ROWS = int(os.environ.get('COLUMNAR_CHUNK_ROWS', '4096'))  # Lignes par bloc .ecol
+ANOMALY_DB = os.environ.get('ANOMALY_DB', 'anomalies.db')  # Registre SQLite des anomalies
+ANOMALY_PRE_SECONDS = float(os.environ.get('ANOMALY_PRE_SECONDS', '10'))  # Contexte enregistré avant l'alerte
+ANOMALY_POST_SECONDS = float(os.environ.get('ANOMALY_POST_SECONDS', '10'))  # ... et après sa fin
+ANOMALY_CAPTURE_MAX_SECONDS = float(os.environ.get('ANOMALY_CAPTURE_MAX_SECONDS', '120'))  # Alerte la plus longue gardée en entier
+ANOMALY_COMPRESS = int(os.environ.get('ANOMALY_COMPRESS', '6'))  # Niveau zlib des signaux d'anomalie (0 = aucun)
+ANOMALY_WRITERS = int(os.environ.get('ANOMALY_WRITERS', '1'))  # Threads d'enregistrement des anomalies
+ANOMALY_QUEUE_SIZE = int(os.environ.get('ANOMALY_QUEUE_SIZE', '64'))  # Au-delà: l'appelant attend l'enregistrement (tpool)
+ECG_SAMPLE_RATE = float(os.environ.get('ECG_SAMPLE_RATE', '250'))  # Fréquence ECG attendue (réestimée d'après les temps reçus)
+HRV_WINDOW_SECONDS = float(os.environ.get('HRV_WINDOW_SECONDS', '60'))  # Fenêtre glissante RMSSD / SDNN
+LOG_SUMMARY_INTERVAL = float(os.environ.get('LOG_SUMMARY_INTERVAL', '60'))  # Secondes entre deux résumés
+
+# Journalisation: `log` pour les événements, `packet_log` (DEBUG, échantillonné) pour le détail par paquet
+log = logging.getLogger('flask_app')
+packet_log = logging.getLogger('flask_app.packets')
+summary = PeriodicSummary(log, interval=LOG_SUMMARY_INTERVAL, rates={
+    'packets': ('paquets/s', 1),
+    'anomalies': ('anomalies/min', 60),
+})
 
 # États globaux
 app = Flask(__name__, template_folder='templates')
 app.config['SECRET_KEY'] = 'esp32-realtime-monitor'
 socketio = SocketIO(app, cors_allowed_origins="*", async_mode='eventlet')
 
-# Buffer ILLIMITÉ pour stocker tout l'historique (pas de maxlen!)
-signal_buffer = deque()  # Stockage illimité
-accel_buffer = deque()   # Stockage illimité
+# Regroupement des échantillons en sensor_batch (une sérialisation par tick et par groupe)
+emit_scheduler = EmitScheduler(socketio, default_hz=UI_FRAME_RATE)
+
+# Sessions par appareil: buffers circulaires bornés (déversés sur disque),
+# pyramides min/max pour l'historique décimé, état d'anomalie et compteurs
+devices = DeviceRegistry(max_devices=MAX_DEVICES,
+                         memory_budget=DEVICE_MEMORY_MB * 1024 * 1024,
+                         retention_samples=BUFFER_RETENTION_SAMPLES,
+                         retention_seconds=BUFFER_RETENTION_SECONDS,
+                         sample_rate=SAMPLE_RATE, spill_dir=BUFFER_SPILL_DIR,
+                         lod_capacity=HISTORY_LOD_CAPACITY,
+                         capture_options={'pre_seconds': ANOMALY_PRE_SECONDS,
+                                          'post_seconds': ANOMALY_POST_SECONDS,
+                                          'max_seconds': ANOMALY_CAPTURE_MAX_SECONDS},
+                         heart_options={'sample_rate': ECG_SAMPLE_RATE,
+                                        'window': HRV_WINDOW_SECONDS})
 session_start_time = None  # Heure de début de session
 
-# État CSV
+# État CSV (écriture par lots dans un thread dédié par format, voir src/services/recorder.py)
 csv_logging = False
-csv_file = None
-csv_writer = None
+csv_recorders = []
 csv_lock = threading.Lock()
 
 # Statistiques
 stats = {
     'packets_received': 0,
+    'total_samples': 0,
+    'devices': 0,
     'last_packet_time': None,
     'udp_running': False
 }
 
-# État anomalies
+# État anomalies (registre SQLite ; anomalies_log.csv n'est plus qu'importé une fois puis exporté à la demande)
 anomalies_file = 'anomalies_log.csv'
-anomalies_lock = threading.Lock()
-anomaly_active = False
-anomaly_start_time = None
-anomaly_data = []
+anomaly_store = AnomalyStore(ANOMALY_DB, legacy_csv=anomalies_file)
+anomaly_snapshots = AnomalySnapshots('anomalies_data', level=ANOMALY_COMPRESS)
+anomaly_writer = AnomalyWriter(lambda job: save_anomaly(*job), workers=ANOMALY_WRITERS,
+                               queue_size=ANOMALY_QUEUE_SIZE, offload=tpool.execute)
+
+# Compteurs d'ingestion par lots (tailles de lots, pertes noyau)
+ingest_counters = IngestCounters(UDP_BATCH_SIZE)
 
 # Seuils de détection d'anomalies
 ANOMALY_BPM_MIN = 40
@@ -63,569 +134,525 @@ ANOMALY_ACCEL_THRESHOLD = 1.5  # Accélération >1.5g considérée comme anormal
 ANOMALY_MIN_DURATION = 2  # Secondes minimum pour confirmer une anomalie
 
 
-def init_anomalies_log():
-    """Initialise le fichier CSV des anomalies"""
-    if not os.path.exists(anomalies_file):
-        with open(anomalies_file, 'w', newline='') as f:
-            writer = csv.writer(f)
-            writer.writerow([
-                'start_time', 'end_time', 'duration_seconds', 
-                'anomaly_type', 'bpm_min', 'bpm_max', 'bpm_avg',
-                'accel_x_max', 'accel_y_max', 'accel_z_max',
-                'severity', 'description'
-            ])
-
-
-def calculate_bpm(raw_value, prev_values):
+def start_csv_logging():
     """
-    Calcule le BPM à partir du signal cardiaque brut
-    Utilise une détection de pics simple
+    Démarre l'enregistrement (segments data_esp32_*.csv et/ou *.ecol selon RECORD_FORMAT)
+    Retourne le nom du premier segment
     """
-    # Pour une implémentation basique, on peut retourner une valeur mockée
-    # ou implémenter un vrai algorithme de détection de pics
-    # Ici, on suppose que l'ESP32 envoie déjà le BPM calculé
-    return None
-
-
-def validate_bpm(bpm):
-    """Valide que le BPM est dans la plage acceptable (40-180)"""
-    if bpm is None:
-        return None
-    try:
-        bpm_val = float(bpm)
-        if 40 <= bpm_val <= 180:
-            return bpm_val
-        return None
-    except (ValueError, TypeError):
-        return None
-
-
-def start_csv_logging():
-    """Démarre l'enregistrement CSV"""
-    global csv_logging, csv_file, csv_writer
+    global csv_logging, csv_recorders
     
     with csv_lock:
         if csv_logging:
-            return
-        
-        timestamp = datetime.now().strftime('%Y%m%d_%H%M%S')
-        filename = f'data_esp32_{timestamp}.csv'
+            return csv_recorders[0].filename
         
-        csv_file = open(filename, 'w', newline='')
-        csv_writer = csv.writer(csv_file)
-        csv_writer.writerow([
-            'timestamp', 'ecg', 'bpm', 
-            'accel_x', 'accel_y', 'accel_z'
-        ])
+        options = {
+            'prefix': 'data_esp32',
+            'flush_rows': CSV_FLUSH_ROWS,
+            'flush_interval': CSV_FLUSH_INTERVAL,
+            'fsync_interval': CSV_FSYNC_INTERVAL,
+            'rotate_bytes': int(CSV_ROTATE_MB * 1024 * 1024) or None,
+            'rotate_seconds': CSV_ROTATE_SECONDS or None,
+        }
+        csv_recorders = []
+        if 'columnar' in RECORD_FORMATS:
+            csv_recorders.append(ColumnarRecorder(SENSOR_SCHEMA, chunk_rows=COLUMNAR_CHUNK_ROWS, **options))
+        if 'csv' in RECORD_FORMATS or not csv_recorders:
+            csv_recorders.insert(0, CsvRecorder([name for name, _ in SENSOR_SCHEMA],
+                                                compress=CSV_COMPRESS, **options))
+        filename = [recorder.start() for recorder in csv_recorders][0]
         csv_logging = True
         
-        print(f"📝 Enregistrement CSV démarré: {filename}")
+        log.info("📝 Enregistrement CSV démarré: %s", filename)
         return filename
 
 
 def stop_csv_logging():
-    """Arrête l'enregistrement CSV"""
-    global csv_logging, csv_file, csv_writer
+    """
+    Arrête l'enregistrement CSV (les lignes en attente sont écrites)
+    Vidage et join des threads d'écriture dans tpool : le hub eventlet n'est pas bloqué
+    """
+    global csv_logging
     
     with csv_lock:
         if not csv_logging:
             return
-        
         csv_logging = False
-        if csv_file:
-            csv_file.close()
-            csv_file = None
-            csv_writer = None
-        
-        print("⏹️  Enregistrement CSV arrêté")
+        recorders = list(csv_recorders)
+    
+    tpool.execute(lambda: [recorder.stop() for recorder in recorders])
+    log.info("⏹️  Enregistrement CSV arrêté")
 
 
 def log_to_csv(data):
     """Enregistre une ligne dans le CSV si activé"""
-    global csv_writer
-    
-    with csv_lock:
-        if csv_logging and csv_writer:
-            try:
-                csv_writer.writerow([
-                    data.get('timestamp', datetime.now().isoformat()),
-                    data.get('ecg', ''),
-                    data.get('bpm', ''),
-                    data.get('accel_x', ''),
-                    data.get('accel_y', ''),
-                    data.get('accel_z', '')
-                ])
-                csv_file.flush()
-            except Exception as e:
-                print(f"❌ Erreur CSV: {e}")
-
-
-def classifier_anomalie(packet_data):
+    log_batch_to_csv([data])
+
+
+def log_batch_to_csv(rows):
+    """Met en file un lot de lignes pour le CSV si activé (écriture et flush en arrière-plan)"""
+    if not csv_logging:
+        return
+    rows = [[
+            data.get('timestamp', datetime.now().isoformat()),
+            data.get('ecg', ''),
+            data.get('bpm', ''),
+            data.get('accel_x', ''),
+            data.get('accel_y', ''),
+            data.get('accel_z', '')
+        ] for data in rows]
+    for recorder in csv_recorders:
+        recorder.write_rows(rows)
+
+
+def save_anomaly(window, device_id=None):
     """
-    Classification des anomalies basée sur les données ESP32
-    L'ESP32 envoie déjà le type et la sévérité détectés
-    
-    Format attendu:
-    {
-        "anomaly_type": "FALL_CRITICAL" | "CONVULSION" | "FALL_DETECTED" | ...
-        "anomaly_severity": "CRITICAL" | "MODERATE" | "NONE"
-        "bpm": float,
-        "signal_valid": bool,
-        "bpm_valid": bool,
-        "alert": bool
-    }
-    
-    Retourne: (type_fr, severity_fr, niveau_urgence, action, delai)
+    Enregistre une anomalie dans le registre SQLite et ses signaux en fichier colonnaire
+    window: fenêtre extraite du ring de capture (AnomalyCapture.take), contexte avant/après compris
+    Exécuté par les threads d'anomaly_writer (hors boucle de réception)
     """
-    anomaly_type = packet_data.get('anomaly_type', 'NONE')
-    anomaly_severity = packet_data.get('anomaly_severity', 'NONE')
-    bpm = packet_data.get('bpm')
-    bpm_valid = packet_data.get('bpm_valid', False)
-    signal_valid = packet_data.get('signal_valid', False)
-    
-    # Mapping types ESP32 -> Français
-    type_mapping = {
-        'FALL_CRITICAL': 'chute_critique',
-        'CONVULSION': 'convulsion',
-        'FALL_DETECTED': 'chute_détectée',
-        'DIFFICULTY_STANDING': 'difficulté_relever',
-        'BPM_CRITICAL_LOW': 'bradycardie_critique',
-        'BPM_CRITICAL_HIGH': 'tachycardie_critique',
-        'BPM_LOW': 'bradycardie_légère',
-        'NONE': 'aucune'
-    }
-    
-    type_fr = type_mapping.get(anomaly_type, anomaly_type.lower())
-    
-    # === CLASSIFICATION SELON SÉVÉRITÉ ESP32 ===
-    
-    # ANOMALIES CRITIQUES - Intervention immédiate
-    if anomaly_severity == "CRITICAL":
+    try:
+        start_time, end_time = window['start_time'], window['end_time']
+        duration = (end_time - start_time).total_seconds()
+        columns, trigger, end = window['columns'], window['trigger'], window['end']
         
-        if anomaly_type == "FALL_CRITICAL":
-            return (
-                type_fr,
-                'critique',
-                'URGENCE_MAXIMALE',
-                'Chute avec immobilité - Personne possiblement inconsciente',
-                0  # Intervention immédiate
-            )
+        # Calculer les statistiques (échantillons en alerte uniquement, NaN = absent)
+        bpms = [v for v in columns['bpm'][trigger:end] if v == v]
+        bpm_min = min(bpms) if bpms else None
+        bpm_max = max(bpms) if bpms else None
+        bpm_avg = sum(bpms) / len(bpms) if bpms else None
         
-        elif anomaly_type == "CONVULSION":
-            return (
-                type_fr,
-                'critique',
-                'URGENCE_MEDICALE',
-                'Convulsion détectée après chute',
-                0  # Intervention immédiate
-            )
+        accel_x_max, accel_y_max, accel_z_max = (
+            max([abs(v) for v in columns[name][trigger:end] if v == v], default=0.0)
+            for name in ('accel_x', 'accel_y', 'accel_z'))
         
-        elif anomaly_type == "FALL_DETECTED":
-            return (
-                type_fr,
-                'critique',
-                'SURVEILLANCE_ACTIVE',
-                'Chute détectée - Analyse en cours (5s)',
-                5  # Attendre analyse
-            )
+        # Déterminer le type d'anomalie (déjà analysé lors de la détection)
+        label = window['labels'][0] if window['labels'] else {}
+        anomaly_type = label.get('anomaly_type', 'inconnue')
+        severity = label.get('severity', 'modéré')
         
-        elif anomaly_type == "BPM_CRITICAL_LOW":
-            bpm_str = f"{bpm:.0f}" if bpm else "?"
-            return (
-                type_fr,
-                'critique',
-                'ALERTE_MEDICALE',
-                f'Bradycardie sévère: {bpm_str} bpm (< 35)',
-                10
-            )
+        log.debug("💾 Sauvegarde anomalie: %s | Sévérité: %s", anomaly_type, severity.upper())
         
-        elif anomaly_type == "BPM_CRITICAL_HIGH":
-            bpm_str = f"{bpm:.0f}" if bpm else "?"
-            return (
-                type_fr,
-                'critique',
-                'ALERTE_MEDICALE',
-                f'Tachycardie sévère: {bpm_str} bpm (> 150)',
-                10
-            )
+        # Créer un ID unique pour l'anomalie (plusieurs appareils peuvent démarrer dans la même seconde)
+        anomaly_id = new_anomaly_id(start_time)
         
-        else:
-            # Type critique inconnu
-            return (
-                type_fr,
-                'critique',
-                'ALERTE_CRITIQUE',
-                f'Anomalie critique: {anomaly_type}',
-                0
-            )
-    
-    # ANOMALIES MODÉRÉES - Surveillance renforcée
-    elif anomaly_severity == "MODERATE":
+        # Sauvegarder les signaux (colonnes compressées) pour visualisation
+        snapshot_file = anomaly_snapshots.save(anomaly_id, {
+            'id': anomaly_id,
+            'device_id': device_id,
+            'start_time': start_time.isoformat(),
+            'end_time': end_time.isoformat(),
+            'duration': duration,
+            'type': anomaly_type,
+            'severity': severity,
+            'trigger': trigger,
+            'end': end,
+            'pre_seconds': ANOMALY_PRE_SECONDS,
+            'post_seconds': ANOMALY_POST_SECONDS,
+            'truncated': window['truncated']
+        }, columns, window['labels'])
         
-        if anomaly_type == "DIFFICULTY_STANDING":
-            return (
-                type_fr,
-                'grave',  # On garde 'grave' pour l'affichage (orange)
-                'ASSISTANCE_SUGGEREE',
-                'Difficulté à se relever - Chutes multiples',
-                30
-            )
+        # Description
+        description = f"Anomalie détectée: {anomaly_type}"
+        if bpm_min and bpm_min < ANOMALY_BPM_MIN:
+            description += f" | BPM bas: {bpm_min:.0f}"
+        if bpm_max and bpm_max > ANOMALY_BPM_MAX:
+            description += f" | BPM élevé: {bpm_max:.0f}"
+        if max(accel_x_max, accel_y_max, accel_z_max) > ANOMALY_ACCEL_THRESHOLD:
+            description += f" | Mouvement intense"
         
-        elif anomaly_type == "BPM_LOW":
-            bpm_str = f"{bpm:.0f}" if bpm else "?"
-            return (
-                type_fr,
-                'modéré',
-                'INFORMATION',
-                f'BPM légèrement bas: {bpm_str} bpm (< 50)',
-                None
-            )
+        # Enregistrer dans le registre des anomalies
+        anomaly_store.add({
+            'id': anomaly_id,
+            'device_id': device_id,
+            'start_time': start_time.isoformat(),
+            'end_time': end_time.isoformat(),
+            'duration_seconds': duration,
+            'anomaly_type': anomaly_type,
+            'bpm_min': bpm_min,
+            'bpm_max': bpm_max,
+            'bpm_avg': bpm_avg,
+            'accel_x_max': accel_x_max,
+            'accel_y_max': accel_y_max,
+            'accel_z_max': accel_z_max,
+            'severity': severity,
+            'description': description
+        })
         
-        else:
-            return (
-                type_fr,
-                'modéré',
-                'SURVEILLANCE',
-                f'Anomalie modérée: {anomaly_type}',
-                None
-            )
-    
-    # Pas d'anomalie
-    else:
-        return (
-            'aucune',
-            'normal',
-            'MONITORING',
-            'Données normales',
-            None
-        )
+        log.warning("⚠️  ANOMALIE ENREGISTRÉE: %s | Durée: %.1fs | Sévérité: %s | Données: %s",
+                    anomaly_type, duration, severity, snapshot_file,
+                    extra={'device_id': device_id, 'anomaly_id': anomaly_id})
+        
+        # Retourner l'anomalie pour broadcast
+        return {
+            'id': anomaly_id,
+            'device_id': device_id,
+            'start_time': start_time.isoformat(),
+            'end_time': end_time.isoformat(),
+            'duration': duration,
+            'type': anomaly_type,
+            'severity': severity,
+            'bpm_min': bpm_min,
+            'bpm_max': bpm_max,
+            'bpm_avg': bpm_avg,
+            'accel_max': max(accel_x_max, accel_y_max, accel_z_max),
+            'description': description
+        }
+        
+    except Exception as e:
+        log.exception("❌ Erreur sauvegarde anomalie: %s", e)
+        return None
 
 
-def format_anomaly_log(type_fr, severity_fr, niveau_urgence, message, delai):
+def finish_capture(device, generation=None):
     """
-    Formate le log d'anomalie pour affichage
+    Met en file l'enregistrement de l'anomalie terminée de l'appareil avec son contexte
+    (fin de la fenêtre post-déclenchement, ou début d'une nouvelle alerte) ; sans effet si déjà fait.
     """
-    emoji_map = {
-        'critique': '🚨',
-        'grave': '⛔',
-        'modéré': '⚠️',
-        'normal': '✅'
-    }
-    
-    emoji = emoji_map.get(severity_fr, '❓')
-    delai_str = f"{delai}s" if delai is not None else "aucun"
+    window = device.capture.take(generation)
+    if window is None:
+        return
+    if window['truncated']:
+        log.warning("⚠️  Anomalie [%s] tronquée: début écrasé dans le ring de capture (%d échantillons, %.0f s)",
+                    device.device_id, device.capture.ring.capacity, device.capture.seconds,
+                    extra={'device_id': device.device_id})
+    job = (window, device.device_id)
+    result = anomaly_writer.submit(job)
+    if result is not True:
+        # File pleine: enregistrée dans tpool, ce greenlet attend (pas la boucle)
+        anomaly_saved(job, result)
+
+
+def anomaly_saved(job, saved_anomaly):
+    """Diffuse l'anomalie enregistrée (identifiant, statistiques) une fois écrite"""
+    if saved_anomaly:
+        socketio.emit('anomaly_saved', saved_anomaly, namespace='/')
+
+
+def handle_packet(data, addr):
+    """
+    Traite un datagramme ESP32 reçu directement (JSON ou trame binaire)
+    Retourne les lignes CSV correspondantes (une par échantillon)
+    """
+    packets = decode_datagram(data)
+    if not packets:
+        summary.incr('invalid')
+        packet_log.debug("⚠️  Paquet invalide de %s: %r", addr, data[:100])
+        return []
+    packet_log.debug("✅ Paquet reçu de %s: %d échantillon(s)", addr, len(packets))
     
-    return f"{emoji} {severity_fr.upper()} | {niveau_urgence} | {message} | Délai: {delai_str}"
+    samples = [normalize_packet(packet, addr) for packet in packets]
+    feed_heart(samples)
+    return [handle_sample(sample) for sample in samples]
 
 
-def save_anomaly(start_time, end_time, anomaly_data_buffer):
+def feed_heart(samples):
     """
-    Sauvegarde une anomalie dans le fichier CSV et les données brutes en JSON
+    BPM côté serveur: alimente les moteurs cardiaques par blocs (HeartRateEngine.process),
+    un appel par suite d'échantillons consécutifs d'un même appareil (trame binaire, lot des workers)
+    Le RR de chaque battement détecté est ajouté à l'échantillon ECG le plus proche du R (sample['rr'])
     """
-    with anomalies_lock:
-        try:
-            duration = (end_time - start_time).total_seconds()
-            
-            # Calculer les statistiques
-            bpms = [d['bpm'] for d in anomaly_data_buffer if d.get('bpm') is not None]
-            bpm_min = min(bpms) if bpms else None
-            bpm_max = max(bpms) if bpms else None
-            bpm_avg = sum(bpms) / len(bpms) if bpms else None
-            
-            accel_x_max = max([abs(d['accel_x']) for d in anomaly_data_buffer])
-            accel_y_max = max([abs(d['accel_y']) for d in anomaly_data_buffer])
-            accel_z_max = max([abs(d['accel_z']) for d in anomaly_data_buffer])
-            
-            # Déterminer le type d'anomalie (déjà analysé lors de la détection)
-            anomaly_type = anomaly_data_buffer[0].get('anomaly_type', 'inconnue')
-            severity = anomaly_data_buffer[0].get('severity', 'modéré')
-            
-            print(f"   💾 Sauvegarde anomalie: {anomaly_type} | Sévérité: {severity.upper()}")
-            
-            # Créer un ID unique pour l'anomalie
-            anomaly_id = start_time.strftime('%Y%m%d_%H%M%S')
+    start, count = 0, len(samples)
+    while start < count:
+        device_id = samples[start]['device_id']
+        stop = start + 1
+        while stop < count and samples[stop]['device_id'] == device_id:
+            stop += 1
+        device = devices.get(device_id)
+        times, values, ecg_samples = [], [], []
+        for sample in samples[start:stop]:
+            if sample['ecg'] is not None:
+                times.append(to_epoch(sample['timestamp']))
+                values.append(sample['ecg'])
+                ecg_samples.append(sample)
+        if times:
+            beats = device.heart.process(times, values)
+            device.track_rate()
+            for beat_time, rr in beats:
+                i = bisect.bisect_left(times, beat_time)
+                if i == len(times) or (i and beat_time - times[i - 1] < times[i] - beat_time):
+                    i -= 1
+                ecg_samples[i]['rr'] = rr
+        else:
+            # Pas d'ECG: le temps avance quand même (rythme perdu si plus aucun battement)
+            device.heart.advance(to_epoch(samples[stop - 1]['timestamp']))
+        start = stop
+
+
+def handle_sample(sample):
+    """
+    Traite un échantillon normalisé (anomalies, buffers, broadcast), après feed_heart
+    Retourne la ligne CSV correspondante
+    """
+    stats['packets_received'] += 1
+    summary.incr('packets')
+    
+    # Session de l'appareil émetteur (créée au premier paquet)
+    device = devices.get(sample['device_id'])
+    device.packets_received += 1
+    device.last_seen = datetime.now()
+    lost = device.sequence.update(sample['seq'])
+    if lost:
+        stats['frames_lost'] = stats.get('frames_lost', 0) + lost
+        summary.incr('frames_lost', lost)
+        packet_log.debug("⚠️  %d trame(s) perdue(s) pour %s", lost, device.device_id)
+    
+    # Extraction des données
+    timestamp = sample['timestamp']
+    ecg_value = sample['ecg']
+    bpm = sample['bpm']
+    accel_x = sample['accel_x']
+    accel_y = sample['accel_y']
+    accel_z = sample['accel_z']
+    
+    # BPM côté serveur (ECG brut, moteur alimenté par feed_heart) : remplace celui de
+    # l'ESP32 quand il manque ou qu'il est marqué invalide (None si aucun battement récent)
+    sample_time = to_epoch(timestamp)
+    rr = sample.get('rr')
+    bpm_source = 'esp32'
+    if bpm is None or not sample['bpm_valid']:
+        server_bpm = device.heart.bpm
+        if server_bpm is not None:
+            bpm = round(server_bpm)
+            bpm_source = 'server'
+    
+    # RÉCEPTION DES ALERTES DEPUIS L'ESP32
+    # L'ESP32 envoie le champ "alert": true/false + données d'anomalie
+    label = None  # Classification de l'échantillon (ring de capture), None hors alerte
+    if sample['alert']:
+        # Anomalie déjà classée lors de la normalisation
+        type_fr, severity, niveau_urgence, message, delai = sample['classification']
+        
+        packet_log.debug("⚠️  Alerte ESP32 [%s]: %s / %s | BPM: %s (valide: %s) | Qualité: %s",
+                         device.device_id, sample['anomaly_type'], sample['anomaly_severity'],
+                         bpm, sample['bpm_valid'], sample['signal_quality'])
+        
+        if not device.anomaly_active:
+            # Début d'une nouvelle anomalie (détail complet une seule fois par anomalie)
+            if device.capture.pending:
+                # Fenêtre post-déclenchement de la précédente écourtée
+                finish_capture(device)
+            device.anomaly_active = True
+            device.anomaly_start_time = datetime.now()
+            device.capture.trigger(device.anomaly_start_time)
+            summary.incr('anomalies')
+            log.warning("🚨 DÉBUT ANOMALIE [%s]\n%s\n   Type ESP32: %s | Sévérité ESP32: %s",
+                        device.device_id,
+                        format_anomaly_log(type_fr, severity, niveau_urgence, message, delai),
+                        sample['anomaly_type'], sample['anomaly_severity'],
+                        extra={'device_id': device.device_id})
             
-            # Sauvegarder les données brutes en JSON pour visualisation
-            json_dir = 'anomalies_data'
-            if not os.path.exists(json_dir):
-                os.makedirs(json_dir)
+            # Broadcaster alerte immédiate avec toutes les infos
+            socketio.emit('anomaly_alert', {
+                'device_id': device.device_id,
+                'type': type_fr,
+                'type_esp32': sample['anomaly_type'],
+                'severity': severity,
+                'severity_esp32': sample['anomaly_severity'],
+                'niveau_urgence': niveau_urgence,
+                'message': message,
+                'delai_intervention': delai,
+                'bpm': bpm,
+                'bpm_valid': sample['bpm_valid'],
+                'accel_max': max(abs(accel_x), abs(accel_y), abs(accel_z)),
+                'signal_quality': sample['signal_quality'],
+                'timestamp': device.anomaly_start_time.isoformat()
+            }, namespace='/')
+        
+        # Classification de l'échantillon (dédoublonnée par le ring de capture)
+        label = {
+            'anomaly_type': type_fr,
+            'anomaly_type_esp32': sample['anomaly_type'],
+            'severity': severity,
+            'severity_esp32': sample['anomaly_severity'],
+            'niveau_urgence': niveau_urgence,
+            'message': message,
+            'delai_intervention': delai
+        }
+    else:
+        if device.anomaly_active:
+            # Fin de l'anomalie
+            anomaly_end_time = datetime.now()
+            duration = (anomaly_end_time - device.anomaly_start_time).total_seconds()
             
-            json_file = os.path.join(json_dir, f'anomaly_{anomaly_id}.json')
-            with open(json_file, 'w') as f:
-                json.dump({
-                    'id': anomaly_id,
-                    'start_time': start_time.isoformat(),
-                    'end_time': end_time.isoformat(),
+            # Sauvegarder seulement si durée >= ANOMALY_MIN_DURATION, après la fenêtre post-déclenchement
+            if duration >= ANOMALY_MIN_DURATION:
+                generation = device.capture.end(anomaly_end_time)
+                eventlet.spawn_after(ANOMALY_POST_SECONDS, finish_capture, device, generation)
+                device.anomalies += 1
+                
+                # Broadcaster la fin de l'anomalie tout de suite (l'enregistrement suit: anomaly_saved)
+                first_label = device.capture.labels[0] if device.capture.labels else {}
+                socketio.emit('anomaly_end', {
+                    'device_id': device.device_id,
+                    'start_time': device.anomaly_start_time.isoformat(),
+                    'end_time': anomaly_end_time.isoformat(),
                     'duration': duration,
-                    'type': anomaly_type,
-                    'severity': severity,
-                    'data': anomaly_data_buffer
-                }, f)
-            
-            # Description
-            description = f"Anomalie détectée: {anomaly_type}"
-            if bpm_min and bpm_min < ANOMALY_BPM_MIN:
-                description += f" | BPM bas: {bpm_min:.0f}"
-            if bpm_max and bpm_max > ANOMALY_BPM_MAX:
-                description += f" | BPM élevé: {bpm_max:.0f}"
-            if max(accel_x_max, accel_y_max, accel_z_max) > ANOMALY_ACCEL_THRESHOLD:
-                description += f" | Mouvement intense"
-            
-            # Écrire dans le fichier CSV
-            with open(anomalies_file, 'a', newline='') as f:
-                writer = csv.writer(f)
-                writer.writerow([
-                    start_time.isoformat(),
-                    end_time.isoformat(),
-                    f"{duration:.1f}",
-                    anomaly_type,
-                    f"{bpm_min:.0f}" if bpm_min else '',
-                    f"{bpm_max:.0f}" if bpm_max else '',
-                    f"{bpm_avg:.0f}" if bpm_avg else '',
-                    f"{accel_x_max:.3f}",
-                    f"{accel_y_max:.3f}",
-                    f"{accel_z_max:.3f}",
-                    severity,
-                    description
-                ])
-            
-            print(f"⚠️  ANOMALIE ENREGISTRÉE: {anomaly_type} | Durée: {duration:.1f}s | Sévérité: {severity}")
-            print(f"   💾 Données sauvegardées: {json_file}")
-            
-            # Retourner l'anomalie pour broadcast
-            return {
-                'id': anomaly_id,
-                'start_time': start_time.isoformat(),
-                'end_time': end_time.isoformat(),
-                'duration': duration,
-                'type': anomaly_type,
-                'severity': severity,
-                'bpm_min': bpm_min,
-                'bpm_max': bpm_max,
-                'bpm_avg': bpm_avg,
-                'accel_max': max(accel_x_max, accel_y_max, accel_z_max),
-                'description': description
-            }
+                    'type': first_label.get('anomaly_type', 'inconnue'),
+                    'severity': first_label.get('severity', 'modéré')
+                }, namespace='/')
+                log.info("✅ FIN ANOMALIE [%s] | Durée: %.1fs", device.device_id, duration)
+            else:
+                device.capture.cancel()
+                log.info("⏭️  Anomalie ignorée [%s] (durée < %ss)", device.device_id, ANOMALY_MIN_DURATION)
             
-        except Exception as e:
-            print(f"❌ Erreur sauvegarde anomalie: {e}")
-            import traceback
-            traceback.print_exc()
-            return None
+            device.anomaly_active = False
+            device.anomaly_start_time = None
+    
+    # Préparer les données pour broadcast
+    data_packet = {
+        'device_id': device.device_id,
+        'timestamp': timestamp,
+        'ecg': ecg_value,
+        'bpm': bpm,
+        'bpm_source': bpm_source,
+        'accel': {
+            'x': round(accel_x, 3),
+            'y': round(accel_y, 3),
+            'z': round(accel_z, 3)
+        }
+    }
+    if rr is not None:
+        data_packet['rr'] = round(rr, 1)
+    
+    # Ajouter aux buffers (ring de capture: chaque échantillon, contexte des anomalies)
+    device.capture.append(sample_time, ecg_value, bpm, accel_x, accel_y, accel_z,
+                          sample['bpm_valid'], sample['signal_valid'], sample['signal_quality'], label)
+    if ecg_value is not None:
+        device.signal_history.append(sample_time, ecg_value, bpm)
+        stats['total_samples'] += 1
+    
+    device.accel_history.append(sample_time, accel_x, accel_y, accel_z)
+    
+    # Broadcaster via WebSocket (regroupé par emit_scheduler): vue globale + room de l'appareil
+    emit_scheduler.push((ALL_DEVICES_ROOM, device.room), data_packet)
+    
+    # Détail par paquet: DEBUG uniquement, échantillonné (voir LOG_PACKET_RATE)
+    packet_log.debug("📊 Paquet #%d [%s] | BPM: %s | ECG: %s | Accel: X=%.2f Y=%.2f Z=%.2f",
+                     stats['packets_received'], device.device_id, bpm or '--',
+                     '--' if ecg_value is None else ecg_value, accel_x, accel_y, accel_z)
+    
+    # Ligne CSV, écrite une fois par lot par udp_receiver_thread
+    return {
+        'timestamp': timestamp,
+        'ecg': ecg_value or '',
+        'bpm': bpm or '',
+        'accel_x': accel_x,
+        'accel_y': accel_y,
+        'accel_z': accel_z
+    }
 
 
-def udp_receiver_thread():
-    """Thread UDP non-bloquant pour recevoir les données ESP32"""
-    global stats, session_start_time
+def finish_batch(previous_count, csv_rows):
+    """Fin de lot: stats, broadcast périodique des stats et écriture CSV"""
+    if not csv_rows:
+        return
     
+    # Mise à jour des stats (une fois par lot)
+    now = datetime.now()
+    stats['devices'] = len(devices)
+    stats['last_packet_time'] = now.isoformat()
+    if session_start_time:
+        stats['session_duration'] = (now - session_start_time).total_seconds()
+    
+    # Broadcaster les stats toutes les 10 paquets
+    if stats['packets_received'] // 10 != previous_count // 10:
+        ingest_counters.update_kernel_drops(UDP_PORT)
+        stats.update(ingest_counters.as_dict())
+        socketio.emit('stats_update', {
+            'total_samples': stats['total_samples'],
+            'session_duration': stats.get('session_duration', 0),
+            'packets_received': stats['packets_received'],
+            'devices': stats['devices'],
+            'udp_batch_avg': stats['udp_batch_avg'],
+            'udp_batch_max': stats['udp_batch_max'],
+            'udp_kernel_drops': stats['udp_kernel_drops'],
+            'frames_lost': stats.get('frames_lost', 0),
+            'csv_rows_dropped': sum(recorder.rows_dropped for recorder in csv_recorders),
+            **anomaly_writer.stats(),
+            **emit_scheduler.stats()
+        }, namespace='/')
+    
+    # Logger dans CSV si activé
+    if csv_logging:
+        log_batch_to_csv(csv_rows)
+
+
+def start_session():
+    """Marque le début de la session d'acquisition"""
+    global session_start_time
+    stats['udp_running'] = True
+    session_start_time = datetime.now()
+    log.info("⏰ Session démarrée: %s", session_start_time.strftime('%H:%M:%S'))
+
+
+def udp_receiver_thread():
+    """Thread UDP non-bloquant pour recevoir les données ESP32 (lecture par lots)"""
     sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
     sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+    rcvbuf = configure_socket(sock, UDP_RCVBUF)
     sock.bind((UDP_HOST, UDP_PORT))
+    ingest_counters.start(UDP_PORT)  # Pertes noyau comptées dès le bind
     
-    stats['udp_running'] = True
-    stats['total_samples'] = 0
-    session_start_time = datetime.now()
-    print(f"📡 Thread UDP démarré sur {UDP_HOST}:{UDP_PORT}")
-    print(f"⏰ Session démarrée: {session_start_time.strftime('%H:%M:%S')}")
+    log.info("📡 Thread UDP démarré sur %s:%s | Lots: %d datagrammes max | SO_RCVBUF: %d octets",
+             UDP_HOST, UDP_PORT, UDP_BATCH_SIZE, rcvbuf)
+    start_session()
     
     while True:
         try:
-            data, addr = sock.recvfrom(4096)
-            raw_data = data.decode('utf-8').strip()
-            
-            # Parser le JSON
-            try:
-                packet = json.loads(raw_data)
-                print(f"✅ Paquet reçu de {addr}: {raw_data}")
-            except json.JSONDecodeError:
-                print(f"⚠️  JSON invalide de {addr}: {raw_data[:100]}")
-                continue
-            
-            # Mise à jour des stats
-            stats['packets_received'] += 1
-            stats['total_samples'] = len(signal_buffer)
-            stats['last_packet_time'] = datetime.now().isoformat()
-            if session_start_time:
-                stats['session_duration'] = (datetime.now() - session_start_time).total_seconds()
+            # Vider la file noyau en une passe, puis traiter le lot
+            batch = drain(sock, UDP_BATCH_SIZE)
+            ingest_counters.record_batch(len(batch))
             
-            # Extraction des données
-            timestamp = packet.get('timestamp', datetime.now().isoformat())
-            
-            # ECG (Signal cardiaque brut) - L'ESP32 envoie 'signal'
-            ecg_value = packet.get('signal') or packet.get('ecg')
-            if ecg_value is not None:
+            previous_count = stats['packets_received']
+            csv_rows = []
+            for data, addr in batch:
                 try:
-                    ecg_value = int(ecg_value)
-                    print(f"   ECG: {ecg_value}")
-                except (ValueError, TypeError):
-                    ecg_value = None
-                    print(f"   ⚠️ ECG invalide")
-            
-            # BPM (40-180 ou None)
-            bpm = validate_bpm(packet.get('bpm'))
-            if bpm:
-                print(f"   BPM: {bpm}")
-            
-            # Accéléromètre (±2.0g) - L'ESP32 envoie 'acc_x', 'acc_y', 'acc_z'
-            accel_x = packet.get('acc_x') or packet.get('x', 0.0)
-            accel_y = packet.get('acc_y') or packet.get('y', 0.0)
-            accel_z = packet.get('acc_z') or packet.get('z', 0.0)
-            
-            # Limiter à ±2.0g
-            accel_x = max(-2.0, min(2.0, float(accel_x)))
-            accel_y = max(-2.0, min(2.0, float(accel_y)))
-            accel_z = max(-2.0, min(2.0, float(accel_z)))
-            print(f"   Accel: X={accel_x:.3f} Y={accel_y:.3f} Z={accel_z:.3f}")
-            
-            # RÉCEPTION DES ALERTES DEPUIS L'ESP32
-            global anomaly_active, anomaly_start_time, anomaly_data
-            
-            # L'ESP32 envoie le champ "alert": true/false + données d'anomalie
-            is_alert = packet.get('alert', False)
+                    csv_rows.extend(handle_packet(data, addr))
+                except Exception as e:
+                    log.exception("❌ Erreur traitement paquet de %s: %s", addr, e)
             
-            if is_alert:
-                # Classifier l'anomalie avec les données ESP32
-                type_fr, severity, niveau_urgence, message, delai = classifier_anomalie(packet)
-                
-                print(f"\n{'='*70}")
-                print(f"⚠️  ALERTE REÇUE DE L'ESP32")
-                print(f"{'='*70}")
-                print(format_anomaly_log(type_fr, severity, niveau_urgence, message, delai))
-                print(f"   Type ESP32: {packet.get('anomaly_type', 'N/A')}")
-                print(f"   Sévérité ESP32: {packet.get('anomaly_severity', 'N/A')}")
-                if packet.get('bpm_valid'):
-                    print(f"   BPM: {bpm:.0f} (valide)")
-                if packet.get('signal_valid'):
-                    print(f"   Signal qualité: {packet.get('signal_quality', 0):.2f}")
-                print(f"{'='*70}\n")
+            finish_batch(previous_count, csv_rows)
+        
+        except Exception as e:
+            log.exception("❌ Erreur UDP: %s", e)
+
+
+def ingest_workers_thread():
+    """
+    Mode multi-processus: INGEST_WORKERS processus lisent le port UDP (SO_REUSEPORT),
+    décodent et classent les paquets; ce thread applique les échantillons reçus
+    """
+    pool = IngestWorkerPool(INGEST_WORKERS, UDP_HOST, UDP_PORT, INGEST_SOCKET,
+                            batch_size=UDP_BATCH_SIZE, rcvbuf=UDP_RCVBUF).start()
+    ingest_counters.start(UDP_PORT)
+    log.info("📡 %d workers d'ingestion sur %s:%s (SO_REUSEPORT) | Transfert: %s",
+             INGEST_WORKERS, UDP_HOST, UDP_PORT, INGEST_SOCKET)
+    start_session()
+    
+    try:
+        while True:
+            try:
+                samples = pool.receive()
+                ingest_counters.record_batch(len(samples))
                 
-                if not anomaly_active:
-                    # Début d'une nouvelle anomalie
-                    anomaly_active = True
-                    anomaly_start_time = datetime.now()
-                    anomaly_data = []
-                    print(f"\n🚨 DÉBUT ANOMALIE: {type_fr} | Sévérité: {severity.upper()}")
-                    print(f"   Niveau urgence: {niveau_urgence}")
-                    print(f"   Message: {message}")
-                    
-                    # Broadcaster alerte immédiate avec toutes les infos
-                    socketio.emit('anomaly_alert', {
-                        'type': type_fr,
-                        'type_esp32': packet.get('anomaly_type', 'N/A'),
-                        'severity': severity,
-                        'severity_esp32': packet.get('anomaly_severity', 'N/A'),
-                        'niveau_urgence': niveau_urgence,
-                        'message': message,
-                        'delai_intervention': delai,
-                        'bpm': bpm,
-                        'bpm_valid': packet.get('bpm_valid', False),
-                        'accel_max': max(abs(accel_x), abs(accel_y), abs(accel_z)),
-                        'signal_quality': packet.get('signal_quality', 0),
-                        'timestamp': anomaly_start_time.isoformat()
-                    }, namespace='/')
+                previous_count = stats['packets_received']
+                csv_rows = []
+                try:
+                    feed_heart(samples)
+                except Exception as e:
+                    log.error("❌ Erreur calcul BPM serveur: %s", e)
+                for sample in samples:
+                    try:
+                        csv_rows.append(handle_sample(sample))
+                    except Exception as e:
+                        log.error("❌ Erreur traitement échantillon %s: %s", sample.get('device_id'), e)
                 
-                # Accumuler les données de l'anomalie
-                anomaly_data.append({
-                    'timestamp': timestamp,
-                    'ecg': ecg_value,
-                    'bpm': bpm,
-                    'accel_x': accel_x,
-                    'accel_y': accel_y,
-                    'accel_z': accel_z,
-                    'anomaly_type': type_fr,
-                    'anomaly_type_esp32': packet.get('anomaly_type', 'N/A'),
-                    'severity': severity,
-                    'severity_esp32': packet.get('anomaly_severity', 'N/A'),
-                    'niveau_urgence': niveau_urgence,
-                    'message': message,
-                    'delai_intervention': delai,
-                    'bpm_valid': packet.get('bpm_valid', False),
-                    'signal_valid': packet.get('signal_valid', False),
-                    'signal_quality': packet.get('signal_quality', 0)
-                })
-            else:
-                if anomaly_active:
-                    # Fin de l'anomalie
-                    anomaly_end_time = datetime.now()
-                    duration = (anomaly_end_time - anomaly_start_time).total_seconds()
-                    
-                    # Sauvegarder seulement si durée >= ANOMALY_MIN_DURATION
-                    if duration >= ANOMALY_MIN_DURATION:
-                        saved_anomaly = save_anomaly(anomaly_start_time, anomaly_end_time, anomaly_data)
-                        if saved_anomaly:
-                            # Broadcaster la fin de l'anomalie
-                            socketio.emit('anomaly_end', saved_anomaly, namespace='/')
-                        print(f"✅ FIN ANOMALIE | Durée: {duration:.1f}s")
-                    else:
-                        print(f"⏭️  Anomalie ignorée (durée < {ANOMALY_MIN_DURATION}s)")
-                    
-                    anomaly_active = False
-                    anomaly_start_time = None
-                    anomaly_data = []
+                finish_batch(previous_count, csv_rows)
             
-            # Préparer les données pour broadcast
-            data_packet = {
-                'timestamp': timestamp,
-                'ecg': ecg_value,
-                'bpm': bpm,
-                'accel': {
-                    'x': round(accel_x, 3),
-                    'y': round(accel_y, 3),
-                    'z': round(accel_z, 3)
-                }
-            }
-            
-            # Ajouter aux buffers
-            if ecg_value is not None:
-                signal_buffer.append({
-                    'time': timestamp,
-                    'value': ecg_value,
-                    'bpm': bpm
-                })
-            
-            accel_buffer.append({
-                'time': timestamp,
-                'x': accel_x,
-                'y': accel_y,
-                'z': accel_z
-            })
-            
-            # Broadcaster via WebSocket
-            socketio.emit('sensor_data', data_packet, namespace='/')
-            print(f"📤 Données envoyées via WebSocket")
-            
-            # Broadcaster les stats toutes les 10 paquets
-            if stats['packets_received'] % 10 == 0:
-                socketio.emit('stats_update', {
-                    'total_samples': stats['total_samples'],
-                    'session_duration': stats.get('session_duration', 0),
-                    'packets_received': stats['packets_received']
-                }, namespace='/')
-            
-            # Logger dans CSV si activé
-            if csv_logging:
-                log_to_csv({
-                    'timestamp': timestamp,
-                    'ecg': ecg_value or '',
-                    'bpm': bpm or '',
-                    'accel_x': accel_x,
-                    'accel_y': accel_y,
-                    'accel_z': accel_z
-                })
-            
-            # Afficher résumé
-            bpm_str = f"{bpm:.0f}" if bpm else "--"
-            ecg_str = str(ecg_value) if ecg_value else "--"
-            print(f"📊 Paquet #{stats['packets_received']} | "
-                  f"BPM: {bpm_str} | "
-                  f"ECG: {ecg_str} | "
-                  f"Accel: X={accel_x:.2f} Y={accel_y:.2f} Z={accel_z:.2f}")
-            print()
-        
-        except Exception as e:
-            print(f"❌ Erreur UDP: {e}")
-            import traceback
-            traceback.print_exc()
+            except Exception as e:
+                log.exception("❌ Erreur ingestion workers: %s", e)
+    finally:
+        pool.stop()
 
 
 @app.route('/')
@@ -636,11 +663,17 @@ def index():
 
 @app.route('/download/data')
 def download_data():
-    """Télécharger le dernier fichier CSV de données"""
+    """
+    Télécharger le dernier fichier de données (segment en cours ou compressé)
+    ?format=csv (défaut) ou ?format=columnar (.ecol, lisible avec src.services.columnar.read_columns)
+    """
     try:
-        # Trouver le fichier CSV le plus récent
+        # Trouver le fichier le plus récent du format demandé
         import glob
-        csv_files = glob.glob('data_esp32_*.csv')
+        if request.args.get('format', 'csv') == 'columnar':
+            csv_files = glob.glob('data_esp32_*.ecol')
+        else:
+            csv_files = glob.glob('data_esp32_*.csv') + glob.glob('data_esp32_*.csv.gz')
         if not csv_files:
             return "Aucun fichier de données disponible", 404
         
@@ -650,60 +683,144 @@ def download_data():
         from flask import send_file
         return send_file(latest_file, as_attachment=True, download_name=os.path.basename(latest_file))
     except Exception as e:
-        print(f"❌ Erreur téléchargement données: {e}")
+        log.error("❌ Erreur téléchargement données: %s", e)
         return f"Erreur: {str(e)}", 500
 
 
 @app.route('/download/anomalies')
 def download_anomalies():
-    """Télécharger le fichier CSV des anomalies"""
+    """Exporter les anomalies en CSV (mêmes filtres que /api/anomalies, généré à la demande)"""
     try:
-        if not os.path.exists(anomalies_file):
-            return "Aucun fichier d'anomalies disponible", 404
-        
-        from flask import send_file
-        return send_file(anomalies_file, as_attachment=True, download_name='anomalies_log.csv')
+        from flask import Response
+        filters = anomaly_filters(request.args)
+        return Response(in_tpool(anomaly_store.iter_csv(**filters)), mimetype='text/csv',
+                        headers={'Content-Disposition': 'attachment; filename=anomalies_log.csv'})
+    except ValueError as e:
+        return str(e), 400
     except Exception as e:
-        print(f"❌ Erreur téléchargement anomalies: {e}")
+        log.error("❌ Erreur téléchargement anomalies: %s", e)
         return f"Erreur: {str(e)}", 500
 
 
+def in_tpool(iterable):
+    """Itère hors du hub eventlet : chaque élément est produit par un thread système (tpool)"""
+    iterator = iter(iterable)
+    while True:
+        item = tpool.execute(next, iterator, None)
+        if item is None:
+            return
+        yield item
+
+
+def anomaly_filters(args):
+    """Filtres du registre d'anomalies depuis une requête (device, type, severity, since, until)"""
+    filters = {
+        'device': args.get('device') or None,
+        'type_': args.get('type') or None,
+        'severity': args.get('severity') or None,
+    }
+    for name in ('since', 'until'):
+        ms = parse_time(args.get(name), local=True)
+        if ms is not None:
+            filters[name] = ms / 1000.0
+    return filters
+
+
+@app.route('/api/anomalies')
+def list_anomalies():
+    """
+    Anomalies les plus récentes d'abord, filtrées et paginées
+    ex: /api/anomalies?device=esp32-1&severity=critique&type=chute*&limit=50 puis &cursor=<next_cursor>
+    """
+    from flask import jsonify
+    try:
+        anomalies, next_cursor = tpool.execute(anomaly_store.query, limit=request.args.get('limit', 50),
+                                               cursor=request.args.get('cursor'),
+                                               **anomaly_filters(request.args))
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    return jsonify({'anomalies': anomalies, 'next_cursor': next_cursor})
+
+
 @app.route('/api/anomaly/<anomaly_id>')
 def get_anomaly_data(anomaly_id):
-    """Récupérer les données d'une anomalie pour visualisation"""
+    """
+    Récupérer les signaux d'une anomalie pour visualisation (colonnes, temps en secondes epoch)
+    Paramètres optionnels: t0/t1 (fenêtre, ISO ou epoch), points (décimation min/max), columns
+    """
     try:
         from flask import jsonify
-        json_file = f'anomalies_data/anomaly_{anomaly_id}.json'
+        try:
+            start = parse_time(request.args.get('t0'), local=True)
+            end = parse_time(request.args.get('t1'), local=True)
+            points = min(int(request.args.get('points', 0)), ANOMALY_MAX_POINTS)
+            columns = request.args.get('columns')
+            columns = tuple(c.strip() for c in columns.split(',') if c.strip()) if columns else None
+        except ValueError as e:
+            return jsonify({'error': str(e)}), 400
         
-        if not os.path.exists(json_file):
+        options = {'columns': columns} if columns else {}
+        data = anomaly_snapshots.load(anomaly_id,
+                                      t0=start / 1000.0 if start is not None else None,
+                                      t1=end / 1000.0 if end is not None else None,
+                                      points=points or None, **options)
+        if data is None:
             return jsonify({'error': 'Anomalie non trouvée'}), 404
         
-        with open(json_file, 'r') as f:
-            data = json.load(f)
-        
         return jsonify(data)
+    except KeyError as e:
+        from flask import jsonify
+        return jsonify({'error': str(e)}), 400
     except Exception as e:
-        print(f"❌ Erreur récupération anomalie: {e}")
+        log.error("❌ Erreur récupération anomalie: %s", e)
         from flask import jsonify
         return jsonify({'error': str(e)}), 500
 
 
+def build_history(device_id=None, start=None, end=None, points=HISTORY_DISPLAY_POINTS):
+    """
+    Historique décimé (min/max) d'un appareil sur [start, end] en secondes epoch
+    Par défaut: appareil le plus récemment actif, HISTORY_WINDOW_SECONDS dernières secondes
+    """
+    device = devices.get(device_id, create=False) if device_id else devices.latest()
+    end = datetime.now().timestamp() + 1 if end is None else end
+    start = end - HISTORY_WINDOW_SECONDS if start is None else start
+    points = max(2, min(int(points), HISTORY_MAX_POINTS))
+    history = {
+        'device_id': device.device_id if device else device_id,
+        'signal': [],
+        'accel': [],
+        'window': {'start': start, 'end': end, 'points': points},
+        'level': {'signal': None, 'accel': None},
+        'total_samples': device.signal_buffer.total if device else 0,
+        'session_start': session_start_time.isoformat() if session_start_time else None
+    }
+    if device:
+        history['level']['signal'], history['signal'] = device.signal_history.window(start, end, points)
+        history['level']['accel'], history['accel'] = device.accel_history.window(start, end, points)
+    return history
+
+
+def subscribe_client(scope, hz=None):
+    """Inscrit le client courant aux sensor_batch d'un périmètre à une fréquence donnée"""
+    old_room, new_room = emit_scheduler.subscribe(request.sid, scope, hz)
+    if old_room and old_room != new_room:
+        leave_room(old_room)
+    join_room(new_room)
+    return new_room
+
+
 @socketio.on('connect')
 def handle_connect():
-    """Nouveau client connecté"""
-    print(f"✅ Client connecté: {request.sid}")
+    """Nouveau client connecté (vue globale, ou un appareil via ?device=<id>)"""
+    log.info("✅ Client connecté: %s", request.sid)
     
-    # Envoyer TOUT l'historique (limité à 3000 derniers points pour le chargement initial)
-    max_initial_load = 3000  # 5 minutes à 10Hz
-    signal_list = list(signal_buffer)
-    accel_list = list(accel_buffer)
+    device_id = request.args.get('device')
+    subscribe_client(device_room(device_id) if device_id else ALL_DEVICES_ROOM,
+                     request.args.get('fps'))
     
-    emit('history', {
-        'signal': signal_list[-max_initial_load:] if len(signal_list) > max_initial_load else signal_list,
-        'accel': accel_list[-max_initial_load:] if len(accel_list) > max_initial_load else accel_list,
-        'total_samples': len(signal_list),
-        'session_start': session_start_time.isoformat() if session_start_time else None
-    })
+    # Envoyer l'historique récent, décimé à HISTORY_DISPLAY_POINTS points max par série
+    emit('history', build_history(device_id))
     
     # Envoyer le statut
     emit('status', stats)
@@ -712,7 +829,23 @@ def handle_connect():
 @socketio.on('disconnect')
 def handle_disconnect():
     """Client déconnecté"""
-    print(f"❌ Client déconnecté")
+    emit_scheduler.forget(request.sid)
+    log.info("❌ Client déconnecté: %s", request.sid)
+
+
+@socketio.on('set_frame_rate')
+def handle_set_frame_rate(params):
+    """Fréquence des sensor_batch pour ce client: {hz} (20-60)"""
+    current = emit_scheduler.client(request.sid)
+    scope = current[0] if current else ALL_DEVICES_ROOM
+    subscribe_client(scope, (params or {}).get('hz'))
+    emit('frame_rate', {'hz': emit_scheduler.client(request.sid)[1]})
+
+
+@socketio.on('batch_ack')
+def handle_batch_ack(params):
+    """Accusé de traitement d'un sensor_batch: {seq} (active le contrôle de flux)"""
+    emit_scheduler.ack(request.sid, (params or {}).get('seq'))
 
 
 @socketio.on('start_csv')
@@ -725,12 +858,56 @@ def handle_start_csv():
 
 @socketio.on('stop_csv')
 def handle_stop_csv():
-    """Arrêter l'enregistrement CSV"""
+    """Arrêter l'enregistrement CSV (réponse une fois les fichiers fermés, hub libre entre-temps)"""
     stop_csv_logging()
     emit('csv_status', {'recording': False, 'filename': None})
     socketio.emit('csv_status', {'recording': False, 'filename': None}, broadcast=True)
 
 
+@socketio.on('get_history')
+def handle_get_history(params=None):
+    """
+    Historique à la demande: {start, end, points}
+    start/end en ISO ou secondes epoch (par défaut: fenêtre récente)
+    """
+    params = params or {}
+    try:
+        start = to_epoch(params['start']) if params.get('start') is not None else None
+        end = to_epoch(params['end']) if params.get('end') is not None else None
+        points = int(params.get('points') or HISTORY_DISPLAY_POINTS)
+        emit('history_window', build_history(params.get('device_id'), start, end, points))
+    except Exception as e:
+        log.error("❌ Erreur historique: %s", e)
+        emit('history_window', {'error': str(e)})
+
+
+@socketio.on('subscribe_device')
+def handle_subscribe_device(params):
+    """Ne recevoir que les données d'un appareil: {device_id}"""
+    device_id = str((params or {}).get('device_id') or '')
+    if not device_id:
+        emit('device_subscription', {'device_id': None, 'error': 'device_id requis'})
+        return
+    current = emit_scheduler.client(request.sid)
+    subscribe_client(device_room(device_id), current[1] if current else None)
+    emit('device_subscription', {'device_id': device_id})
+    emit('history', build_history(device_id))
+
+
+@socketio.on('unsubscribe_device')
+def handle_unsubscribe_device(params=None):
+    """Revenir à la vue globale (tous les appareils)"""
+    current = emit_scheduler.client(request.sid)
+    subscribe_client(ALL_DEVICES_ROOM, current[1] if current else None)
+    emit('device_subscription', {'device_id': None})
+
+
+@socketio.on('get_devices')
+def handle_get_devices():
+    """Liste des appareils connus avec leurs compteurs"""
+    emit('devices', {'devices': [session.summary() for session in devices.sessions()]})
+
+
 @socketio.on('get_status')
 def handle_get_status():
     """Retourner les statistiques"""
@@ -738,40 +915,51 @@ def handle_get_status():
 
 
 @socketio.on('get_anomalies')
-def handle_get_anomalies():
-    """Retourner l'historique des anomalies"""
+def handle_get_anomalies(data=None):
+    """
+    Retourner l'historique des anomalies (50 plus récentes par défaut)
+    data optionnel: {device, type, severity, since, until, limit, cursor} comme /api/anomalies
+    """
+    data = data or {}
     try:
-        anomalies = []
-        if os.path.exists(anomalies_file):
-            with open(anomalies_file, 'r') as f:
-                reader = csv.DictReader(f)
-                anomalies = list(reader)
-        
-        # Trier par date décroissante (plus récent en premier)
-        anomalies.reverse()
-        
-        emit('anomalies_history', {'anomalies': anomalies[:50]})  # 50 dernières
+        filters = anomaly_filters(data)
+        # Lectures sqlite (vrai verrou partagé avec les threads d'enregistrement) hors du hub
+        anomalies, next_cursor = tpool.execute(anomaly_store.query, limit=data.get('limit', 50),
+                                               cursor=data.get('cursor'), **filters)
+        emit('anomalies_history', {
+            'anomalies': anomalies,
+            'next_cursor': next_cursor,
+            'cursor': data.get('cursor'),
+            'counts': tpool.execute(anomaly_store.counts, filters['device'])
+        })
     except Exception as e:
-        print(f"❌ Erreur lecture anomalies: {e}")
+        log.error("❌ Erreur lecture anomalies: %s", e)
         emit('anomalies_history', {'anomalies': []})
 
 
+def backup_and_clear_anomalies(backup_name):
+    """
+    Exporte le registre dans `backup_name` puis efface les anomalies exportées (thread système) ;
+    celles enregistrées pendant l'export sont gardées
+    """
+    last_seq = anomaly_store.last_seq()
+    with open(backup_name, 'w', newline='') as f:
+        f.writelines(anomaly_store.iter_csv(max_seq=last_seq))
+    log.info("💾 Backup créé: %s", backup_name)
+    return anomaly_store.clear(max_seq=last_seq)
+
+
 @socketio.on('clear_anomalies')
 def handle_clear_anomalies():
     """Effacer l'historique des anomalies (nécessite confirmation)"""
     try:
-        # Créer un backup
-        if os.path.exists(anomalies_file):
-            backup_name = f"anomalies_backup_{datetime.now().strftime('%Y%m%d_%H%M%S')}.csv"
-            os.rename(anomalies_file, backup_name)
-            print(f"💾 Backup créé: {backup_name}")
-        
-        # Réinitialiser le fichier
-        init_anomalies_log()
+        # Créer un backup (export CSV du registre) puis vider, hors du hub
+        backup_name = f"anomalies_backup_{datetime.now().strftime('%Y%m%d_%H%M%S')}.csv"
+        tpool.execute(backup_and_clear_anomalies, backup_name)
         emit('anomalies_cleared', {'success': True})
-        print("🗑️  Historique des anomalies effacé")
+        log.info("🗑️  Historique des anomalies effacé")
     except Exception as e:
-        print(f"❌ Erreur effacement anomalies: {e}")
+        log.error("❌ Erreur effacement anomalies: %s", e)
         emit('anomalies_cleared', {'success': False, 'error': str(e)})
 
 
@@ -788,24 +976,39 @@ def get_local_ip():
 
 
 if __name__ == '__main__':
+    # Journalisation asynchrone (LOG_LEVEL, LOG_FORMAT, LOG_PACKET_RATE) + résumé périodique
+    setup_logging()
+    summary.start()
+    
     print("\n" + "="*50)
     print("🚀 ESP32 REALTIME MONITOR - FLASK + SOCKET.IO")
     print("="*50)
     
-    # Initialiser le système d'anomalies
-    init_anomalies_log()
+    # Initialiser le registre des anomalies (import unique de anomalies_log.csv s'il existe)
+    anomaly_store.open()
+    anomaly_writer.start()
+    socketio.start_background_task(anomaly_writer.run, anomaly_saved, socketio.sleep)
     print("⚠️  Système de réception d'alertes activé (ESP32)")
     print("   Format attendu: {\"alert\": true/false}")
     print(f"   Seuils analyse: BPM: {ANOMALY_BPM_MIN}-{ANOMALY_BPM_MAX} | Accel: {ANOMALY_ACCEL_THRESHOLD}g")
     
-    # Démarrer le thread UDP avec eventlet
-    eventlet.spawn(udp_receiver_thread)
+    # Démarrer l'émission regroupée des sensor_batch
+    socketio.start_background_task(emit_scheduler.run)
+    
+    # Démarrer la réception UDP avec eventlet (dans ce processus ou via des workers)
+    if INGEST_WORKERS > 0:
+        eventlet.spawn(ingest_workers_thread)
+    else:
+        eventlet.spawn(udp_receiver_thread)
     
     # Afficher les infos de connexion
     local_ip = get_local_ip()
     print(f"\n📡 Serveur UDP: {UDP_HOST}:{UDP_PORT}")
     print(f"🌐 Interface Web: http://{local_ip}:5000")
-    print(f"� Stockage: ILLIMITÉ (toutes les données conservées en mémoire)")
+    print(f"💾 Stockage: {BUFFER_RETENTION_SAMPLES or int(BUFFER_RETENTION_SECONDS * SAMPLE_RATE)}"
+          f" échantillons en mémoire par appareil (max {devices.max_devices} appareils,"
+          f" {devices.session_bytes / 1e6:.1f} Mo chacun)"
+          f" | Déversement: {BUFFER_SPILL_DIR or 'désactivé'}")
     print(f"\n✨ Serveur prêt! Ouvrez http://{local_ip}:5000 dans votre navigateur\n")
     
     # Lancer Flask-SocketIO
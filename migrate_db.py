@@ -1,17 +1,26 @@
 #!/usr/bin/env python3
 """
-Script de migration de la base de données pour ajouter les colonnes bpm, ir, ecg
+Script de migration de la base de données
+- sans option : ajoute les colonnes bpm, ir, ecg (schéma v1)
+- --v2 : convertit sensor_data au schéma v2 (seq, ts epoch ms, index (id, ts) et
+  (type, ts), raw optionnel) en ligne, par blocs, sans bloquer le serveur
+- --auto-vacuum : passe la base en auto_vacuum INCREMENTAL (VACUUM complet,
+  serveur arrêté) pour que la rétention puisse réduire le fichier
 """
+import argparse
 import sqlite3
 import os
+import time
+
+from src.services.schema import SCHEMA_VERSION, create_v2, schema_version, to_epoch_ms
 
 PROJECT_ROOT = os.path.dirname(__file__)
 DB_FILENAME = os.path.join(PROJECT_ROOT, 'esp32_data.db')
 
-def migrate():
-    print(f"Migration de la base de données: {DB_FILENAME}")
+def migrate(db_filename=DB_FILENAME):
+    print(f"Migration de la base de données: {db_filename}")
     
-    conn = sqlite3.connect(DB_FILENAME)
+    conn = sqlite3.connect(db_filename)
     cur = conn.cursor()
     
     # Vérifier si les colonnes existent déjà
@@ -43,5 +52,108 @@ def migrate():
     conn.close()
     print("✓ Migration terminée !")
 
+def _copy_chunk(conn, last_rowid, chunk_size, drop_raw):
+    """Copie les lignes v1 de rowid > last_rowid (au plus chunk_size) ; retourne (dernier rowid, nombre)."""
+    rows = conn.execute(
+        "SELECT rowid,id,type,timestamp,x,y,z,bpm,ir,ecg,raw FROM sensor_data "
+        "WHERE rowid > ? ORDER BY rowid LIMIT ?", (last_rowid, chunk_size)).fetchall()
+    if not rows:
+        return last_rowid, 0
+    conn.executemany(
+        "INSERT OR REPLACE INTO sensor_data_v2 (seq,id,type,ts,x,y,z,bpm,ir,ecg,raw) "
+        "VALUES (?,?,?,?,?,?,?,?,?,?,?)",
+        [(rowid, id_, type_, to_epoch_ms(timestamp), x, y, z, bpm, ir, ecg, None if drop_raw else raw)
+         for rowid, id_, type_, timestamp, x, y, z, bpm, ir, ecg, raw in rows])
+    return rows[-1][0], len(rows)
+
+def migrate_v2(db_filename=DB_FILENAME, chunk_size=5000, pause=0.05, drop_raw=False, keep_old=True):
+    """
+    Migration en ligne vers le schéma v2 :
+    1) création de sensor_data_v2 (index déjà nommés pour la table finale) ;
+    2) copie par blocs de chunk_size lignes, une courte transaction par bloc et
+       une pause entre les blocs (le serveur continue d'écrire dans sensor_data) ;
+    3) rattrapage des dernières lignes et échange des tables dans une seule
+       transaction ; l'ancienne table est gardée sous le nom sensor_data_v1
+       (sauf --drop-old). Les rowid sont conservés (seq = rowid).
+    """
+    migrate(db_filename)
+    conn = sqlite3.connect(db_filename, timeout=30)
+    conn.execute("PRAGMA journal_mode=WAL")
+    if schema_version(conn) >= SCHEMA_VERSION:
+        print("✓ Base déjà en schéma v2")
+        conn.close()
+        return
+    
+    conn.execute("DROP TABLE IF EXISTS sensor_data_v2")
+    create_v2(conn, 'sensor_data_v2')
+    conn.commit()
+    
+    total = conn.execute("SELECT COUNT(*) FROM sensor_data").fetchone()[0]
+    print(f"Copie de {total} lignes par blocs de {chunk_size}...")
+    last_rowid, copied, started = 0, 0, time.time()
+    while True:
+        with conn:
+            last_rowid, count = _copy_chunk(conn, last_rowid, chunk_size, drop_raw)
+        copied += count
+        print(f"  → {copied}/{total} lignes", end='\r')
+        if count < chunk_size:
+            break  # Rattrapé : le reste est copié pendant l'échange
+        time.sleep(pause)
+    
+    # Rattrapage + échange : le serveur est bloqué le temps d'un seul bloc
+    conn.isolation_level = None
+    conn.execute("BEGIN IMMEDIATE")
+    try:
+        count = 1
+        while count:
+            last_rowid, count = _copy_chunk(conn, last_rowid, chunk_size, drop_raw)
+        conn.execute("DROP TABLE IF EXISTS sensor_data_v1")
+        conn.execute("ALTER TABLE sensor_data RENAME TO sensor_data_v1")
+        conn.execute("ALTER TABLE sensor_data_v2 RENAME TO sensor_data")
+        if not keep_old:
+            conn.execute("DROP TABLE sensor_data_v1")
+        conn.execute(f"PRAGMA user_version={SCHEMA_VERSION}")
+        conn.execute("COMMIT")
+    except Exception:
+        conn.execute("ROLLBACK")
+        raise
+    finally:
+        conn.close()
+    
+    print(f"\n✓ Migration v2 terminée en {time.time() - started:.1f}s"
+          f"{'' if keep_old else ' (ancienne table supprimée)'}")
+
+def enable_incremental_vacuum(db_filename=DB_FILENAME):
+    """auto_vacuum ne change qu'après un VACUUM complet : à lancer serveur arrêté."""
+    conn = sqlite3.connect(db_filename, timeout=30)
+    try:
+        if conn.execute("PRAGMA auto_vacuum").fetchone()[0] == 2:
+            print("✓ auto_vacuum déjà INCREMENTAL")
+            return
+        print("VACUUM complet (auto_vacuum=INCREMENTAL)...")
+        started = time.time()
+        conn.execute("PRAGMA auto_vacuum=INCREMENTAL")
+        conn.execute("VACUUM")
+        print(f"✓ auto_vacuum INCREMENTAL activé en {time.time() - started:.1f}s")
+    finally:
+        conn.close()
+
 if __name__ == '__main__':
-    migrate()
+    parser = argparse.ArgumentParser(description="Migration de esp32_data.db")
+    parser.add_argument('--db', default=DB_FILENAME, help="Chemin de la base")
+    parser.add_argument('--v2', action='store_true', help="Convertir au schéma v2 (index, ts epoch ms)")
+    parser.add_argument('--chunk', type=int, default=5000, help="Lignes copiées par transaction")
+    parser.add_argument('--pause', type=float, default=0.05, help="Pause entre deux blocs (secondes)")
+    parser.add_argument('--drop-raw', action='store_true', help="Ne pas copier la colonne raw (JSON)")
+    parser.add_argument('--drop-old', action='store_true', help="Supprimer l'ancienne table après l'échange")
+    parser.add_argument('--auto-vacuum', action='store_true',
+                        help="Activer auto_vacuum=INCREMENTAL (VACUUM complet, serveur arrêté)")
+    args = parser.parse_args()
+    
+    if args.v2:
+        migrate_v2(args.db, chunk_size=args.chunk, pause=args.pause,
+                   drop_raw=args.drop_raw, keep_old=not args.drop_old)
+    elif not args.auto_vacuum:
+        migrate(args.db)
+    if args.auto_vacuum:
+        enable_incremental_vacuum(args.db)
@@ -1,54 +1,238 @@
+"""Diffusion SSE en mémoire (fan-out vers les clients /stream et /events)
+
+Les événements sont numérotés (seq croissant, jamais réutilisé dans le
+processus) et rangés dans un anneau de taille fixe : l'événement `seq` occupe
+la case `seq % taille`. Chaque abonné garde son propre curseur (prochain seq à
+envoyer) ; la trame SSE (`id:` + `event:` + `data:`) est encodée en bytes une
+seule fois à la publication (voir aussi src/services/events.py).
+
+- Retard : si la case attendue a été écrasée, l'abonné reçoit un événement
+  `gap` (seq manquants) puis reprend au plus ancien événement disponible.
+- Canaux : `stream(channels=('accel',))` ne transmet que ces canaux des
+  SensorEvent (JSON réduit, encodé une fois par sous-ensemble) et saute les
+  événements qui n'en contiennent aucun.
+- Reprise : `stream(last_event_id=...)` (en-tête `Last-Event-ID` envoyé par
+  EventSource à la reconnexion) repart juste après cet id.
+- Relais BD -> direct : `seek_rowid(r)` + `after_rowid=r` reprennent le flux au
+  premier SensorEvent de rowid > r (sans trou ni doublon après un historique
+  lu en base jusqu'à r, voir src/receive.py).
+- Réveil : la publication déclenche l'Event courant puis le remplace par un
+  neuf ; les abonnés attendent sur l'Event lu avant de vérifier le curseur,
+  sans verrou partagé avec l'éditeur. Les boucles asyncio (main_async.py)
+  s'abonnent avec `add_listener` : rappel appelé après chaque publication.
+"""
+
 import json
-import time
-from collections import deque
-from threading import Condition
+import threading
+
+from src.config import sse_ring_size
+from src.services.events import SensorEvent
+
+_MAX_EVENTS = sse_ring_size
+
+
+class Broker:
+    """Anneau d'événements numérotés, lu par curseur (un par abonné)."""
+
+    def __init__(self, size=_MAX_EVENTS):
+        self.size = size
+        self._ring = [None] * size  # (seq, trame SSE, événement, JSON, SensorEvent ou None) ; trame et JSON en bytes
+        self._next = 1  # seq du prochain événement publié
+        self._lock = threading.Lock()  # sérialise les éditeurs uniquement
+        self._wake = threading.Event()
+        self._listeners = []
+        self.subscribers = 0
+        self.gaps = 0
+
+    def publish(self, data, event='measurement', source=None):
+        """
+        Range `data` (JSON déjà sérialisé, bytes) et réveille les abonnés ; retourne son seq.
+        `source` : SensorEvent d'origine, pour les abonnements limités à certains canaux.
+        """
+        with self._lock:
+            seq = self._next
+            self._ring[seq % self.size] = (seq, _frame(seq, event, data), event, data, source)
+            self._next = seq + 1
+            wake, self._wake = self._wake, threading.Event()
+        wake.set()
+        for listener in self._listeners:
+            listener()
+        return seq
+
+    def add_listener(self, callback):
+        """`callback()` est appelé (dans le thread de l'éditeur) après chaque publication."""
+        self._listeners.append(callback)
+
+    @property
+    def last_seq(self):
+        return self._next - 1
+
+    def oldest(self):
+        """Plus petit seq encore présent dans l'anneau."""
+        return max(1, self._next - self.size)
+
+    def read(self, cursor, limit=None):
+        """
+        Cases (seq, trame SSE, événement, JSON, source) à partir de `cursor`
+        -> (cases, nouveau curseur, manquants).
+        `manquants` > 0 si des événements ont été écrasés avant d'être lus.
+        """
+        end = self._next
+        if limit is not None:
+            end = min(end, cursor + limit)
+        frames, missed = [], 0
+        while cursor < end:
+            slot = self._ring[cursor % self.size]
+            if slot is None or slot[0] != cursor:
+                # Case écrasée (ou en cours d'écriture par un éditeur qui a pris de l'avance)
+                oldest = self.oldest()
+                if cursor >= oldest:
+                    break
+                missed += oldest - cursor
+                cursor = oldest
+                continue
+            frames.append(slot)
+            cursor += 1
+        return frames, cursor, missed
+
+    def attach(self):
+        with self._lock:
+            self.subscribers += 1
+
+    def detach(self):
+        with self._lock:
+            self.subscribers -= 1
+
+    def resume_cursor(self, last_event_id):
+        """Curseur juste après `last_event_id`, ou None s'il n'est pas connu de ce processus."""
+        try:
+            last = int(last_event_id)
+        except (TypeError, ValueError):
+            return None
+        return last + 1 if 0 <= last < self._next else None
+
+    def seek_rowid(self, rowid):
+        """
+        Curseur de relais après un historique lu en base jusqu'à `rowid` : premier
+        SensorEvent de rowid > `rowid`, ou juste après le dernier de rowid <= `rowid`
+        si c'est plus tôt (événements sans rowid publiés depuis). Tout l'anneau est
+        parcouru : plusieurs éditeurs peuvent publier les rowid dans le désordre, les
+        rowid <= `rowid` rencontrés ensuite sont écartés par `select(after_rowid=...)`.
+        """
+        end = self._next
+        first_after = end
+        after_last = self.oldest()
+        for seq in range(after_last, end):
+            slot = self._ring[seq % self.size]
+            if slot is None or slot[0] != seq or slot[4] is None or slot[4].rowid is None:
+                continue
+            if slot[4].rowid <= rowid:
+                after_last = seq + 1
+            elif first_after == end:
+                first_after = seq
+        return min(first_after, after_last)
+
+    def start_cursor(self, last_event_id=None, backlog=None):
+        """
+        Curseur initial : juste après `last_event_id` s'il est fourni et connu de ce
+        processus, sinon les `backlog` derniers événements (tout l'anneau par défaut).
+        """
+        if last_event_id is not None:
+            cursor = self.resume_cursor(last_event_id)
+            if cursor is not None:
+                return cursor
+        backlog = self.size if backlog is None else backlog
+        return max(self.oldest(), self._next - backlog)
+
+    def stream(self, last_event_id=None, backlog=None, poll_timeout=15.0, batch=256, channels=None,
+               cursor=None, after_rowid=None):
+        """
+        Générateur SSE d'un abonné (maintien de vie toutes les poll_timeout s).
+        `cursor` impose la position de départ ; `after_rowid` écarte les SensorEvent déjà envoyés depuis la BD.
+        """
+        if cursor is None:
+            cursor = self.start_cursor(last_event_id, backlog)
+        self.attach()
+        try:
+            while True:
+                wake = self._wake
+                frames, cursor, missed = self.read(cursor, batch)
+                if missed:
+                    self.gaps += 1
+                    yield f"event: gap\ndata: {json.dumps({'missed': missed, 'resume': cursor - len(frames)})}\n\n"
+                if frames:
+                    frames = select(frames, channels, after_rowid)
+                    if frames:
+                        yield b''.join(slot[1] for slot in frames)
+                    continue
+                if not wake.wait(poll_timeout):
+                    # Maintien de vie pour éviter les timeouts des proxies
+                    yield ": ping\n\n"
+        finally:
+            self.detach()
+
+    def stats(self):
+        return {
+            'sse_subscribers': self.subscribers,
+            'sse_last_seq': self.last_seq,
+            'sse_oldest_seq': self.oldest(),
+            'sse_gaps': self.gaps,
+        }
+
+
+def _frame(seq, event, data):
+    return b"id: %d\nevent: %s\ndata: %s\n\n" % (seq, event.encode(), data)
+
+
+def select(slots, channels, after_rowid=None):
+    """
+    Cases vues par un abonnement limité à `channels` (None = tout), sans les
+    SensorEvent de rowid <= `after_rowid` (déjà envoyés depuis la BD).
+    """
+    if channels is None and after_rowid is None:
+        return slots
+    selected = []
+    for slot in slots:
+        source = slot[4]
+        if source is None:
+            selected.append(slot)
+        elif after_rowid is not None and source.rowid is not None and source.rowid <= after_rowid:
+            continue
+        elif channels is None:
+            selected.append(slot)
+        elif source.has_any(channels):
+            seq, _, event, _, _ = slot
+            data = source.encode(channels)
+            selected.append((seq, _frame(seq, event, data), event, data, source))
+    return selected
+
+
+broker = Broker()
 
-# Buffer limité des derniers événements (pour les nouveaux clients)
-_MAX_EVENTS = 1000
-_events = deque(maxlen=_MAX_EVENTS)
-_cond = Condition()
 
 def publish(obj):
-    """Publie un objet Python (sera sérialisé en JSON) à tous les clients SSE."""
+    """
+    Publie un SensorEvent (JSON déjà encodé, réutilisé tel quel) ou un objet Python
+    (sera sérialisé en JSON) à tous les clients SSE.
+    """
+    if isinstance(obj, SensorEvent):
+        return broker.publish(obj.data, source=obj)
     try:
         data = json.dumps(obj, default=str)
     except Exception:
         # Recours à la chaîne de caractères
         data = json.dumps({"raw": str(obj)})
-    with _cond:
-        _events.append(data)
-        _cond.notify_all()
-        try:
-            print(f"realtime.publish: appended event (queue={len(_events)})")
-        except Exception:
-            pass
+    return broker.publish(data.encode())
 
-def stream(poll_timeout=15.0):
+
+def stream(last_event_id=None, backlog=None, poll_timeout=15.0, channels=None, cursor=None, after_rowid=None):
     """
     Générateur SSE : génère des événements au format SSE.
-    - envoie un arriéré initial s'il existe,
-    - envoie des messages de maintien de vie (commentaires) tous les poll_timeout s'il n'y a rien de neuf.
+    - reprend après `last_event_id` s'il est fourni, sinon envoie l'arriéré (`backlog` événements),
+    - ou part de `cursor` en écartant les rowid <= `after_rowid` (relais depuis l'historique BD),
+    - ne transmet que les `channels` demandés (tous si None),
+    - signale par un événement `gap` les événements perdus par un client trop lent,
+    - envoie des messages de maintien de vie (commentaires) tous les poll_timeout s s'il n'y a rien de neuf.
     """
-    last_index = 0
-    # Envoyer l'état initial (arriéré) s'il existe
-    with _cond:
-        backlog = list(_events)
-    if backlog:
-        for i, ev in enumerate(backlog):
-            yield f"event: measurement\ndata: {ev}\n\n"
-        last_index = len(backlog)
-
-    while True:
-        with _cond:
-            # S'il y a des nouveaux événements, les consommer
-            if last_index < len(_events):
-                while last_index < len(_events):
-                    ev = _events[last_index]
-                    last_index += 1
-                    yield f"event: measurement\ndata: {ev}\n\n"
-                continue
-            # Sinon, attendre une notification ou un timeout
-            _cond.wait(timeout=poll_timeout)
-            # Après wait, la boucle recommence et enverra de nouveaux événements s'ils sont présents
-        # Maintien de vie pour éviter les timeouts des proxies
-        yield ": ping\n\n"
\ No newline at end of file
+    return broker.stream(last_event_id, backlog, poll_timeout, channels=channels,
+                         cursor=cursor, after_rowid=after_rowid)
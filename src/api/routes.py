@@ -1,6 +1,7 @@
 from flask import Blueprint, request, jsonify, Response
 import os
 import json
+import logging
 import sqlite3
 import sys
 from datetime import datetime
@@ -11,45 +12,102 @@ if __name__ == '__main__':
 
 from src.utils import validate_sensor_data, process_sensor_data
 from src.api import realtime  # publier les événements aux clients SSE
+from src.config import (db_batch_ms, db_batch_rows, db_store_raw, event_raw, raw_retention_days, retention_chunk,
+                        retention_interval, retention_ttls, rollup_flush_interval, rollup_ttls, vacuum_pages)
+from src.services.events import SensorEvent, encode_raw, parse_channels
+from src.services.retention import RetentionManager, parse_ttls
+from src.services.rollups import RESOLUTIONS, RollupEngine, create_rollup_tables, iter_rollup
+from src.services.sensor_queries import (iter_aggregate, iter_range, parse_bucket_cursor, parse_fields,
+                                         parse_range_cursor, parse_time)
+from src.services.schema import SCHEMA_VERSION, create_v2, schema_version, timestamp_expr, to_epoch_ms
+from src.services.sqlite_writer import SqliteWriter
 
 api_bp = Blueprint('api', __name__)
+log = logging.getLogger(__name__)
 
 PROJECT_ROOT = os.path.dirname(os.path.dirname(os.path.dirname(__file__)))
 DB_FILENAME = os.path.join(PROJECT_ROOT, 'esp32_data.db')
+# Colonnes v1 (timestamp) et v2 (ts) : l'écrivain ne garde que celles de la table
+SENSOR_COLUMNS = ('id', 'type', 'timestamp', 'ts', 'x', 'y', 'z', 'bpm', 'ir', 'ecg', 'raw')
+
+# Écrivain unique (thread + connexion longue durée, commits groupés)
+db_writer = SqliteWriter(DB_FILENAME, batch_rows=db_batch_rows, batch_ms=db_batch_ms)
+# Agrégats 1s/1min/1h par appareil, mis à jour à l'ingestion (voir record_rollup)
+rollup_engine = RollupEngine(db_writer, flush_interval=rollup_flush_interval)
+
+def _load_ttls(name, spec, allowed=None):
+    """Durées de conservation de la config ; invalides -> aucune purge (erreur journalisée)."""
+    try:
+        return parse_ttls(spec, allowed)
+    except ValueError as e:
+        log.error("❌ %s ignoré (aucune purge): %s", name, e)
+        return {}
+
+# Purges par type (blocs courts via l'écrivain) et compactage incrémental ;
+# démarré à l'enregistrement du blueprint (voir _start_background), pas à l'import
+_ttls = _load_ttls('RETENTION_TTLS', retention_ttls)
+if raw_retention_days and '*' not in _ttls:
+    _ttls['*'] = raw_retention_days
+retention_manager = RetentionManager(db_writer, DB_FILENAME, ttls=_ttls,
+                                     rollup_ttls=_load_ttls('ROLLUP_TTLS', rollup_ttls, dict(RESOLUTIONS)),
+                                     chunk_size=retention_chunk, interval=retention_interval,
+                                     vacuum_pages=vacuum_pages)
 
 def init_db():
+    """
+    Nouvelle base : schéma v2 (seq, ts epoch ms, index). Une base v1 existante est
+    conservée telle quelle ; la convertir avec `python3 migrate_db.py --v2`.
+    """
     conn = sqlite3.connect(DB_FILENAME)
-    cur = conn.cursor()
-    cur.execute("""
-    CREATE TABLE IF NOT EXISTS sensor_data (
-        id TEXT,
-        type TEXT,
-        timestamp TEXT,
-        x REAL,
-        y REAL,
-        z REAL,
-        bpm REAL,
-        ir INTEGER,
-        ecg INTEGER,
-        raw TEXT
-    );
-    """)
+    version = schema_version(conn)
+    if version == 0:
+        # Base neuve : pages libérées récupérables sans VACUUM complet (voir retention.py)
+        conn.execute("PRAGMA auto_vacuum=INCREMENTAL")
+    conn.execute("PRAGMA journal_mode=WAL")  # Lectures concurrentes pendant les écritures
+    if version == 0:
+        create_v2(conn)
+        conn.execute(f"PRAGMA user_version={SCHEMA_VERSION}")
+        version = SCHEMA_VERSION
+    elif version < SCHEMA_VERSION:
+        log.warning("Base %s en schéma v%d (sans index) : lancer migrate_db.py --v2", DB_FILENAME, version)
+    if version and conn.execute("PRAGMA auto_vacuum").fetchone()[0] != 2:
+        log.info("Base %s sans auto_vacuum incrémental : la rétention libère des pages sans réduire "
+                 "le fichier (migrate_db.py --auto-vacuum, serveur arrêté)", DB_FILENAME)
+    create_rollup_tables(conn)
     conn.commit()
     conn.close()
+    return version
 
 init_db()
 
-def _store_row(id_, type_, timestamp, x, y, z, raw, bpm=None, ir=None, ecg=None):
-    conn = sqlite3.connect(DB_FILENAME)
-    cur = conn.cursor()
-    cur.execute("""
-        INSERT INTO sensor_data (id, type, timestamp, x, y, z, bpm, ir, ecg, raw)
-        VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
-    """, (id_, type_, timestamp, x, y, z, bpm, ir, ecg, json.dumps(raw)))
-    lastrowid = cur.lastrowid
-    conn.commit()
-    conn.close()
-    return lastrowid
+@api_bp.record_once
+def _start_background(state):
+    """Tâches de fond lancées quand une application enregistre le blueprint."""
+    retention_manager.start()
+
+def _store_row(id_, type_, timestamp, x, y, z, raw_json, bpm=None, ir=None, ecg=None):
+    """
+    Met la ligne en file pour l'écrivain SQLite et retourne son rowid (attribué
+    d'avance, la ligne est validée au plus tard db_batch_ms plus tard).
+    `raw_json` : charge brute déjà encodée (encode_raw), partagée avec les événements.
+    """
+    return db_writer.insert('sensor_data', SENSOR_COLUMNS,
+                            (id_, type_, timestamp, to_epoch_ms(timestamp), x, y, z, bpm, ir, ecg,
+                             raw_json if db_store_raw else None))
+
+def _store_event(event, raw_json=None):
+    """Écrit un SensorEvent et lui attribue son rowid."""
+    event.rowid = _store_row(event.id, event.type, event.timestamp, event.x, event.y, event.z, raw_json,
+                             bpm=event.bpm, ir=event.ir, ecg=event.ecg)
+    return event.rowid
+
+def encode_packet_raw(payload):
+    """Charge brute encodée une fois par paquet, ou None si ni la BD ni le flux ne la gardent."""
+    return encode_raw(payload) if db_store_raw or event_raw else None
+
+def record_rollup(id_, timestamp, x=None, y=None, z=None, bpm=None):
+    """Alimente les rollups (une fois par paquet, même s'il produit plusieurs lignes)."""
+    rollup_engine.add(id_, to_epoch_ms(timestamp), bpm=bpm, x=x, y=y, z=z)
 
 @api_bp.route('/sensor-data', methods=['POST'])
 def receive_sensor_data():
@@ -70,9 +128,7 @@ def receive_sensor_data():
 
     # Log reçu pour débogage
     client = request.remote_addr
-    print(f"[{datetime.utcnow().isoformat()}] Requête POST de {client} -> endpoint {request.path}")
-    print("Données brutes:", request.get_data(as_text=True))
-    print("JSON analysé:", data)
+    log.debug("Requête POST de %s -> endpoint %s | JSON analysé: %s", client, request.path, data)
 
     if data is None:
         return jsonify({'status': 'error', 'message': 'Pas de charge JSON ou corps illisible'}), 400
@@ -85,35 +141,24 @@ def receive_sensor_data():
 
     processed = process_sensor_data(data)
     timestamp = data.get('timestamp') or datetime.utcnow().isoformat() + 'Z'
+    raw_json = encode_packet_raw(data)
+    event = SensorEvent(processed['id'], processed['type'], timestamp,
+                        processed['x'], processed['y'], processed['z'],
+                        bpm=processed.get('bpm'), ir=processed.get('ir'), ecg=processed.get('ecg'),
+                        raw_json=raw_json if event_raw else None)
 
     try:
-        bpm = processed.get('bpm')
-        ir = processed.get('ir')
-        ecg = processed.get('ecg')
-        _store_row(processed['id'], processed['type'], timestamp,
-                   processed['x'], processed['y'], processed['z'], data,
-                   bpm=bpm, ir=ir, ecg=ecg)
+        _store_event(event, raw_json)
+        record_rollup(event.id, timestamp, event.x, event.y, event.z, event.bpm)
     except Exception as e:
-        print("Error storing to DB:", e)
+        log.error("Error storing to DB: %s", e)
         return jsonify({'status': 'error', 'message': 'DB error'}), 500
 
     # Publier aux clients SSE (temps réel)
     try:
-        event_payload = {
-            "id": processed['id'],
-            "type": processed['type'],
-            "timestamp": timestamp,
-            "x": processed['x'],
-            "y": processed['y'],
-            "z": processed['z'],
-            "bpm": processed.get('bpm'),
-            "ir": processed.get('ir'),
-            "ecg": processed.get('ecg'),
-            "raw": data
-        }
-        realtime.publish(event_payload)
+        realtime.publish(event)
     except Exception as e:
-        print("Erreur lors de la publication de l'événement temps réel:", e)
+        log.error("Erreur lors de la publication de l'événement temps réel: %s", e)
 
     # Retourner le contenu traité pour vérification du client
     return jsonify({'status': 'received', 'timestamp': timestamp, 'data': processed}), 200
@@ -123,7 +168,9 @@ def latest():
     try:
         conn = sqlite3.connect(DB_FILENAME)
         cur = conn.cursor()
-        cur.execute("SELECT id,type,timestamp,x,y,z,bpm,ir,ecg,raw FROM sensor_data ORDER BY rowid DESC LIMIT 1;")
+        version = schema_version(conn)
+        cur.execute(f"SELECT id,type,{timestamp_expr(version)},x,y,z,bpm,ir,ecg,raw "
+                    "FROM sensor_data ORDER BY rowid DESC LIMIT 1;")
         row = cur.fetchone()
         conn.close()
         if not row:
@@ -137,15 +184,104 @@ def latest():
                 'timestamp': timestamp,
                 'x': x, 'y': y, 'z': z,
                 'bpm': bpm, 'ir': ir, 'ecg': ecg,
-                'raw': json.loads(raw)
+                'raw': json.loads(raw) if raw else None
             }
         }), 200
     except Exception as e:
         return jsonify({'status':'error','message': str(e)}), 500
 
+def _stream_query(generator_factory):
+    """Réponse NDJSON : connexion dédiée ouverte et fermée par le générateur."""
+    def generate():
+        conn = sqlite3.connect(DB_FILENAME, timeout=30)
+        try:
+            yield from generator_factory(conn)
+        finally:
+            conn.close()
+    return Response(generate(), mimetype='application/x-ndjson', headers={'Cache-Control': 'no-cache'})
+
+def _query_filters(parse_cursor):
+    """Filtres communs, validés avant le streaming (ValueError -> 400)."""
+    args = request.args
+    return {
+        'device': args.get('device') or args.get('id'),
+        'type_': args.get('type'),
+        'start': parse_time(args.get('start')),
+        'end': parse_time(args.get('end')),
+        'cursor': parse_cursor(args.get('cursor')),
+        'limit': int(args.get('limit', 10000)),
+    }
+
+@api_bp.route('/sensor-data/range', methods=['GET'])
+def sensor_data_range():
+    """
+    Lignes brutes en NDJSON, triées par temps.
+    ?device=&type=&start=&end= (ISO, s ou ms) &fields=x,y,z,bpm,ir,ecg &raw=1
+    &limit=N &cursor=<next_cursor de la page précédente>
+    """
+    try:
+        filters = _query_filters(parse_range_cursor)
+        fields = parse_fields(request.args.get('fields'))
+    except ValueError as e:
+        return jsonify({'status': 'error', 'message': str(e)}), 400
+    include_raw = request.args.get('raw') in ('1', 'true')
+    return _stream_query(lambda conn: iter_range(conn, fields=fields, include_raw=include_raw, **filters))
+
+@api_bp.route('/sensor-data/aggregate', methods=['GET'])
+def sensor_data_aggregate():
+    """
+    Agrégats par seau en NDJSON: {bucket, seconds, count, <champ>: {min, max, mean}}
+    ?bucket=<secondes, défaut 60> + mêmes filtres et pagination que /sensor-data/range
+    """
+    try:
+        filters = _query_filters(parse_bucket_cursor)
+        fields = parse_fields(request.args.get('fields', 'bpm,x,y,z'))
+        bucket = float(request.args.get('bucket', 60))
+        if bucket <= 0:
+            raise ValueError("bucket doit être > 0")
+    except ValueError as e:
+        return jsonify({'status': 'error', 'message': str(e)}), 400
+    return _stream_query(lambda conn: iter_aggregate(conn, bucket, fields=fields, **filters))
+
+@api_bp.route('/sensor-data/rollup', methods=['GET'])
+def sensor_data_rollup():
+    """
+    Rollups en NDJSON: {device, metric, bucket, count, min, max, mean, variance}
+    ?resolution=1s|1m|1h (défaut 1m) &device= &metric=bpm|accel &start= &end= &limit=
+    """
+    resolution = request.args.get('resolution', '1m')
+    try:
+        if resolution not in dict(RESOLUTIONS):
+            raise ValueError(f"résolution inconnue: {resolution}")
+        start = parse_time(request.args.get('start'))
+        end = parse_time(request.args.get('end'))
+        limit = int(request.args.get('limit', 10000))
+    except ValueError as e:
+        return jsonify({'status': 'error', 'message': str(e)}), 400
+    return _stream_query(lambda conn: iter_rollup(
+        conn, resolution, device=request.args.get('device'), metric=request.args.get('metric'),
+        start=start, end=end, limit=limit))
+
+@api_bp.route('/db/stats', methods=['GET'])
+def db_stats():
+    """Taille de la base, pages libres, purges (lignes/s) et file de l'écrivain"""
+    try:
+        return jsonify({'status': 'ok', **retention_manager.stats(), **db_writer.stats(),
+                        **realtime.broker.stats()}), 200
+    except Exception as e:
+        return jsonify({'status': 'error', 'message': str(e)}), 500
+
 @api_bp.route('/stream', methods=['GET'])
 def stream_events():
     """
     Endpoint SSE. Les clients se connectent à /stream pour recevoir les mesures en temps réel.
+    Reprise sans perte via l'en-tête Last-Event-ID (ou ?last_event_id=) ;
+    ?channels=accel,bpm,ir,ecg limite les champs transmis.
     """
-    return Response(realtime.stream(), mimetype='text/event-stream')
\ No newline at end of file
+    last_event_id = request.headers.get('Last-Event-ID') or request.args.get('last_event_id')
+    try:
+        channels = parse_channels(request.args.get('channels'))
+    except ValueError as e:
+        return jsonify({'status': 'error', 'message': str(e)}), 400
+    return Response(realtime.stream(last_event_id, channels=channels), mimetype='text/event-stream',
+                    headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'})
\ No newline at end of file
@@ -7,6 +7,36 @@ debug = os.getenv("FLASK_DEBUG", "True").lower() in ("1", "true", "yes")
 database_url = "sqlite:///esp32_data.db"
 sensor_data_endpoint = "/api/sensor-data"
 
+# écrivain SQLite : commit groupé tous les N lignes ou N millisecondes
+db_batch_rows = int(os.getenv("DB_BATCH_ROWS", 500))
+db_batch_ms = int(os.getenv("DB_BATCH_MS", 50))
+# copie JSON complète de chaque paquet dans sensor_data.raw (désactiver pour gagner de la place)
+db_store_raw = os.getenv("DB_STORE_RAW", "True").lower() in ("1", "true", "yes")
+# rollups 1s/1min/1h : écriture des seaux ouverts toutes les N secondes
+rollup_flush_interval = float(os.getenv("ROLLUP_FLUSH_INTERVAL", 5))
+# purge des lignes brutes plus vieilles que N jours (0 = jamais), rollups conservés
+raw_retention_days = float(os.getenv("RAW_RETENTION_DAYS", 0))
+# durées de conservation par type, en jours : "accel=7,ecg=30,*=90" (* = autres types dont
+# multi, les paquets accel + cardiaque ; par défaut RAW_RETENTION_DAYS) ; idem par résolution de rollup : "1s=7,1m=365"
+retention_ttls = os.getenv("RETENTION_TTLS", "")
+rollup_ttls = os.getenv("ROLLUP_TTLS", "")
+retention_interval = float(os.getenv("RETENTION_INTERVAL", 300))  # secondes entre deux passes
+retention_chunk = int(os.getenv("RETENTION_CHUNK", 2000))  # lignes supprimées par transaction
+vacuum_pages = int(os.getenv("VACUUM_PAGES", 1000))  # pages libérées par passe (auto_vacuum incrémental)
+
+# serveur asyncio : datagrammes UDP en attente d'ingestion (au-delà : perdus et comptés),
+# et datagrammes max traités par passage dans l'exécuteur
+udp_queue_size = int(os.getenv("UDP_QUEUE_SIZE", 10000))
+udp_ingest_batch = int(os.getenv("UDP_INGEST_BATCH", 64))
+
+# SSE : taille de l'anneau d'événements (arriéré et marge de retard des clients lents)
+sse_ring_size = int(os.getenv("SSE_RING_SIZE", 1000))
+# historique envoyé aux nouveaux clients /events (lignes BD), et plafond de ?backlog=
+sse_history_rows = int(os.getenv("SSE_HISTORY_ROWS", 200))
+sse_history_max = int(os.getenv("SSE_HISTORY_MAX", 5000))
+# copie de la charge brute (`raw`) dans les événements temps réel (désactiver pour alléger le flux)
+event_raw = os.getenv("EVENT_RAW", "True").lower() in ("1", "true", "yes")
+
 # adresse que les clients utiliseront pour se connecter.
 # Par défaut : IP LAN du Raspberry (utilisé par ESP32 / autres appareils du réseau).
 # Pour tests locaux dans le conteneur/host, tu peux remplacer par "127.0.0.1".
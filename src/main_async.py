@@ -0,0 +1,304 @@
+"""Serveur asyncio : ingestion UDP + SSE/WebSocket sur une seule boucle
+
+Alternative à main_sse_old.py (Flask threaded, un thread par client /events) :
+un client inactif ne coûte ici qu'une coroutine et un socket, ce qui permet des
+milliers de spectateurs.
+
+- UDP 3333 : `asyncio.DatagramProtocol` ; les datagrammes vont dans une file
+  bornée (`UDP_QUEUE_SIZE`, file pleine : datagramme perdu et compté), vidée par
+  lots (`UDP_INGEST_BATCH`) par une seule tâche. Le décodage, `_store_row` et la
+  publication (udp_bridge._handle_packet) tournent dans un exécuteur à un seul
+  thread (ordre des paquets conservé, boucle jamais bloquée par SQLite).
+- HTTP minimal : `/` (interface), `/events` (historique BD puis relais sans
+  trou vers le temps réel, mêmes paramètres que receive_data : since_rowid,
+  backlog, compact), `/stream` (temps réel seul), `/ws` (WebSocket, un message JSON
+  {"seq", "event", "data"} par événement). Reprise via Last-Event-ID ou
+  ?last_event_id=, filtre ?channels=accel,... comme pour le SSE Flask.
+- Les clients lisent l'anneau de `realtime.broker` avec leur propre curseur ;
+  une publication réveille la boucle une seule fois (appels coalescés).
+
+Lancement : python3 src/main_async.py
+"""
+
+import asyncio
+import base64
+import hashlib
+import json
+import logging
+import os
+import struct
+import sys
+from concurrent.futures import ThreadPoolExecutor
+from urllib.parse import parse_qs, urlsplit
+
+# Assurer que la racine du projet (parent de src/) est sur sys.path afin que `import src.*` fonctionne
+sys.path.insert(0, os.path.dirname(os.path.dirname(__file__)))
+
+from src.api import realtime
+from src.config import host, port, udp_ingest_batch, udp_queue_size
+from src.receive import parse_stream_args, snapshot
+from src.services.logs import setup_logging
+from src.udp_bridge import LISTEN_HOST, LISTEN_PORT, _handle_packet
+from src.ui import INDEX_HTML
+
+log = logging.getLogger(__name__)
+
+_KEEPALIVE = 15.0  # secondes sans événement avant un ping
+_BATCH = 256  # événements max par écriture
+_WS_GUID = '258EAFA5-E914-47DA-95CA-C5AB0DC85B11'
+_SSE_HEADERS = ('HTTP/1.1 200 OK\r\nContent-Type: text/event-stream\r\nCache-Control: no-cache\r\n'
+                'X-Accel-Buffering: no\r\nConnection: keep-alive\r\n\r\n').encode()
+
+
+def _handle_batch(batch):
+    """Ingère un lot dans l'exécuteur ; retourne le nombre de datagrammes en échec."""
+    failed = 0
+    for data, addr in batch:
+        try:
+            _handle_packet(data, addr)
+        except Exception:
+            failed += 1
+            log.exception("❌ Erreur ingestion du datagramme de %s", addr)
+    return failed
+
+
+class UdpIngest(asyncio.DatagramProtocol):
+    """Datagrammes -> file bornée -> exécuteur d'ingestion (décodage, BD, publication) par lots."""
+
+    def __init__(self, executor, queue_size=udp_queue_size, batch=udp_ingest_batch):
+        self.executor = executor
+        self.loop = asyncio.get_running_loop()
+        self.batch = batch
+        self.queue = asyncio.Queue(queue_size)
+        self.received = 0
+        self.dropped = 0
+        self.failed = 0
+        self.consumer = self.loop.create_task(self._consume())
+
+    def datagram_received(self, data, addr):
+        self.received += 1
+        try:
+            self.queue.put_nowait((data, addr))
+        except asyncio.QueueFull:
+            self.dropped += 1
+            if self.dropped & (self.dropped - 1) == 0:  # 1, 2, 4, 8... : journal borné
+                log.warning("⚠️ File UDP pleine : %d datagramme(s) perdu(s)", self.dropped)
+
+    def error_received(self, exc):
+        log.warning("Erreur socket UDP: %s", exc)
+
+    def connection_lost(self, exc):
+        self.consumer.cancel()
+
+    async def _consume(self):
+        """Une seule tâche : un lot à la fois dans l'exécuteur (ordre des paquets conservé)."""
+        queue = self.queue
+        while True:
+            batch = [await queue.get()]
+            while len(batch) < self.batch and not queue.empty():
+                batch.append(queue.get_nowait())
+            try:
+                self.failed += await self.loop.run_in_executor(self.executor, _handle_batch, batch)
+            except Exception:
+                self.failed += len(batch)
+                log.exception("❌ Erreur ingestion UDP (%d datagramme(s))", len(batch))
+
+
+class Waker:
+    """Réveil des clients de la boucle : un asyncio.Event remplacé à chaque réveil."""
+
+    def __init__(self, loop):
+        self.loop = loop
+        self.event = asyncio.Event()
+        self._pending = False
+
+    def notify(self):
+        # Thread de l'éditeur : un seul rappel en attente à la fois
+        if not self._pending:
+            self._pending = True
+            self.loop.call_soon_threadsafe(self._fire)
+
+    def _fire(self):
+        self._pending = False
+        event, self.event = self.event, asyncio.Event()
+        event.set()
+
+
+async def _follow(waker, cursor, channels, send, ping, after_rowid=None):
+    """Envoie les événements de l'anneau à partir de `cursor` jusqu'à déconnexion."""
+    realtime.broker.attach()
+    try:
+        while True:
+            event = waker.event
+            slots, cursor, missed = realtime.broker.read(cursor, _BATCH)
+            if missed:
+                realtime.broker.gaps += 1
+                await send(None, {'missed': missed, 'resume': cursor - len(slots)})
+            if slots:
+                slots = realtime.select(slots, channels, after_rowid)
+                if slots:
+                    await send(slots, None)
+                continue
+            try:
+                await asyncio.wait_for(event.wait(), _KEEPALIVE)
+            except asyncio.TimeoutError:
+                await ping()
+    finally:
+        realtime.broker.detach()
+
+
+async def _serve_sse(waker, writer, options, with_snapshot):
+    writer.write(_SSE_HEADERS)
+    channels, after_rowid = options['channels'], None
+    if with_snapshot:
+        frames, cursor, after_rowid = await asyncio.get_running_loop().run_in_executor(
+            None, lambda: snapshot(**options))
+        writer.write(b''.join(frames))
+    else:
+        cursor = realtime.broker.start_cursor(options['last_event_id'])
+    await writer.drain()
+
+    async def send(slots, gap):
+        if gap is not None:
+            writer.write(f"event: gap\ndata: {json.dumps(gap)}\n\n".encode())
+        else:
+            writer.write(b''.join(slot[1] for slot in slots))
+        await writer.drain()
+
+    async def ping():
+        # Maintien de vie pour éviter les timeouts des proxies (et détecter les déconnexions)
+        writer.write(b": ping\n\n")
+        await writer.drain()
+
+    await _follow(waker, cursor, channels, send, ping, after_rowid)
+
+
+def _ws_frame(opcode, payload=b''):
+    head = bytes([0x80 | opcode])
+    length = len(payload)
+    if length < 126:
+        head += bytes([length])
+    elif length < 65536:
+        head += struct.pack('!BH', 126, length)
+    else:
+        head += struct.pack('!BQ', 127, length)
+    return head + payload
+
+
+async def _ws_receive(reader, writer):
+    """Lit les trames du client (masquées) : répond aux pings, retourne à la fermeture."""
+    while True:
+        b0, b1 = await reader.readexactly(2)
+        opcode, length = b0 & 0x0F, b1 & 0x7F
+        if length == 126:
+            length = struct.unpack('!H', await reader.readexactly(2))[0]
+        elif length == 127:
+            length = struct.unpack('!Q', await reader.readexactly(8))[0]
+        mask = await reader.readexactly(4) if b1 & 0x80 else b'\0\0\0\0'
+        payload = bytes(b ^ mask[i % 4] for i, b in enumerate(await reader.readexactly(length)))
+        if opcode == 0x8:
+            writer.write(_ws_frame(0x8, payload[:2]))
+            return
+        if opcode == 0x9:
+            writer.write(_ws_frame(0xA, payload))
+
+
+async def _serve_ws(waker, reader, writer, headers, options):
+    key = headers.get('sec-websocket-key')
+    if not key:
+        _respond(writer, '400 Bad Request')
+        return
+    accept = base64.b64encode(hashlib.sha1((key + _WS_GUID).encode()).digest()).decode()
+    writer.write(("HTTP/1.1 101 Switching Protocols\r\nUpgrade: websocket\r\nConnection: Upgrade\r\n"
+                  f"Sec-WebSocket-Accept: {accept}\r\n\r\n").encode())
+
+    async def send(slots, gap):
+        if gap is not None:
+            writer.write(_ws_frame(0x1, json.dumps({'event': 'gap', 'data': gap}).encode()))
+        else:
+            for seq, _, event, data, _ in slots:
+                writer.write(_ws_frame(0x1, b'{"seq":%d,"event":"%s","data":%s}' % (seq, event.encode(), data)))
+        await writer.drain()
+
+    async def ping():
+        writer.write(_ws_frame(0x9))
+        await writer.drain()
+
+    sender = asyncio.ensure_future(_follow(waker, realtime.broker.start_cursor(options['last_event_id']),
+                                           options['channels'], send, ping))
+    receiver = asyncio.ensure_future(_ws_receive(reader, writer))
+    try:
+        await asyncio.wait((sender, receiver), return_when=asyncio.FIRST_COMPLETED)
+    finally:
+        sender.cancel()
+        receiver.cancel()
+    for task in (sender, receiver):
+        if not task.cancelled() and task.done() and task.exception():
+            raise task.exception()
+
+
+def _respond(writer, status, body=b'', content_type='text/plain; charset=utf-8'):
+    writer.write(b"HTTP/1.1 %s\r\nContent-Type: %s\r\nContent-Length: %d\r\nConnection: close\r\n\r\n"
+                 % (status.encode(), content_type.encode(), len(body)) + body)
+
+
+async def _handle_client(waker, reader, writer):
+    try:
+        head = await reader.readuntil(b'\r\n\r\n')
+        lines = head.decode('latin-1').split('\r\n')
+        method, target = lines[0].split(' ')[:2]
+        headers = {}
+        for line in lines[1:]:
+            if ':' in line:
+                name, value = line.split(':', 1)
+                headers[name.strip().lower()] = value.strip()
+        url = urlsplit(target)
+        args = {name: values[0] for name, values in parse_qs(url.query).items()}
+        try:
+            options = parse_stream_args(args, headers.get('last-event-id'))
+        except ValueError as e:
+            _respond(writer, '400 Bad Request', str(e).encode())
+            method = None
+
+        if method is None:
+            pass
+        elif method != 'GET':
+            _respond(writer, '405 Method Not Allowed')
+        elif url.path == '/':
+            _respond(writer, '200 OK', INDEX_HTML.encode(), 'text/html; charset=utf-8')
+        elif url.path == '/events':
+            await _serve_sse(waker, writer, options, with_snapshot=True)
+        elif url.path in ('/stream', '/api/stream'):
+            await _serve_sse(waker, writer, options, with_snapshot=False)
+        elif url.path == '/ws' and headers.get('upgrade', '').lower() == 'websocket':
+            await _serve_ws(waker, reader, writer, headers, options)
+        else:
+            _respond(writer, '404 Not Found')
+        await writer.drain()
+    except (ConnectionError, asyncio.IncompleteReadError, asyncio.LimitOverrunError, ValueError):
+        pass  # Client parti (ou requête illisible)
+    finally:
+        writer.close()
+
+
+async def serve(http_host=host, http_port=port, udp_host=LISTEN_HOST, udp_port=LISTEN_PORT):
+    loop = asyncio.get_running_loop()
+    executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix='ingest')
+    waker = Waker(loop)
+    realtime.broker.add_listener(waker.notify)
+
+    await loop.create_datagram_endpoint(lambda: UdpIngest(executor), local_addr=(udp_host, udp_port))
+    log.info("Pont UDP (asyncio) à l'écoute sur %s:%s", udp_host, udp_port)
+    server = await asyncio.start_server(lambda r, w: _handle_client(waker, r, w), http_host, http_port,
+                                        backlog=1024)
+    log.info("Serveur asyncio sur http://%s:%s (/events, /stream, /ws)", http_host, http_port)
+    async with server:
+        await server.serve_forever()
+
+
+if __name__ == "__main__":
+    setup_logging()
+    try:
+        asyncio.run(serve())
+    except KeyboardInterrupt:
+        print("Serveur asyncio arrêté")
@@ -3,11 +3,12 @@ import sys
 # Assurer que la racine du projet (parent de src/) est sur sys.path afin que `import src.*` fonctionne
 sys.path.insert(0, os.path.dirname(os.path.dirname(__file__)))
 
-from flask import Flask, Response, render_template_string
+from flask import Flask, Response, render_template_string, request
 from config import host, port, debug
-from receive import receive_data  # Importation de la fonction pour recevoir des données
+from receive import parse_stream_args, receive_data  # Importation de la fonction pour recevoir des données
 from ui import INDEX_HTML  # Importation du HTML
 from src.api.routes import api_bp  # Importation du blueprint API
+from src.services.logs import setup_logging
 
 app = Flask(__name__)
 app.register_blueprint(api_bp)  # Enregistrer le blueprint API
@@ -19,9 +20,15 @@ def index():
 @app.route('/events')
 def events():
     # Utiliser le mimetype (préféré) et désactiver la mise en cache du buffering/proxy
-    return Response(receive_data(), mimetype='text/event-stream', headers={'Cache-Control':'no-cache', 'X-Accel-Buffering':'no'})
+    # ?since_rowid=, ?backlog=, ?compact=1, ?channels= (voir src/receive.py)
+    try:
+        options = parse_stream_args(request.args, request.headers.get('Last-Event-ID'))
+    except ValueError as e:
+        return Response(str(e), status=400)
+    return Response(receive_data(**options), mimetype='text/event-stream', headers={'Cache-Control':'no-cache', 'X-Accel-Buffering':'no'})
 
 if __name__ == "__main__":
+    setup_logging()
     # Quand le reloader de debug Flask est activé, Werkzeug lance un processus enfant séparé
     # pour exécuter l'app. On doit démarrer le pont UDP uniquement dans le
     # *processus enfant du reloader* (le vrai processus serveur) afin qu'il partage la même
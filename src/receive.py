@@ -6,49 +6,109 @@ from src.ui import INDEX_HTML  # Import depuis src.ui
 import sqlite3
 from src.api import realtime
 from src.api.routes import DB_FILENAME
+from src.config import event_raw, sse_history_max, sse_history_rows
+from src.services.events import BASE_FIELDS, CHANNELS, FIELDS, SensorEvent, parse_channels
+from src.services.schema import schema_version, timestamp_expr
 
 
-def receive_data():
-    """Générateur SSE: envoie un événement connecté + lignes récentes de la BD, puis transmet les événements temps réel.
+_HISTORY_CHUNK = 500  # lignes par événement `history` (encodage compact)
 
-    Cela garantit que l'interface reçoit un snapshot initial (historique) et un événement connecté
-    avec le dernier id de ligne, que le frontend attend pour initialiser les graphiques/tableaux.
+
+def parse_stream_args(args, last_event_id=None):
     """
-    # Envoyer connecté avec le dernier rowid
-    last_rowid = 0
-    try:
-        conn = sqlite3.connect(DB_FILENAME)
-        cur = conn.cursor()
-        cur.execute("SELECT MAX(rowid) FROM sensor_data;")
-        r = cur.fetchone()
-        conn.close()
-        last_rowid = r[0] or 0
-    except Exception:
-        last_rowid = 0
+    Paramètres de /events -> arguments de receive_data / snapshot :
+    ?since_rowid= (reprise depuis la BD), ?backlog= (lignes d'historique, plafonné),
+    ?compact=1 (historique en colonnes), ?channels=, ?last_event_id= (ou en-tête Last-Event-ID).
+    Lève ValueError si un paramètre est invalide.
+    """
+    since = args.get('since_rowid')
+    backlog = args.get('backlog')
+    return {
+        'last_event_id': last_event_id or args.get('last_event_id'),
+        'since_rowid': int(since) if since else None,
+        'backlog': max(0, min(int(backlog), sse_history_max)) if backlog else sse_history_rows,
+        'channels': parse_channels(args.get('channels')),
+        'compact': (args.get('compact') or '').lower() in ('1', 'true', 'yes'),
+    }
+
+
+def _history_frames(rows, channels, compact):
+    """Lignes BD -> trames SSE : une `measurement` par ligne, ou des `history` compactes en colonnes."""
+    if not compact:
+        frames = []
+        for rowid, id_, type_, timestamp, x, y, z, bpm, ir, ecg, raw in rows:
+            # raw est déjà du JSON (encode_raw) : inséré tel quel, sans json.loads/dumps
+            event = SensorEvent(id_, type_, timestamp, x, y, z, bpm=bpm, ir=ir, ecg=ecg,
+                                raw_json=raw if event_raw else None, rowid=rowid)
+            if channels is None or event.has_any(channels):
+                frames.append(b"event: measurement\ndata: %s\n\n" % event.encode(channels))
+        return frames
+
+    # Compact : noms de colonnes une fois, puis des lignes de valeurs (sans raw)
+    # (les lignes lues suivent l'ordre de FIELDS, puis raw)
+    columns = list(BASE_FIELDS) + [field for name in (channels or CHANNELS) for field in CHANNELS[name]]
+    positions = [FIELDS.index(name) for name in columns]
+    values = [[row[i] for i in positions] for row in rows
+              if channels is None or any(row[i] is not None for i in positions[len(BASE_FIELDS):])]
+    return [b"event: history\ndata: %s\n\n" % json.dumps({'columns': columns, 'rows': values[i:i + _HISTORY_CHUNK]},
+                                                            default=str).encode()
+            for i in range(0, len(values), _HISTORY_CHUNK)]
 
-    yield f"event: connected\ndata: {json.dumps({'last_rowid': last_rowid})}\n\n"
 
-    # Envoyer l'historique récent (ordre ascendant)
+def snapshot(last_event_id=None, since_rowid=None, backlog=sse_history_rows, channels=None, compact=False):
+    """Trames SSE initiales (connecté + historique BD) et point de relais vers le flux en mémoire.
+
+    Retourne (trames en bytes, cursor, after_rowid) à passer à realtime.stream :
+    - l'historique est lu dans une seule transaction de lecture : les lignes de rowid
+      > since_rowid (les `backlog` plus récentes au plus ; un événement `gap` signale
+      les lignes sautées), jusqu'au dernier rowid validé R ;
+    - le flux direct reprend au premier événement de rowid > R encore dans l'anneau
+      (les lignes pas encore validées y sont déjà) et écarte les rowid <= R :
+      ni trou ni doublon entre la BD et le direct.
+    Sur reconnexion avec un `last_event_id` connu de l'anneau, l'historique est sauté.
+    `channels` limite les canaux envoyés, `compact` encode l'historique en colonnes.
+    """
+    if last_event_id is not None and since_rowid is None:
+        cursor = realtime.broker.resume_cursor(last_event_id)
+        if cursor is not None:
+            return [f"event: connected\ndata: {json.dumps({'last_event_id': cursor - 1})}\n\n".encode()], cursor, None
+
+    last_rowid, frames, rows = 0, [], []
     try:
         conn = sqlite3.connect(DB_FILENAME)
-        cur = conn.cursor()
-        cur.execute("SELECT rowid,id,type,timestamp,x,y,z,bpm,ir,ecg,raw FROM sensor_data ORDER BY rowid DESC LIMIT 200;")
-        rows = cur.fetchall()
-        conn.close()
-        for row in reversed(rows):
-            rowid, id_, type_, timestamp, x, y, z, bpm, ir, ecg, raw = row
-            try:
-                raw_json = json.loads(raw)
-            except Exception:
-                raw_json = raw
-            payload = {
-                'rowid': rowid, 'id': id_, 'type': type_, 'timestamp': timestamp,
-                'x': x, 'y': y, 'z': z, 'bpm': bpm, 'ir': ir, 'ecg': ecg, 'raw': raw_json
-            }
-            yield f"event: measurement\ndata: {json.dumps(payload, default=str)}\n\n"
+        try:
+            conn.execute("BEGIN")  # Instantané cohérent (WAL) pour MAX(rowid) et l'historique
+            last_rowid = conn.execute("SELECT MAX(rowid) FROM sensor_data").fetchone()[0] or 0
+            start = max(since_rowid or 0, last_rowid - backlog)
+            if since_rowid is not None and start > since_rowid:
+                frames.append(b"event: gap\ndata: %s\n\n"
+                              % json.dumps({'missed_rows': start - since_rowid}).encode())
+            cur = conn.execute(f"SELECT rowid,id,type,{timestamp_expr(schema_version(conn))},x,y,z,bpm,ir,ecg,raw "
+                               "FROM sensor_data WHERE rowid > ? ORDER BY rowid", (start,))
+            while True:
+                chunk = cur.fetchmany(_HISTORY_CHUNK)
+                if not chunk:
+                    break
+                rows += chunk
+        finally:
+            conn.close()
     except Exception:
         pass
 
-    # Maintenant transmettre les événements en direct du flux en mémoire
-    for ev in realtime.stream():
-        yield ev
\ No newline at end of file
+    # Envoyer connecté avec le dernier rowid (point de relais BD -> direct)
+    frames.insert(0, f"event: connected\ndata: {json.dumps({'last_rowid': last_rowid})}\n\n".encode())
+    frames += _history_frames(rows, channels, compact)
+    return frames, realtime.broker.seek_rowid(last_rowid), last_rowid
+
+
+def receive_data(last_event_id=None, since_rowid=None, backlog=sse_history_rows, channels=None, compact=False):
+    """Générateur SSE: envoie un événement connecté + lignes récentes de la BD, puis transmet les événements temps réel.
+
+    Cela garantit que l'interface reçoit un snapshot initial (historique) et un événement connecté
+    avec le dernier id de ligne, que le frontend attend pour initialiser les graphiques/tableaux.
+    """
+    frames, cursor, after_rowid = snapshot(last_event_id, since_rowid, backlog, channels, compact)
+    yield from frames
+
+    # Maintenant transmettre les événements en direct du flux en mémoire, à partir du relais
+    yield from realtime.stream(cursor=cursor, after_rowid=after_rowid, channels=channels)
@@ -0,0 +1,131 @@
+"""Capture pré/post-déclenchement des anomalies
+
+Chaque appareil garde un TimeSeriesRing dédié (toutes les grandeurs du signal
+d'anomalie, sans déversement disque) alimenté à chaque échantillon : un ajout
+O(1), aucune copie par paquet. Le déclenchement (`trigger`) et la fin (`end`)
+de l'alerte ne font que noter des index absolus ; à l'enregistrement (`take`,
+après `post_seconds`), la fenêtre [déclenchement - pre_seconds, fin +
+post_seconds] est extraite du ring en une fois.
+
+Les textes de classification (type, sévérité, message...) sont dédoublonnés
+par capture : la colonne `label` contient l'indice d'une combinaison dans
+`labels`, NaN hors alerte. Les index d'une capture précédente encore présents
+dans le ring (fenêtre pré-déclenchement) sont ignorés.
+
+Capacité du ring : pre + post + `max_seconds` d'anomalie à `sample_rate` ; au-delà,
+le début de l'anomalie a été écrasé et la fenêtre est marquée `truncated`. La
+fréquence réelle du flux (ECG à 100-250 Hz) est mesurée par l'appareil
+(`ensure_rate`) et le ring agrandi en conséquence, index conservés.
+"""
+
+from src.services.ringstore import NAN, TimeSeriesRing
+
+# Colonnes du ring (hors temps), mêmes noms que le schéma des signaux d'anomalie
+COLUMNS = ('ecg', 'bpm', 'accel_x', 'accel_y', 'accel_z',
+           'bpm_valid', 'signal_valid', 'signal_quality', 'label')
+
+
+def _flag(value):
+    if value is None or value == '':
+        return NAN
+    return 1.0 if value else 0.0
+
+
+class AnomalyCapture:
+    """Ring de contexte d'un appareil + index de l'anomalie en cours de capture."""
+
+    def __init__(self, name, pre_seconds=10.0, post_seconds=10.0, max_seconds=120.0, sample_rate=10):
+        self.pre_seconds = pre_seconds
+        self.post_seconds = post_seconds
+        self.seconds = pre_seconds + post_seconds + max_seconds
+        self.ring = TimeSeriesRing(f'{name}_capture', COLUMNS,
+                                   retention_seconds=self.seconds, sample_rate=sample_rate)
+        self.generation = 0  # Incrémenté à chaque capture (ignore les minuteries périmées)
+        self.start_time = None
+        self.end_time = None
+        self.start_index = None  # Index absolu de l'échantillon déclencheur
+        self.end_index = None    # Index absolu du premier échantillon après l'alerte
+        self.labels = []
+        self._label_index = {}
+
+    def ensure_rate(self, rate):
+        """Agrandit le ring (marge de 25 %) si `rate` Hz ne tient plus `seconds` ; O(1) sinon."""
+        if rate * self.seconds > self.ring.capacity:
+            self.ring.grow(int(rate * self.seconds * 1.25))
+            return True
+        return False
+
+    @property
+    def pending(self):
+        """Anomalie terminée dont la fenêtre post-déclenchement n'a pas encore été extraite."""
+        return self.end_index is not None
+
+    def append(self, timestamp, ecg, bpm, accel_x, accel_y, accel_z,
+               bpm_valid=None, signal_valid=None, signal_quality=None, label=None):
+        """Ajoute un échantillon (`label` : dict de classification si en alerte) ; O(1)."""
+        if label is None:
+            index = NAN
+        else:
+            key = tuple(label.items())
+            index = self._label_index.get(key)
+            if index is None:
+                index = self._label_index[key] = len(self.labels)
+                self.labels.append(label)
+        self.ring.append(timestamp, ecg, bpm, accel_x, accel_y, accel_z,
+                         _flag(bpm_valid), _flag(signal_valid), signal_quality, index)
+
+    def trigger(self, start_time):
+        """Début d'alerte : l'échantillon ajouté ensuite est le déclencheur."""
+        self.generation += 1
+        self.start_time = start_time
+        self.end_time = None
+        self.start_index = self.ring.total
+        self.end_index = None
+        self.labels = []
+        self._label_index = {}
+        return self.generation
+
+    def end(self, end_time):
+        """Fin d'alerte (échantillon courant exclu) ; retourne le numéro de la capture."""
+        self.end_time = end_time
+        self.end_index = self.ring.total
+        return self.generation
+
+    def cancel(self):
+        """Abandonne la capture en cours (anomalie trop courte)."""
+        self.start_index = self.end_index = None
+        self.start_time = self.end_time = None
+
+    def take(self, generation=None):
+        """
+        Extrait la fenêtre de la capture terminée `generation` (la courante si None) :
+        {'columns': {'timestamp', *COLUMNS}, 'labels', 'trigger', 'end', 'truncated',
+        'start_time', 'end_time'}, `trigger`/`end` étant des positions dans les colonnes.
+        Retourne None si cette capture a déjà été extraite ou remplacée.
+        """
+        if not self.pending or (generation is not None and generation != self.generation):
+            return None
+        ring, start_index, end_index = self.ring, self.start_index, self.end_index
+        first = ring.first_index
+        truncated = start_index < first
+        trigger_time = ring.column('time', start_index, start_index + 1) if not truncated else None
+        start = first if truncated else ring.index_at(trigger_time[0] - self.pre_seconds)
+        start = max(first, min(start, start_index))
+        stop = ring.total
+        columns = {'timestamp': ring.column('time', start, stop)}
+        for name in COLUMNS:
+            columns[name] = ring.column(name, start, stop)
+        labels = columns['label']
+        for i in range(max(0, start_index - start)):
+            labels[i] = NAN  # Capture précédente
+        window = {
+            'columns': columns,
+            'labels': self.labels,
+            'trigger': max(0, start_index - start),
+            'end': end_index - start,
+            'truncated': truncated,
+            'start_time': self.start_time,
+            'end_time': self.end_time,
+        }
+        self.cancel()
+        return window
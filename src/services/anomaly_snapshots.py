@@ -0,0 +1,150 @@
+"""Enregistrement des signaux d'anomalie (format colonnaire)
+
+Chaque anomalie est écrite une fois, avec son contexte avant et après
+l'alerte (voir src/services/anomaly_capture.py), dans
+`anomalies_data/anomaly_<id>.ecol` (voir src/services/columnar.py) : une colonne
+typée par grandeur, en petits blocs compressés (zlib, niveau réglable, 0 = sans
+compression). Les textes répétés à chaque échantillon (type, sévérité,
+message...) sont dédoublonnés : le pied de fichier garde la liste des
+combinaisons distinctes (`labels`) et la colonne `label` leur indice (absent
+hors alerte). Le pied porte aussi les métadonnées de l'anomalie (dont les
+positions `trigger`/`end` de l'alerte dans les colonnes) et un aperçu min/max
+décimé.
+
+Lecture (`load`) : un aperçu de `points` points sans fenêtre est servi depuis le
+pied, sans décompresser d'échantillon ; une fenêtre [t0, t1] ne décompresse que
+les blocs qui la recouvrent, puis est décimée si besoin. Les anciens fichiers
+`anomaly_<id>.json` restent lisibles (même réponse).
+
+Identifiants : date de début à la seconde + suffixe aléatoire, pour que deux
+anomalies commencées dans la même seconde (plusieurs appareils) ne s'écrasent
+pas.
+"""
+
+import json
+import os
+import re
+import uuid
+
+from src.services.columnar import EXTENSION, SENSOR_SCHEMA, ColumnarWriter, read_columns, read_index
+from src.services.lod import decimate
+from src.services.ringstore import to_epoch
+
+# Textes par échantillon, stockés une fois par combinaison distincte
+LABEL_FIELDS = ('anomaly_type', 'anomaly_type_esp32', 'severity', 'severity_esp32',
+                'niveau_urgence', 'message', 'delai_intervention')
+SNAPSHOT_SCHEMA = SENSOR_SCHEMA + (
+    ('bpm_valid', 'i'),
+    ('signal_valid', 'i'),
+    ('signal_quality', 'f'),
+    ('label', 'i'),
+)
+# Colonnes servies par défaut (tracés de la fenêtre de visualisation)
+WAVEFORM_COLUMNS = ('timestamp', 'ecg', 'bpm', 'accel_x', 'accel_y', 'accel_z')
+MAX_POINTS = 20000
+_ID = re.compile(r'^[0-9A-Za-z_-]+$')
+
+
+def new_anomaly_id(start_time):
+    """Identifiant unique : YYYYMMDD_HHMMSS (début) + suffixe aléatoire."""
+    return f"{start_time.strftime('%Y%m%d_%H%M%S')}_{uuid.uuid4().hex[:8]}"
+
+
+class AnomalySnapshots:
+    """Signaux d'anomalie par fichier colonnaire, lus par fenêtre ou décimés."""
+
+    def __init__(self, directory='anomalies_data', chunk_rows=256, level=6, overview_points=500):
+        self.directory = directory
+        self.chunk_rows = chunk_rows
+        self.level = level
+        self.overview_points = overview_points
+
+    def path(self, anomaly_id, extension=EXTENSION):
+        """Chemin du fichier de l'anomalie, None si l'identifiant n'est pas un nom de fichier sûr."""
+        if not _ID.match(anomaly_id or ''):
+            return None
+        return os.path.join(self.directory, f'anomaly_{anomaly_id}{extension}')
+
+    def save(self, anomaly_id, meta, columns, labels):
+        """
+        Écrit les colonnes du schéma (séquences alignées, NaN = absent), les
+        combinaisons de `labels` (dicts LABEL_FIELDS) et `meta` (id, device_id,
+        start_time, end_time, duration, type, severity...) ; retourne le chemin.
+        """
+        os.makedirs(self.directory, exist_ok=True)
+        data = []
+        for name, kind in SNAPSHOT_SCHEMA:
+            values = columns[name]
+            if kind == 'i':
+                values = [None if value != value else int(value) for value in values]
+            data.append(values)
+        rows = zip(*data)
+
+        times, series = decimate(columns['timestamp'],
+                                 [[None if v != v else v for v in columns[name]] for name in WAVEFORM_COLUMNS[1:]],
+                                 self.overview_points)
+        overview = dict(zip(WAVEFORM_COLUMNS, [times] + series))
+
+        path = self.path(anomaly_id)
+        partial = path + '.part'
+        writer = ColumnarWriter(partial, schema=SNAPSHOT_SCHEMA, chunk_rows=self.chunk_rows,
+                                level=self.level, meta=dict(meta, labels=labels, overview=overview))
+        try:
+            writer.write_rows(rows)
+        finally:
+            writer.close()
+        os.replace(partial, path)
+        return path
+
+    def load(self, anomaly_id, t0=None, t1=None, points=None, columns=WAVEFORM_COLUMNS):
+        """
+        Métadonnées + {'columns': {colonne: valeurs}} de l'anomalie (temps en secondes
+        epoch), limitées à [t0, t1] et à ~`points` points (min/max) ; None si inconnue.
+        """
+        path = self.path(anomaly_id)
+        if path is None:
+            return None
+        if not os.path.exists(path):
+            return self._load_legacy(anomaly_id, t0, t1, points, columns)
+        index = read_index(path, SNAPSHOT_SCHEMA)
+        meta = dict(index.get('meta', {}))
+        overview = meta.pop('overview', None)
+        windowed = t0 is not None or t1 is not None
+        if (points and not windowed and overview and len(overview['timestamp']) <= points < index['rows']
+                and all(name in overview for name in columns)):
+            # Aperçu précalculé : aucun bloc à décompresser
+            data = {name: overview[name] for name in columns}
+            return dict(meta, id=anomaly_id, rows=index['rows'], decimated=True, columns=data)
+        data = read_columns(path, columns, t0, t1, index=index)
+        return self._view(dict(meta, id=anomaly_id, rows=index['rows']), data, points)
+
+    def _load_legacy(self, anomaly_id, t0, t1, points, columns):
+        """Ancien format : JSON avec la liste complète des échantillons."""
+        path = self.path(anomaly_id, '.json')
+        if not os.path.exists(path):
+            return None
+        with open(path) as f:
+            legacy = json.load(f)
+        samples = legacy.pop('data', None) or []
+        t0 = to_epoch(t0) if t0 is not None else None
+        t1 = to_epoch(t1) if t1 is not None else None
+        names = ('timestamp',) + tuple(name for name in columns if name != 'timestamp')
+        data = {name: [] for name in names}
+        for sample in samples:
+            t = to_epoch(sample.get('timestamp'))
+            if (t0 is not None and t < t0) or (t1 is not None and t > t1):
+                continue
+            data['timestamp'].append(t)
+            for name in names[1:]:
+                data[name].append(sample.get(name))
+        legacy['labels'] = [{field: samples[0].get(field) for field in LABEL_FIELDS}] if samples else []
+        return self._view(dict(legacy, id=anomaly_id, rows=len(samples)), data, points)
+
+    @staticmethod
+    def _view(meta, data, points):
+        decimated = bool(points) and len(data['timestamp']) > points
+        if decimated:
+            names = [name for name in data if name != 'timestamp']
+            times, series = decimate(data['timestamp'], [data[name] for name in names], points)
+            data = dict(zip(['timestamp'] + names, [times] + series))
+        return dict(meta, decimated=decimated, columns=data)
@@ -0,0 +1,287 @@
+"""Registre des anomalies (SQLite)
+
+Une ligne par anomalie terminée dans la table `anomalies` (base dédiée, WAL),
+indexée par début, appareil, type et sévérité : les listes affichées
+("50 dernières chutes critiques de l'appareil X") ne lisent que les lignes
+demandées au lieu de tout le fichier CSV.
+
+Pagination par curseur (keyset) : (start_ts, seq) de la dernière anomalie
+envoyée, encodé "start_ts:seq", ordre du plus récent au plus ancien.
+
+Le CSV (colonnes de l'ancien anomalies_log.csv) n'est plus qu'un format
+d'export (`iter_csv`). Un anomalies_log.csv existant est importé une fois, à
+l'ouverture d'une base vide ; le fichier est laissé en place.
+
+Toutes les méthodes sont bloquantes (sqlite, vrai verrou partagé avec les
+threads d'enregistrement) : sous eventlet, les appeler via eventlet.tpool.
+"""
+
+import csv
+import io
+import logging
+import os
+import sqlite3
+from datetime import datetime
+
+from src.services.ringstore import to_epoch
+
+try:
+    # Écritures depuis les threads système d'enregistrement (anomaly_writer.py) : vrai verrou
+    from eventlet import patcher as _patcher
+    _threading = _patcher.original('threading')
+except ImportError:
+    import threading as _threading
+
+log = logging.getLogger(__name__)
+
+TABLE = 'anomalies'
+# Colonnes de l'ancien anomalies_log.csv (export), dans l'ordre
+CSV_COLUMNS = ('start_time', 'end_time', 'duration_seconds',
+               'anomaly_type', 'bpm_min', 'bpm_max', 'bpm_avg',
+               'accel_x_max', 'accel_y_max', 'accel_z_max',
+               'severity', 'description')
+COLUMNS = ('id', 'device_id', 'start_ts') + CSV_COLUMNS
+MAX_LIMIT = 1000
+_FETCH = 500
+_IMPORTED = 1  # PRAGMA user_version après l'import du CSV historique
+
+
+def parse_cursor(value):
+    """"start_ts:seq" -> (start_ts, seq), None si vide."""
+    if not value:
+        return None
+    try:
+        ts, seq = value.split(':')
+        return float(ts), int(seq)
+    except ValueError:
+        raise ValueError(f"curseur invalide: {value}")
+
+
+def _number(value, digits):
+    """Valeur numérique arrondie comme dans l'ancien CSV ('' ou None -> None)."""
+    if value is None or value == '':
+        return None
+    value = round(float(value), digits)
+    return int(value) if digits == 0 else value
+
+
+class AnomalyStore:
+    """Table `anomalies` : écriture à chaque fin d'anomalie, lectures filtrées et paginées."""
+
+    def __init__(self, path='anomalies.db', legacy_csv=None):
+        self.path = path
+        self.legacy_csv = legacy_csv
+        self._lock = _threading.Lock()
+        self._conn = None
+
+    def _connect(self):
+        conn = sqlite3.connect(self.path, timeout=30, check_same_thread=False)
+        conn.row_factory = sqlite3.Row
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute("PRAGMA busy_timeout=30000")
+        return conn
+
+    def open(self):
+        """Crée la table et ses index, importe le CSV historique au premier lancement."""
+        if self._conn is not None:
+            return self
+        with self._lock:
+            if self._conn is not None:
+                return self
+            conn = self._conn = self._connect()
+            with conn:
+                conn.execute(f"""
+                CREATE TABLE IF NOT EXISTS {TABLE} (
+                    seq INTEGER PRIMARY KEY,
+                    id TEXT NOT NULL,
+                    device_id TEXT,
+                    start_ts REAL NOT NULL,
+                    start_time TEXT,
+                    end_time TEXT,
+                    duration_seconds REAL,
+                    anomaly_type TEXT,
+                    bpm_min INTEGER,
+                    bpm_max INTEGER,
+                    bpm_avg INTEGER,
+                    accel_x_max REAL,
+                    accel_y_max REAL,
+                    accel_z_max REAL,
+                    severity TEXT,
+                    description TEXT
+                );
+                """)
+                conn.execute(f"CREATE INDEX IF NOT EXISTS idx_{TABLE}_start ON {TABLE} (start_ts)")
+                conn.execute(f"CREATE INDEX IF NOT EXISTS idx_{TABLE}_device ON {TABLE} (device_id, start_ts)")
+                conn.execute(f"CREATE INDEX IF NOT EXISTS idx_{TABLE}_type ON {TABLE} (anomaly_type, start_ts)")
+                conn.execute(f"CREATE INDEX IF NOT EXISTS idx_{TABLE}_severity ON {TABLE} (severity, start_ts)")
+                conn.execute(f"CREATE INDEX IF NOT EXISTS idx_{TABLE}_id ON {TABLE} (id)")
+            if conn.execute("PRAGMA user_version").fetchone()[0] < _IMPORTED:
+                imported = self._import_csv(conn)
+                conn.execute(f"PRAGMA user_version = {_IMPORTED}")
+                if imported:
+                    log.info("📥 %d anomalies importées depuis %s", imported, self.legacy_csv)
+        return self
+
+    def _import_csv(self, conn):
+        if not self.legacy_csv or not os.path.exists(self.legacy_csv):
+            return 0
+        with open(self.legacy_csv, newline='') as f:
+            records = []
+            for row in csv.DictReader(f):
+                try:
+                    start = datetime.fromisoformat(row['start_time'])
+                except (KeyError, TypeError, ValueError):
+                    continue  # Ligne illisible
+                row['id'] = start.strftime('%Y%m%d_%H%M%S')
+                records.append(self._values(row))
+        with conn:
+            conn.executemany(self._insert_sql(), records)
+        return len(records)
+
+    @staticmethod
+    def _insert_sql():
+        return f"INSERT INTO {TABLE} ({', '.join(COLUMNS)}) VALUES ({', '.join('?' * len(COLUMNS))})"
+
+    @staticmethod
+    def _values(record):
+        return (
+            record['id'],
+            record.get('device_id'),
+            to_epoch(record['start_time']),
+            record['start_time'],
+            record.get('end_time'),
+            _number(record.get('duration_seconds'), 1),
+            record.get('anomaly_type'),
+            _number(record.get('bpm_min'), 0),
+            _number(record.get('bpm_max'), 0),
+            _number(record.get('bpm_avg'), 0),
+            _number(record.get('accel_x_max'), 3),
+            _number(record.get('accel_y_max'), 3),
+            _number(record.get('accel_z_max'), 3),
+            record.get('severity'),
+            record.get('description'),
+        )
+
+    def add(self, record):
+        """
+        Enregistre une anomalie : dict avec id, start_time (ISO) et les colonnes
+        du CSV (device_id et valeurs numériques facultatifs) ; retourne son seq.
+        """
+        self.open()
+        with self._lock, self._conn:
+            return self._conn.execute(self._insert_sql(), self._values(record)).lastrowid
+
+    def _where(self, device=None, type_=None, severity=None, since=None, until=None, cursor=None,
+               max_seq=None):
+        """
+        Clauses WHERE ; `type_` se termine par '*' pour un préfixe ('chute*' = toutes
+        les chutes), `since`/`until` en secondes epoch, `max_seq` dernière ligne incluse.
+        """
+        clauses, params = [], []
+        if max_seq is not None:
+            clauses.append("seq <= ?")
+            params.append(max_seq)
+        if device:
+            clauses.append("device_id = ?")
+            params.append(device)
+        if type_ and type_.endswith('*'):
+            prefix = type_[:-1]
+            clauses.append("anomaly_type >= ? AND anomaly_type < ?")
+            params += [prefix, prefix + '\U0010ffff']
+        elif type_:
+            clauses.append("anomaly_type = ?")
+            params.append(type_)
+        if severity:
+            clauses.append("severity = ?")
+            params.append(severity)
+        if since is not None:
+            clauses.append("start_ts >= ?")
+            params.append(since)
+        if until is not None:
+            clauses.append("start_ts < ?")
+            params.append(until)
+        if cursor is not None:
+            clauses.append("(start_ts < ? OR (start_ts = ? AND seq < ?))")
+            params += [cursor[0], cursor[0], cursor[1]]
+        return (' WHERE ' + ' AND '.join(clauses)) if clauses else '', params
+
+    def query(self, limit=50, cursor=None, **filters):
+        """
+        Anomalies les plus récentes d'abord -> (liste de dicts, curseur suivant ou None).
+        Filtres : device, type_, severity, since, until (voir `_where`).
+        """
+        self.open()
+        limit = max(1, min(int(limit), MAX_LIMIT))
+        where, params = self._where(cursor=parse_cursor(cursor), **filters)
+        with self._lock:
+            rows = self._conn.execute(
+                f"SELECT seq, {', '.join(COLUMNS)} FROM {TABLE}{where} "
+                f"ORDER BY start_ts DESC, seq DESC LIMIT ?", params + [limit + 1]).fetchall()
+        next_cursor = None
+        if len(rows) > limit:
+            rows = rows[:limit]
+            next_cursor = f"{rows[-1]['start_ts']}:{rows[-1]['seq']}"
+        return [dict(row) for row in rows], next_cursor
+
+    def get(self, anomaly_id):
+        """Anomalie d'identifiant `anomaly_id` (la plus récente en cas de doublon), ou None."""
+        self.open()
+        with self._lock:
+            row = self._conn.execute(
+                f"SELECT seq, {', '.join(COLUMNS)} FROM {TABLE} WHERE id = ? ORDER BY seq DESC LIMIT 1",
+                (anomaly_id,)).fetchone()
+        return dict(row) if row else None
+
+    def counts(self, device=None):
+        """Nombre d'anomalies par sévérité (et 'all')."""
+        self.open()
+        where, params = self._where(device=device)
+        with self._lock:
+            rows = self._conn.execute(
+                f"SELECT severity, COUNT(*) FROM {TABLE}{where} GROUP BY severity", params).fetchall()
+        counts = {severity or 'modéré': 0 for severity, _ in rows}
+        for severity, count in rows:
+            counts[severity or 'modéré'] += count
+        counts['all'] = sum(count for _, count in rows)
+        return counts
+
+    def iter_csv(self, **filters):
+        """Export CSV (colonnes de l'ancien fichier, ordre chronologique), produit par morceaux."""
+        self.open()
+        where, params = self._where(**filters)
+        conn = self._connect()  # Connexion de lecture propre à l'export (WAL : pas de blocage des écritures)
+        try:
+            cursor = conn.execute(
+                f"SELECT {', '.join(CSV_COLUMNS)} FROM {TABLE}{where} ORDER BY start_ts, seq", params)
+            buffer = io.StringIO()
+            writer = csv.writer(buffer)
+            writer.writerow(CSV_COLUMNS)
+            while True:
+                rows = cursor.fetchmany(_FETCH)
+                if not rows:
+                    break
+                writer.writerows(tuple('' if value is None else value for value in row) for row in rows)
+                yield buffer.getvalue()
+                buffer.seek(0)
+                buffer.truncate()
+            if buffer.tell():
+                yield buffer.getvalue()
+        finally:
+            conn.close()
+
+    def last_seq(self):
+        """seq de la dernière anomalie enregistrée (0 si vide)."""
+        self.open()
+        with self._lock:
+            return self._conn.execute(f"SELECT COALESCE(MAX(seq), 0) FROM {TABLE}").fetchone()[0]
+
+    def clear(self, max_seq=None):
+        """
+        Supprime les anomalies (jusqu'à `max_seq` inclus : celles d'un export
+        préalable, sans perdre celles enregistrées entre-temps) ; retourne le nombre effacé.
+        """
+        self.open()
+        where, params = self._where(max_seq=max_seq)
+        with self._lock, self._conn:
+            return self._conn.execute(f"DELETE FROM {TABLE}{where}", params).rowcount
+
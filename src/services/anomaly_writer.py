@@ -0,0 +1,149 @@
+"""Enregistrement des anomalies hors de la boucle de réception
+
+La boucle UDP ne fait que mettre une anomalie terminée en file (bornée) et
+repart. Des threads système (`workers`) exécutent la fonction d'enregistrement
+(statistiques, fichier de signaux, registre SQLite) ; les résultats sont
+repris côté serveur par `run` (tâche de fond : socketio.start_background_task)
+qui appelle `on_saved(job, result)` dans la boucle eventlet, là où l'on peut
+émettre vers les clients.
+
+Contre-pression : si la file est pleine, l'appelant attend l'enregistrement
+(rien n'est perdu, compteur `anomaly_saved_inline`). Celui-ci passe par
+`offload` (eventlet.tpool.execute côté serveur) : il bloque le greenlet appelant,
+jamais la boucle eventlet. Profondeur de file courante et maximale, durées
+d'enregistrement et échecs sont exposés par `stats`.
+"""
+
+import atexit
+import logging
+import time
+
+try:
+    # Sous eventlet, les écritures disque bloquantes doivent se faire dans de vrais threads
+    from eventlet import patcher as _patcher
+    _threading = _patcher.original('threading')
+    _queue = _patcher.original('queue')
+except ImportError:
+    import queue as _queue
+    import threading as _threading
+
+log = logging.getLogger(__name__)
+
+_STOP = object()
+
+
+class AnomalyWriter:
+    """Pool de threads d'enregistrement alimenté par une file bornée."""
+
+    def __init__(self, save, workers=1, queue_size=64, offload=None):
+        self.save = save
+        self.offload = offload  # offload(fn, *args) : exécution hors boucle (tpool.execute)
+        self.workers = workers
+        self.queue_size = queue_size
+        self.submitted = 0
+        self.saved = 0
+        self.saved_inline = 0
+        self.failed = 0
+        self.max_depth = 0
+        self.last_ms = 0.0
+        self.max_ms = 0.0
+        self._queue = _queue.Queue(maxsize=queue_size)
+        self._results = _queue.Queue()
+        self._lock = _threading.Lock()
+        self._threads = []
+
+    @property
+    def running(self):
+        return bool(self._threads)
+
+    def start(self):
+        if not self._threads:
+            for i in range(self.workers):
+                thread = _threading.Thread(target=self._worker, name=f'anomaly-writer-{i}', daemon=True)
+                thread.start()
+                self._threads.append(thread)
+            atexit.register(self.stop)
+        return self
+
+    def stop(self, timeout=10.0):
+        """Enregistre les anomalies en file puis arrête les threads."""
+        threads, self._threads = self._threads, []
+        for _ in threads:
+            self._queue.put(_STOP)
+        for thread in threads:
+            thread.join(timeout)
+
+    def submit(self, job):
+        """
+        Met `job` en file ; retourne True, ou le résultat de l'enregistrement attendu
+        par l'appelant (via `offload`) si la file est pleine ou les threads arrêtés
+        (voir `on_saved` sinon).
+        """
+        self.submitted += 1
+        if self.running:
+            try:
+                self._queue.put_nowait((job, time.monotonic()))
+                self.max_depth = max(self.max_depth, self._queue.qsize())
+                return True
+            except _queue.Full:
+                log.warning("⚠️  File d'enregistrement des anomalies pleine (%d) : enregistrement synchrone",
+                            self.queue_size)
+        with self._lock:
+            self.saved_inline += 1
+        if self.offload is not None:
+            return self.offload(self._save, job, time.monotonic())
+        return self._save(job, time.monotonic())
+
+    def _save(self, job, queued_at):
+        try:
+            result = self.save(job)
+        except Exception as e:
+            log.exception("❌ Erreur enregistrement anomalie: %s", e)
+            result = None
+        elapsed = (time.monotonic() - queued_at) * 1000.0
+        with self._lock:
+            if result is None:
+                self.failed += 1
+            else:
+                self.saved += 1
+            self.last_ms = elapsed
+            self.max_ms = max(self.max_ms, elapsed)
+        return result
+
+    def _worker(self):
+        while True:
+            item = self._queue.get()
+            if item is _STOP:
+                return
+            job, queued_at = item
+            self._results.put((job, self._save(job, queued_at)))
+
+    def poll(self):
+        """Résultats disponibles [(job, résultat ou None)] ; ne bloque jamais."""
+        results = []
+        while True:
+            try:
+                results.append(self._results.get_nowait())
+            except _queue.Empty:
+                return results
+
+    def run(self, on_saved, sleep, interval=0.1):
+        """Boucle de fond : `on_saved(job, result)` pour chaque anomalie enregistrée par les threads."""
+        while True:
+            for job, result in self.poll():
+                try:
+                    on_saved(job, result)
+                except Exception as e:
+                    log.error("❌ Erreur diffusion anomalie enregistrée: %s", e)
+            sleep(interval)
+
+    def stats(self):
+        return {
+            'anomaly_queue': self._queue.qsize(),
+            'anomaly_queue_max': self.max_depth,
+            'anomaly_saved': self.saved,
+            'anomaly_saved_inline': self.saved_inline,
+            'anomaly_save_failed': self.failed,
+            'anomaly_save_ms': round(self.last_ms, 1),
+            'anomaly_save_ms_max': round(self.max_ms, 1),
+        }
@@ -0,0 +1,177 @@
+"""Classification des paquets ESP32
+
+Fonctions pures (sans état global) partagées par le serveur Socket.IO et les
+processus d'ingestion : validation du BPM, classification des anomalies
+signalées par l'ESP32 et formatage des logs d'alerte.
+"""
+
+
+def validate_bpm(bpm):
+    """Valide que le BPM est dans la plage acceptable (40-180)"""
+    if bpm is None:
+        return None
+    try:
+        bpm_val = float(bpm)
+        if 40 <= bpm_val <= 180:
+            return bpm_val
+        return None
+    except (ValueError, TypeError):
+        return None
+
+
+def classifier_anomalie(packet_data):
+    """
+    Classification des anomalies basée sur les données ESP32
+    L'ESP32 envoie déjà le type et la sévérité détectés
+    
+    Format attendu:
+    {
+        "anomaly_type": "FALL_CRITICAL" | "CONVULSION" | "FALL_DETECTED" | ...
+        "anomaly_severity": "CRITICAL" | "MODERATE" | "NONE"
+        "bpm": float,
+        "signal_valid": bool,
+        "bpm_valid": bool,
+        "alert": bool
+    }
+    
+    Retourne: (type_fr, severity_fr, niveau_urgence, action, delai)
+    """
+    anomaly_type = packet_data.get('anomaly_type', 'NONE')
+    anomaly_severity = packet_data.get('anomaly_severity', 'NONE')
+    bpm = packet_data.get('bpm')
+    bpm_valid = packet_data.get('bpm_valid', False)
+    signal_valid = packet_data.get('signal_valid', False)
+    
+    # Mapping types ESP32 -> Français
+    type_mapping = {
+        'FALL_CRITICAL': 'chute_critique',
+        'CONVULSION': 'convulsion',
+        'FALL_DETECTED': 'chute_détectée',
+        'DIFFICULTY_STANDING': 'difficulté_relever',
+        'BPM_CRITICAL_LOW': 'bradycardie_critique',
+        'BPM_CRITICAL_HIGH': 'tachycardie_critique',
+        'BPM_LOW': 'bradycardie_légère',
+        'NONE': 'aucune'
+    }
+    
+    type_fr = type_mapping.get(anomaly_type, anomaly_type.lower())
+    
+    # === CLASSIFICATION SELON SÉVÉRITÉ ESP32 ===
+    
+    # ANOMALIES CRITIQUES - Intervention immédiate
+    if anomaly_severity == "CRITICAL":
+        
+        if anomaly_type == "FALL_CRITICAL":
+            return (
+                type_fr,
+                'critique',
+                'URGENCE_MAXIMALE',
+                'Chute avec immobilité - Personne possiblement inconsciente',
+                0  # Intervention immédiate
+            )
+        
+        elif anomaly_type == "CONVULSION":
+            return (
+                type_fr,
+                'critique',
+                'URGENCE_MEDICALE',
+                'Convulsion détectée après chute',
+                0  # Intervention immédiate
+            )
+        
+        elif anomaly_type == "FALL_DETECTED":
+            return (
+                type_fr,
+                'critique',
+                'SURVEILLANCE_ACTIVE',
+                'Chute détectée - Analyse en cours (5s)',
+                5  # Attendre analyse
+            )
+        
+        elif anomaly_type == "BPM_CRITICAL_LOW":
+            bpm_str = f"{bpm:.0f}" if bpm else "?"
+            return (
+                type_fr,
+                'critique',
+                'ALERTE_MEDICALE',
+                f'Bradycardie sévère: {bpm_str} bpm (< 35)',
+                10
+            )
+        
+        elif anomaly_type == "BPM_CRITICAL_HIGH":
+            bpm_str = f"{bpm:.0f}" if bpm else "?"
+            return (
+                type_fr,
+                'critique',
+                'ALERTE_MEDICALE',
+                f'Tachycardie sévère: {bpm_str} bpm (> 150)',
+                10
+            )
+        
+        else:
+            # Type critique inconnu
+            return (
+                type_fr,
+                'critique',
+                'ALERTE_CRITIQUE',
+                f'Anomalie critique: {anomaly_type}',
+                0
+            )
+    
+    # ANOMALIES MODÉRÉES - Surveillance renforcée
+    elif anomaly_severity == "MODERATE":
+        
+        if anomaly_type == "DIFFICULTY_STANDING":
+            return (
+                type_fr,
+                'grave',  # On garde 'grave' pour l'affichage (orange)
+                'ASSISTANCE_SUGGEREE',
+                'Difficulté à se relever - Chutes multiples',
+                30
+            )
+        
+        elif anomaly_type == "BPM_LOW":
+            bpm_str = f"{bpm:.0f}" if bpm else "?"
+            return (
+                type_fr,
+                'modéré',
+                'INFORMATION',
+                f'BPM légèrement bas: {bpm_str} bpm (< 50)',
+                None
+            )
+        
+        else:
+            return (
+                type_fr,
+                'modéré',
+                'SURVEILLANCE',
+                f'Anomalie modérée: {anomaly_type}',
+                None
+            )
+    
+    # Pas d'anomalie
+    else:
+        return (
+            'aucune',
+            'normal',
+            'MONITORING',
+            'Données normales',
+            None
+        )
+
+
+def format_anomaly_log(type_fr, severity_fr, niveau_urgence, message, delai):
+    """
+    Formate le log d'anomalie pour affichage
+    """
+    emoji_map = {
+        'critique': '🚨',
+        'grave': '⛔',
+        'modéré': '⚠️',
+        'normal': '✅'
+    }
+    
+    emoji = emoji_map.get(severity_fr, '❓')
+    delai_str = f"{delai}s" if delai is not None else "aucun"
+    
+    return f"{emoji} {severity_fr.upper()} | {niveau_urgence} | {message} | Délai: {delai_str}"
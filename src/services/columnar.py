@@ -0,0 +1,242 @@
+"""Format d'enregistrement colonnaire (.ecol)
+
+Format binaire sans dépendance (inspiré de Parquet/Arrow) pour les longues
+sessions : les lignes sont regroupées en blocs de `chunk_rows` ; dans chaque
+bloc, chaque colonne est un tableau typé (array) compressé par zlib. Un pied de
+fichier JSON indexe les blocs (position, taille, min/max par colonne), ce qui
+permet de ne décompresser que les colonnes et la plage de temps demandées.
+
+Structure :
+    MAGIC
+    bloc*  : b'CHNK' | lignes (u32) | nb colonnes (u16) | tailles (u32 * nb) | données
+    pied   : JSON | taille du JSON (u32) | MAGIC
+
+Le pied peut porter des métadonnées libres (`meta`, JSON) fournies à
+l'écrivain ; elles sont perdues si le fichier n'a pas été fermé.
+
+Chaque bloc est autodescriptif : un fichier sans pied (enregistrement en cours
+ou interrompu) reste lisible par un parcours séquentiel, sans statistiques.
+
+Valeurs absentes : NaN pour les flottants, -2**31 pour les entiers.
+"""
+
+import json
+import math
+import os
+import struct
+import zlib
+from array import array
+
+from src.services.ringstore import to_epoch
+
+MAGIC = b'ESPCOL01'
+EXTENSION = '.ecol'
+_CHUNK = struct.Struct('<4sIH')
+_CHUNK_MAGIC = b'CHNK'
+_FOOTER_LEN = struct.Struct('<I')
+_INT_NULL = -2 ** 31
+
+# Types de colonnes : code array + conversion d'entrée
+#   't' : temps, secondes epoch float64 (accepte ISO / ms / s)
+#   'f' : float32 ; 'd' : float64 ; 'i' : int32
+_TYPECODES = {'t': 'd', 'f': 'f', 'd': 'd', 'i': 'i'}
+
+# Schéma des enregistrements ESP32 (même ordre que les colonnes du CSV)
+SENSOR_SCHEMA = (
+    ('timestamp', 't'),
+    ('ecg', 'i'),
+    ('bpm', 'f'),
+    ('accel_x', 'f'),
+    ('accel_y', 'f'),
+    ('accel_z', 'f'),
+)
+
+
+def _convert(kind, value):
+    if value is None or value == '':
+        return _INT_NULL if kind == 'i' else math.nan
+    if kind == 't':
+        return to_epoch(value)
+    if kind == 'i':
+        return int(value)
+    return float(value)
+
+
+def _is_null(kind, value):
+    return value == _INT_NULL if kind == 'i' else value != value
+
+
+class ColumnarWriter:
+    """Écrit des lignes (séquences dans l'ordre du schéma) par blocs compressés."""
+
+    def __init__(self, path, schema=SENSOR_SCHEMA, chunk_rows=4096, level=6, meta=None):
+        self.path = path
+        self.schema = tuple((name, kind) for name, kind in schema)
+        self.chunk_rows = chunk_rows
+        self.level = level
+        self.meta = meta
+        self.chunks = []
+        self.rows = 0
+        self._buffers = [array(_TYPECODES[kind]) for _, kind in self.schema]
+        self._file = open(path, 'wb')
+        self._file.write(MAGIC)
+
+    def write_rows(self, rows):
+        kinds = [kind for _, kind in self.schema]
+        for row in rows:
+            for buffer, kind, value in zip(self._buffers, kinds, row):
+                buffer.append(_convert(kind, value))
+            if len(self._buffers[0]) >= self.chunk_rows:
+                self._write_chunk()
+
+    def _write_chunk(self):
+        count = len(self._buffers[0])
+        if not count:
+            return
+        offset = self._file.tell()
+        payloads = [zlib.compress(buffer.tobytes(), self.level) for buffer in self._buffers]
+        self._file.write(_CHUNK.pack(_CHUNK_MAGIC, count, len(payloads)))
+        self._file.write(struct.pack(f'<{len(payloads)}I', *(len(p) for p in payloads)))
+        columns = {}
+        position = self._file.tell()
+        for (name, kind), buffer, payload in zip(self.schema, self._buffers, payloads):
+            values = [v for v in buffer if not _is_null(kind, v)]
+            columns[name] = {
+                'offset': position,
+                'length': len(payload),
+                'min': min(values) if values else None,
+                'max': max(values) if values else None,
+                'nulls': count - len(values),
+            }
+            self._file.write(payload)
+            position += len(payload)
+        self.chunks.append({'offset': offset, 'rows': count, 'columns': columns})
+        self.rows += count
+        self._buffers = [array(_TYPECODES[kind]) for _, kind in self.schema]
+
+    def flush(self):
+        """Vide le tampon fichier (le bloc en cours reste en mémoire jusqu'à chunk_rows)."""
+        self._file.flush()
+
+    def fileno(self):
+        return self._file.fileno()
+
+    def tell(self):
+        return self._file.tell()
+
+    def close(self):
+        """Écrit le dernier bloc et le pied de fichier."""
+        if self._file is None:
+            return
+        self._write_chunk()
+        footer = {
+            'schema': [list(column) for column in self.schema],
+            'rows': self.rows,
+            'chunks': self.chunks,
+        }
+        if self.meta is not None:
+            footer['meta'] = self.meta
+        footer = json.dumps(footer, separators=(',', ':')).encode('utf-8')
+        self._file.write(footer)
+        self._file.write(_FOOTER_LEN.pack(len(footer)))
+        self._file.write(MAGIC)
+        self._file.close()
+        self._file = None
+
+
+def _scan(f, schema):
+    """Index des blocs par parcours séquentiel (fichier sans pied)."""
+    chunks = []
+    f.seek(len(MAGIC))
+    while True:
+        offset = f.tell()
+        head = f.read(_CHUNK.size)
+        if len(head) < _CHUNK.size:
+            break
+        magic, rows, ncols = _CHUNK.unpack(head)
+        if magic != _CHUNK_MAGIC:
+            break
+        sizes = f.read(4 * ncols)
+        if len(sizes) < 4 * ncols:
+            break
+        sizes = struct.unpack(f'<{ncols}I', sizes)
+        position = f.tell()
+        columns = {}
+        for (name, _), size in zip(schema, sizes):
+            columns[name] = {'offset': position, 'length': size, 'min': None, 'max': None}
+            position += size
+        if position > os.fstat(f.fileno()).st_size:
+            break  # Bloc tronqué
+        f.seek(position)
+        chunks.append({'offset': offset, 'rows': rows, 'columns': columns})
+    return chunks
+
+
+def read_index(path, schema=SENSOR_SCHEMA):
+    """Pied de fichier {'schema', 'rows', 'chunks', 'complete'[, 'meta']} (reconstruit si absent)."""
+    with open(path, 'rb') as f:
+        if f.read(len(MAGIC)) != MAGIC:
+            raise ValueError(f'{path}: pas un fichier colonnaire')
+        size = os.fstat(f.fileno()).st_size
+        tail = len(MAGIC) + _FOOTER_LEN.size
+        if size >= 2 * len(MAGIC) + _FOOTER_LEN.size:
+            f.seek(size - tail)
+            raw = f.read(tail)
+            if raw[_FOOTER_LEN.size:] == MAGIC:
+                (length,) = _FOOTER_LEN.unpack(raw[:_FOOTER_LEN.size])
+                f.seek(size - tail - length)
+                index = json.loads(f.read(length).decode('utf-8'))
+                index['schema'] = [tuple(column) for column in index['schema']]
+                index['complete'] = True
+                return index
+        chunks = _scan(f, schema)
+    return {
+        'schema': list(schema),
+        'rows': sum(chunk['rows'] for chunk in chunks),
+        'chunks': chunks,
+        'complete': False,
+    }
+
+
+def read_columns(path, columns=None, t0=None, t1=None, time_column='timestamp', index=None):
+    """
+    Lit les colonnes demandées (toutes par défaut) pour les lignes dont le temps
+    est dans [t0, t1] (secondes epoch, ISO ou ms). Les blocs hors plage (d'après
+    les min/max du pied) ne sont pas décompressés.
+    Retourne {colonne: list}, valeurs absentes à None ; la colonne de temps est
+    toujours incluse. `index` : pied déjà lu par read_index (évite une relecture).
+    """
+    index = index or read_index(path)
+    kinds = dict(index['schema'])
+    wanted = list(columns) if columns else [name for name, _ in index['schema']]
+    unknown = [name for name in wanted if name not in kinds]
+    if unknown:
+        raise KeyError(f'colonnes inconnues: {", ".join(unknown)}')
+    if time_column not in wanted:
+        wanted.insert(0, time_column)
+    t0 = to_epoch(t0) if t0 is not None else None
+    t1 = to_epoch(t1) if t1 is not None else None
+    filtered = t0 is not None or t1 is not None
+
+    result = {name: [] for name in wanted}
+    with open(path, 'rb') as f:
+        for chunk in index['chunks']:
+            stats = chunk['columns'][time_column]
+            if filtered and stats['min'] is not None:
+                if (t1 is not None and stats['min'] > t1) or (t0 is not None and stats['max'] < t0):
+                    continue
+            decoded = {}
+            for name in wanted:
+                meta = chunk['columns'][name]
+                f.seek(meta['offset'])
+                values = array(_TYPECODES[kinds[name]])
+                values.frombytes(zlib.decompress(f.read(meta['length'])))
+                decoded[name] = values
+            times = decoded[time_column]
+            for i in range(len(times)):
+                if filtered and ((t0 is not None and times[i] < t0) or (t1 is not None and times[i] > t1)):
+                    continue
+                for name in wanted:
+                    value = decoded[name][i]
+                    result[name].append(None if _is_null(kinds[name], value) else value)
+    return result
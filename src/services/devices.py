@@ -0,0 +1,163 @@
+"""Registre des appareils ESP32
+
+Chaque porteur (identifié par le champ `id` du paquet, ou à défaut par l'adresse
+IP source) a sa propre session : buffers circulaires, pyramides d'historique,
+machine d'états d'anomalie (avec ring de capture pré/post-déclenchement),
+moteur de fréquence cardiaque (ECG brut) et compteurs. Le registre est un dict
+ordonné (accès O(1) par paquet) ; au-delà de `max_devices`, la session inactive depuis le plus
+longtemps est libérée.
+
+Une session alloue tous ses buffers à la création (environ 1,4 Mo avec les
+réglages par défaut : 900 s à 10 Hz, pyramides de 1024 seaux, capture de 140 s).
+Avec `memory_budget` (octets), le nombre d'appareils est plafonné à
+budget / empreinte d'une session, mesurée sur une session témoin ; la capture
+peut encore grossir si l'appareil envoie plus vite que `sample_rate`.
+"""
+
+import re
+import threading
+from collections import OrderedDict
+from datetime import datetime
+
+from src.services.anomaly_capture import AnomalyCapture
+from src.services.heart_rate import HeartRateEngine
+from src.services.lod import MinMaxPyramid
+from src.services.ringstore import TimeSeriesRing
+from src.services.wire import SequenceTracker
+
+ALL_DEVICES_ROOM = 'devices:all'
+
+_UNSAFE_CHARS = re.compile(r'[^A-Za-z0-9_.-]+')
+
+
+def device_room(device_id):
+    """Nom de la room Socket.IO d'un appareil."""
+    return f'device:{device_id}'
+
+
+def resolve_device_id(packet, addr):
+    """Identifiant d'appareil : champ id/device_id du paquet, sinon IP source."""
+    device_id = packet.get('id') or packet.get('device_id')
+    if device_id is not None:
+        return str(device_id)
+    return addr[0]
+
+
+class DeviceSession:
+    """État complet d'un appareil (buffers, anomalie en cours, compteurs)."""
+
+    def __init__(self, device_id, retention_samples=None, retention_seconds=None,
+                 sample_rate=10, spill_dir=None, lod_capacity=1024, capture_options=None,
+                 heart_options=None):
+        self.device_id = device_id
+        self.room = device_room(device_id)
+        safe_id = _UNSAFE_CHARS.sub('_', device_id)
+        ring_options = {
+            'retention_samples': retention_samples,
+            'retention_seconds': retention_seconds,
+            'sample_rate': sample_rate,
+            'spill_dir': spill_dir,
+        }
+        self.signal_buffer = TimeSeriesRing(f'{safe_id}_signal', ('value', 'bpm'), **ring_options)
+        self.accel_buffer = TimeSeriesRing(f'{safe_id}_accel', ('x', 'y', 'z'), **ring_options)
+        self.signal_history = MinMaxPyramid(self.signal_buffer, capacity=lod_capacity)
+        self.accel_history = MinMaxPyramid(self.accel_buffer, capacity=lod_capacity)
+
+        # Machine d'états d'anomalie ; les échantillons sont relus dans le ring de capture
+        self.anomaly_active = False
+        self.anomaly_start_time = None
+        self.capture = AnomalyCapture(safe_id, sample_rate=sample_rate, **(capture_options or {}))
+
+        # BPM / VFC calculés côté serveur depuis l'ECG brut
+        self.heart = HeartRateEngine(**(heart_options or {}))
+
+        # Compteurs
+        self.first_seen = datetime.now()
+        self.last_seen = self.first_seen
+        self.packets_received = 0
+        self.anomalies = 0
+        self.sequence = SequenceTracker()  # Trames binaires perdues
+
+    def track_rate(self):
+        """Dimensionne le ring de capture d'après la fréquence mesurée par le moteur cardiaque."""
+        rate = self.heart.measured_rate
+        if rate is not None:
+            self.capture.ensure_rate(rate)
+
+    @property
+    def nbytes(self):
+        """Mémoire des buffers de la session (octets, hors objets Python)."""
+        rings = [self.signal_buffer, self.accel_buffer, self.capture.ring]
+        for history in (self.signal_history, self.accel_history):
+            rings.extend(history.levels)
+        return sum(ring.nbytes for ring in rings)
+
+    def summary(self):
+        return {
+            'device_id': self.device_id,
+            'first_seen': self.first_seen.isoformat(),
+            'last_seen': self.last_seen.isoformat(),
+            'packets_received': self.packets_received,
+            'total_samples': self.signal_buffer.total,
+            'anomalies': self.anomalies,
+            'frames_lost': self.sequence.lost,
+            'anomaly_active': self.anomaly_active,
+            'heart': self.heart.metrics(),
+        }
+
+
+class DeviceRegistry:
+    """Sessions par appareil, ordonnées de la moins à la plus récemment active."""
+
+    def __init__(self, max_devices=512, memory_budget=None, **session_options):
+        self.session_options = session_options
+        self.session_bytes = DeviceSession('probe', **session_options).nbytes
+        if memory_budget:
+            max_devices = min(max_devices, max(1, int(memory_budget // self.session_bytes)))
+        self.max_devices = max_devices
+        self._sessions = OrderedDict()
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self._sessions)
+
+    def get(self, device_id, create=True):
+        """
+        Session de l'appareil. Avec `create` (ingestion), elle est créée au premier
+        paquet et marquée active ; sinon (lecture), l'ordre d'éviction est inchangé.
+        """
+        session = self._sessions.get(device_id)
+        if session is not None:
+            if create:
+                self._sessions.move_to_end(device_id)
+            return session
+        if not create:
+            return None
+        with self._lock:
+            session = self._sessions.get(device_id)
+            if session is None:
+                session = DeviceSession(device_id, **self.session_options)
+                self._sessions[device_id] = session
+                self._evict()
+        return session
+
+    def _evict(self):
+        """
+        Libère les sessions les plus anciennes sans anomalie en cours (ni capture à
+        enregistrer) ; la session qui vient d'être créée n'est jamais libérée.
+        """
+        for device_id in list(self._sessions)[:-1]:
+            if len(self._sessions) <= self.max_devices:
+                break
+            session = self._sessions[device_id]
+            if not session.anomaly_active and not session.capture.pending:
+                del self._sessions[device_id]
+
+    def latest(self):
+        """Dernière session active, ou None."""
+        if not self._sessions:
+            return None
+        return next(reversed(self._sessions.values()))
+
+    def sessions(self):
+        return list(self._sessions.values())
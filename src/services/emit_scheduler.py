@@ -0,0 +1,173 @@
+"""Ordonnanceur des émissions Socket.IO
+
+Au lieu d'un `sensor_data` par paquet UDP et par client, les échantillons sont
+regroupés en un événement `sensor_batch` par tick. Les clients sont répartis en
+groupes (périmètre, fréquence) : un périmètre est la room globale ou celle d'un
+appareil, la fréquence est négociée par le client entre 20 et 60 Hz. Chaque groupe
+a sa propre room : la charge utile est sérialisée une seule fois par tick et
+partagée par tous ses abonnés.
+
+Contrôle de flux : un client qui acquitte ses trames (`batch_ack`) et a plus de
+`max_lag` trames envoyées mais non acquittées est sauté (trames perdues, pas de
+file sans limite) jusqu'à ce qu'il rattrape son retard.
+"""
+
+import json
+import logging
+import time
+from collections import deque
+
+log = logging.getLogger(__name__)
+
+
+class _Group:
+    __slots__ = ('scope', 'hz', 'room', 'interval', 'next_due', 'pending', 'seq', 'members')
+
+    def __init__(self, scope, hz, max_batch):
+        self.scope = scope
+        self.hz = hz
+        self.room = f'{scope}@{hz}'
+        self.interval = 1.0 / hz
+        self.next_due = 0.0
+        self.pending = deque(maxlen=max_batch)  # Les plus anciens sont évincés en O(1)
+        self.seq = 0
+        self.members = set()
+
+
+class EmitScheduler:
+    """Regroupe les échantillons et les émet à la fréquence de chaque groupe de clients."""
+
+    def __init__(self, socketio, event='sensor_batch', default_hz=30, min_hz=20, max_hz=60,
+                 max_batch=600, max_lag=3, namespace='/'):
+        self.socketio = socketio
+        self.event = event
+        self.min_hz = min_hz
+        self.max_hz = max_hz
+        self.default_hz = self.clamp(default_hz)
+        self.max_batch = max_batch
+        self.max_lag = max_lag
+        self.namespace = namespace
+        self._groups = {}    # (scope, hz) -> _Group
+        self._by_scope = {}  # scope -> [_Group]
+        self._clients = {}   # sid -> _Group
+        self._acked = {}     # sid -> dernier seq acquitté (clients avec contrôle de flux)
+        self._sent = {}      # sid -> dernier seq envoyé (clients avec contrôle de flux)
+        self.frames_sent = 0
+        self.frames_skipped = 0
+        self.samples_dropped = 0
+
+    def clamp(self, hz):
+        """Fréquence arrondie à la dizaine et bornée à [min_hz, max_hz]."""
+        try:
+            hz = int(round(float(hz) / 10.0) * 10)
+        except (TypeError, ValueError):
+            hz = self.default_hz
+        return max(self.min_hz, min(self.max_hz, hz))
+
+    def subscribe(self, sid, scope, hz=None):
+        """
+        Inscrit (ou déplace) un client dans le groupe (scope, hz).
+        Retourne (room_à_quitter, room_à_rejoindre) ; room_à_quitter peut être None.
+        """
+        hz = self.clamp(hz if hz is not None else self.default_hz)
+        old_room = self.unsubscribe(sid)
+        key = (scope, hz)
+        group = self._groups.get(key)
+        if group is None:
+            group = _Group(scope, hz, self.max_batch)
+            self._groups[key] = group
+            self._by_scope.setdefault(scope, []).append(group)
+        group.members.add(sid)
+        self._clients[sid] = group
+        if sid in self._acked:
+            self._acked[sid] = self._sent[sid] = group.seq
+        return old_room, group.room
+
+    def unsubscribe(self, sid):
+        """Retire un client ; retourne la room qu'il doit quitter, ou None."""
+        group = self._clients.pop(sid, None)
+        if group is None:
+            return None
+        group.members.discard(sid)
+        if not group.members:
+            del self._groups[(group.scope, group.hz)]
+            self._by_scope[group.scope].remove(group)
+            if not self._by_scope[group.scope]:
+                del self._by_scope[group.scope]
+        return group.room
+
+    def client(self, sid):
+        """(scope, hz) du client, ou None."""
+        group = self._clients.get(sid)
+        return (group.scope, group.hz) if group else None
+
+    def ack(self, sid, seq):
+        """Le client a traité la trame `seq` (active le contrôle de flux pour lui)."""
+        try:
+            self._acked[sid] = max(int(seq), self._acked.get(sid, 0))
+            self._sent.setdefault(sid, self._acked[sid])
+        except (TypeError, ValueError):
+            pass
+
+    def forget(self, sid):
+        """Client déconnecté."""
+        self._acked.pop(sid, None)
+        self._sent.pop(sid, None)
+        return self.unsubscribe(sid)
+
+    def push(self, scopes, sample):
+        """Ajoute un échantillon aux groupes abonnés à l'un des périmètres."""
+        for scope in scopes:
+            for group in self._by_scope.get(scope, ()):
+                pending = group.pending
+                if len(pending) == pending.maxlen:
+                    self.samples_dropped += 1
+                pending.append(sample)
+
+    def tick(self, now=None):
+        """Émet un sensor_batch pour chaque groupe arrivé à échéance."""
+        now = time.monotonic() if now is None else now
+        for group in list(self._groups.values()):
+            if now < group.next_due or not group.pending:
+                continue
+            group.next_due = now + group.interval
+            samples = list(group.pending)
+            group.pending.clear()
+            group.seq += 1
+            payload = json.dumps({
+                'seq': group.seq,
+                'scope': group.scope,
+                'hz': group.hz,
+                'samples': samples,
+            }, separators=(',', ':'), default=str)
+            skip = []
+            for sid in group.members:
+                if sid not in self._acked:
+                    continue
+                if self._sent[sid] - self._acked[sid] >= self.max_lag:
+                    skip.append(sid)
+                else:
+                    self._sent[sid] = group.seq
+            self.frames_skipped += len(skip)
+            if len(skip) < len(group.members):
+                self.socketio.emit(self.event, payload, to=group.room,
+                                   skip_sid=skip or None, namespace=self.namespace)
+                self.frames_sent += 1
+
+    def run(self):
+        """Boucle de fond (à lancer avec socketio.start_background_task)."""
+        period = 1.0 / self.max_hz
+        while True:
+            try:
+                self.tick()
+            except Exception as e:
+                log.error("❌ Erreur émission sensor_batch: %s", e)
+            self.socketio.sleep(period)
+
+    def stats(self):
+        return {
+            'emit_groups': len(self._groups),
+            'emit_frames_sent': self.frames_sent,
+            'emit_frames_skipped': self.frames_skipped,
+            'emit_samples_dropped': self.samples_dropped,
+        }
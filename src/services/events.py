@@ -0,0 +1,108 @@
+"""Événement capteur encodé une seule fois
+
+Un paquet devient un seul événement multi-canal (une ligne sensor_data) qui
+part vers plusieurs destinations : BD (`_store_row`), clients SSE/WebSocket
+(`realtime.publish`). La charge brute est sérialisée une fois par paquet
+(`encode_raw`) et ce texte est partagé par l'événement et la colonne `raw` ;
+le JSON de l'événement est construit au premier besoin puis réutilisé (bytes
+prêts pour le fil), `raw` y étant inséré tel quel au lieu d'être re-sérialisé.
+`raw_json=None` : événement sans copie de la charge brute.
+
+Canaux : un abonné peut ne recevoir qu'une partie des canaux
+(`?channels=accel`) ; l'encodage de chaque sous-ensemble est lui aussi fait
+une seule fois par événement, et un événement sans aucun canal demandé n'est
+pas envoyé.
+"""
+
+import json
+
+BASE_FIELDS = ('rowid', 'id', 'type', 'timestamp')
+CHANNELS = {
+    'accel': ('x', 'y', 'z'),
+    'bpm': ('bpm',),
+    'ir': ('ir',),
+    'ecg': ('ecg',),
+}
+FIELDS = BASE_FIELDS + tuple(field for fields in CHANNELS.values() for field in fields)
+
+
+def parse_channels(value):
+    """'accel,ecg' -> ('accel', 'ecg') (ordre de CHANNELS), None si vide (tous les canaux)."""
+    if not value:
+        return None
+    names = {name.strip() for name in value.split(',') if name.strip()}
+    unknown = names - set(CHANNELS)
+    if unknown:
+        raise ValueError(f"canaux inconnus: {', '.join(sorted(unknown))}")
+    return tuple(name for name in CHANNELS if name in names) or None
+
+
+def packet_type(channels):
+    """Type de ligne d'après les canaux présents : accel, ecg (cardiaque seul), multi ou raw (aucun)."""
+    accel = 'accel' in channels
+    heart = any(name != 'accel' for name in channels)
+    if accel and heart:
+        return 'multi'
+    if accel:
+        return 'accel'
+    return 'ecg' if heart else 'raw'
+
+
+def encode_raw(raw):
+    """Charge brute -> texte JSON (None reste None)."""
+    if raw is None:
+        return None
+    try:
+        return json.dumps(raw, default=str)
+    except Exception:
+        # Recours à la chaîne de caractères
+        return json.dumps(str(raw))
+
+
+class SensorEvent:
+    """Mesure normalisée + charge brute déjà encodée ; `data` est calculé une fois."""
+
+    __slots__ = FIELDS + ('raw_json', '_encoded')
+
+    def __init__(self, id_, type_, timestamp, x=None, y=None, z=None, bpm=None, ir=None, ecg=None,
+                 raw_json=None, rowid=None):
+        self.rowid = rowid
+        self.id = id_
+        self.type = type_
+        self.timestamp = timestamp
+        self.x = x
+        self.y = y
+        self.z = z
+        self.bpm = bpm
+        self.ir = ir
+        self.ecg = ecg
+        self.raw_json = raw_json
+        self._encoded = {}
+
+    @property
+    def channels(self):
+        """Canaux présents (au moins un champ non nul)."""
+        return tuple(name for name, fields in CHANNELS.items()
+                     if any(getattr(self, field) is not None for field in fields))
+
+    def has_any(self, channels):
+        return any(name in channels for name in self.channels)
+
+    @property
+    def data(self):
+        """JSON complet de l'événement (bytes UTF-8), avec `raw` inséré sans re-sérialisation."""
+        return self.encode(None)
+
+    def encode(self, channels=None):
+        """JSON limité aux `channels` (tous + raw si None), encodé une fois par sous-ensemble."""
+        data = self._encoded.get(channels)
+        if data is None:
+            if channels is None:
+                names = FIELDS
+            else:
+                names = BASE_FIELDS + tuple(field for name in channels for field in CHANNELS[name])
+            body = json.dumps({name: getattr(self, name) for name in names}, default=str)
+            if channels is None and self.raw_json is not None:
+                body = f'{body[:-1]}, "raw": {self.raw_json}}}'
+            data = self._encoded[channels] = body.encode()
+        return data
@@ -0,0 +1,335 @@
+"""Fréquence cardiaque et VFC calculées côté serveur à partir de l'ECG brut
+
+Moteur incrémental par appareil, inspiré de Pan-Tompkins :
+    ECG -> passe-bande 5-15 Hz (deux biquads, forme directe II transposée)
+        -> dérivée 5 points -> carré -> intégration glissante 150 ms
+        -> pics de l'intégrale comparés à des seuils adaptatifs (signal / bruit),
+           période réfractaire 200 ms, recherche arrière à 1,66 x RR moyen ;
+           le battement est daté au maximum du signal filtré pendant la montée
+           de l'intégrale (position du R plutôt que du pic, plus large, de l'intégrale).
+Chaque échantillon coûte O(1) (sommes glissantes, aucun tableau recopié) ; un
+bloc d'échantillons (trame binaire) est traité par `process` dans une seule
+boucle sur variables locales, `push` traite un échantillon isolé. Pas de
+traitement vectorisé (filtrage de tableaux entiers avec numpy/scipy) : numpy
+n'est pas une dépendance du serveur, et les blocs reçus (quelques dizaines
+d'échantillons) sont trop courts pour l'amortir ; la boucle scalaire garde aussi
+l'état des filtres d'un bloc à l'autre sans recopie.
+
+Sorties : (temps du R, RR en ms) à chaque battement, BPM (moyenne des 8 derniers RR), RMSSD et
+SDNN sur les RR des `window` dernières secondes (sommes glissantes, O(1) par
+battement). Les fenêtres suivent le temps du dernier échantillon reçu (`advance`
+pour un échantillon sans ECG) : sans battement depuis 2 x RR moyen (2 s au
+moins), le rythme est perdu (électrodes, asystolie) et BPM, RR, RMSSD et SDNN
+valent None jusqu'aux battements suivants.
+
+Fréquence d'échantillonnage : `sample_rate` à la construction, puis estimée
+d'après les temps reçus (moyenne des 50 premiers intervalles, vérifiée avant
+toute détection, puis suivie) ; les filtres sont recalculés si elle s'en écarte
+de plus de 20 %. En dessous de `min_rate` (ex. ECG à 10 Hz des paquets JSON) le
+QRS n'est pas mesurable : le moteur reste inactif (`supported` faux).
+"""
+
+import math
+from array import array
+from collections import deque
+
+_LOW_HZ = 5.0
+_HIGH_HZ = 15.0
+_MWI_SECONDS = 0.150
+_REFRACTORY = 0.200
+_LEARN_SECONDS = 2.0
+_RR_MIN_MS = 250.0
+_RR_MAX_MS = 2000.0
+_RR_AVERAGE = 8
+_RATE_SAMPLES = 50      # Intervalles moyennés avant la première vérification de la fréquence
+_STALE_MIN = 2.0        # Secondes minimum sans battement avant de déclarer le rythme perdu
+
+
+def _biquad(kind, cutoff, rate, q=math.sqrt(0.5)):
+    """Coefficients normalisés (b0, b1, b2, a1, a2) d'un passe-haut/passe-bas (RBJ)."""
+    w0 = 2 * math.pi * cutoff / rate
+    cos_w0, alpha = math.cos(w0), math.sin(w0) / (2 * q)
+    a0 = 1 + alpha
+    if kind == 'high':
+        b = ((1 + cos_w0) / 2, -(1 + cos_w0), (1 + cos_w0) / 2)
+    else:
+        b = ((1 - cos_w0) / 2, 1 - cos_w0, (1 - cos_w0) / 2)
+    return (b[0] / a0, b[1] / a0, b[2] / a0, -2 * cos_w0 / a0, (1 - alpha) / a0)
+
+
+class HeartRateEngine:
+    """Détection des R et VFC d'un flux ECG (un moteur par appareil)."""
+
+    def __init__(self, sample_rate=250.0, window=60.0, min_rate=2.2 * _HIGH_HZ):
+        self.window = window
+        self.min_rate = min_rate
+        self.beats = 0
+        self.last_rr = None
+        self.last_beat_time = None    # Temps du dernier battement détecté
+        self.now = None               # Temps du dernier échantillon reçu
+        self._prev_rr = None     # Dernier RR accepté consécutif (pour RMSSD)
+        self._dt = 1.0 / sample_rate  # Période estimée (moyenne, puis moyenne glissante)
+        self._measured = 0            # Intervalles de la première estimation
+        self._estimated = 0           # Échantillons depuis la dernière vérification
+        self._last_t = None
+        self._rr_recent = deque(maxlen=_RR_AVERAGE)
+        self._rr = deque()       # (temps, rr) dans la fenêtre
+        self._diffs = deque()    # (temps, (rr - rr précédent)²)
+        self._rr_sum = self._rr_sq = self._diff_sum = 0.0
+        self._design(sample_rate)
+
+    def _design(self, rate):
+        """(Re)calcule filtres et fenêtres pour `rate` Hz et repart en apprentissage."""
+        self.sample_rate = rate
+        self.supported = rate >= self.min_rate
+        self._estimated = 0
+        if not self.supported:
+            return
+        self._hp = _biquad('high', _LOW_HZ, rate)
+        self._lp = _biquad('low', _HIGH_HZ, rate)
+        self._z = [0.0] * 4                      # États des deux biquads
+        self._hist = [0.0] * 4                   # x[n-1..n-4] pour la dérivée
+        size = max(1, int(round(_MWI_SECONDS * rate)))
+        self._mwi = array('d', bytes(8 * size))
+        self._mwi_pos = 0
+        self._mwi_sum = 0.0
+        self._prev = 0.0                         # Intégrale précédente
+        self._rising = False
+        self._r_value = 0.0                      # Maximum |filtré| de la montée en cours...
+        self._r_time = None                      # ... et son temps (temps du R)
+        self._learn_until = None                 # Fin de la phase d'apprentissage
+        self._learn_max = self._learn_sum = 0.0
+        self._learn_count = 0
+        self._spk = self._npk = 0.0              # Niveaux de pic signal / bruit
+        self._last_beat = None
+        self._candidate = None                   # (temps, valeur) pour la recherche arrière
+        self._primed = 0                         # Échantillons avant que filtres et fenêtre soient remplis
+        self._rr_recent.clear()
+
+    @property
+    def measured_rate(self):
+        """Fréquence mesurée d'après les temps reçus (Hz), None avant la première estimation."""
+        if self._measured < _RATE_SAMPLES:
+            return None
+        return 1.0 / self._dt
+
+    def push(self, t, value):
+        """Ajoute un échantillon (temps en secondes, valeur ADC) ; retourne le RR (ms) d'un nouveau battement ou None."""
+        beats = self.process((t,), (value,))
+        return beats[-1][1] if beats else None
+
+    def advance(self, t):
+        """
+        Fait avancer le temps sans échantillon ECG (paquet sans signal) : fenêtres
+        glissantes élaguées, rythme déclaré perdu si plus aucun battement.
+        """
+        if self.now is not None and t <= self.now:
+            return
+        self.now = t
+        horizon = t - self.window
+        self._prune(horizon)
+        if self._rr_recent and t - self.last_beat_time > max(2.0 * self._mean_rr(), _STALE_MIN):
+            self._rr_recent.clear()
+            self.last_rr = self._prev_rr = None
+
+    def _mean_rr(self):
+        """RR moyen récent en secondes."""
+        return sum(self._rr_recent) / len(self._rr_recent) / 1000.0
+
+    def _track_rate(self, t):
+        last, self._last_t = self._last_t, t
+        if last is None:
+            return
+        dt = t - last
+        if dt <= 0 or dt > 1.0:
+            return
+        if self._measured < _RATE_SAMPLES:
+            # Première estimation : moyenne simple, vérifiée avant toute détection
+            self._measured += 1
+            self._dt += (dt - self._dt) / self._measured
+            if self._measured < _RATE_SAMPLES:
+                return
+        else:
+            self._dt += 0.01 * (dt - self._dt)
+            self._estimated += 1
+            if self._estimated < 500:
+                return
+        rate = 1.0 / self._dt
+        if abs(rate - self.sample_rate) > 0.2 * self.sample_rate:
+            self._design(round(rate))
+        else:
+            self._estimated = 0
+
+    def process(self, times, values):
+        """Traite un bloc d'échantillons alignés ; retourne les battements détectés [(temps du R, RR en ms)]."""
+        out = []
+        for t in times:
+            # Estimation de la fréquence (peu coûteuse, recalcul rare)
+            self._track_rate(t)
+        if not self.supported or self._measured < _RATE_SAMPLES:
+            if times:
+                self.advance(times[-1])
+            return out
+
+        hb0, hb1, hb2, ha1, ha2 = self._hp
+        lb0, lb1, lb2, la1, la2 = self._lp
+        z1, z2, z3, z4 = self._z
+        x1, x2, x3, x4 = self._hist
+        mwi, pos, total = self._mwi, self._mwi_pos, self._mwi_sum
+        size = len(mwi)
+        gain = self.sample_rate / 8.0
+        prev, rising = self._prev, self._rising
+        r_value, r_time = self._r_value, self._r_time
+        learn_until = self._learn_until
+        spk, npk = self._spk, self._npk
+        last_beat, candidate = self._last_beat, self._candidate
+        primed = self._primed
+        warmup = size + 4
+
+        for t, x in zip(times, values):
+            # Passe-haut puis passe-bas (DF2T)
+            y = hb0 * x + z1
+            z1 = hb1 * x - ha1 * y + z2
+            z2 = hb2 * x - ha2 * y
+            f = lb0 * y + z3
+            z3 = lb1 * y - la1 * f + z4
+            z4 = lb2 * y - la2 * f
+            # Dérivée 5 points, carré, intégration glissante
+            d = (2 * f + x1 - x3 - 2 * x4) * gain
+            x4, x3, x2, x1 = x3, x2, x1, f
+            d *= d
+            total += d - mwi[pos]
+            mwi[pos] = d
+            pos += 1
+            if pos == size:
+                pos = 0
+            m = total / size
+            if primed < warmup:
+                primed += 1
+                prev = m
+                continue
+
+            if learn_until is None:
+                learn_until = t + _LEARN_SECONDS
+            if t < learn_until:
+                # Apprentissage des niveaux signal / bruit
+                self._learn_max = max(self._learn_max, m)
+                self._learn_sum += m
+                self._learn_count += 1
+                prev = m
+                continue
+            elif self._learn_count:
+                spk = self._learn_max / 3.0
+                npk = self._learn_sum / self._learn_count / 2.0
+                self._learn_count = 0
+
+            # Position du R : maximum de |filtré| depuis le début de la montée de l'intégrale
+            a = f if f >= 0 else -f
+            if m > prev:
+                if not rising or a > r_value:
+                    r_value, r_time = a, t
+
+            threshold = npk + 0.25 * (spk - npk)
+            if m < prev and rising:
+                # Pic local de l'intégrale : battement daté au R de la montée
+                peak_t = r_time
+                if last_beat is not None and peak_t - last_beat < _REFRACTORY:
+                    pass
+                elif prev > threshold:
+                    spk = 0.125 * prev + 0.875 * spk
+                    rr = self._beat(peak_t, last_beat)
+                    if rr is not None:
+                        out.append((peak_t, rr))
+                    last_beat, candidate = peak_t, None
+                else:
+                    npk = 0.125 * prev + 0.875 * npk
+                    if prev > 0.5 * threshold and (candidate is None or prev > candidate[1]):
+                        candidate = (peak_t, prev)
+            rising = m > prev
+            prev = m
+
+            # Recherche arrière : battement manqué, on retient le meilleur pic sous le seuil
+            if candidate is not None and last_beat is not None and self._rr_recent:
+                if t - last_beat > 1.66 * self._mean_rr():
+                    spk = 0.25 * candidate[1] + 0.75 * spk
+                    rr = self._beat(candidate[0], last_beat)
+                    if rr is not None:
+                        out.append((candidate[0], rr))
+                    last_beat, candidate = candidate[0], None
+
+        self._z = [z1, z2, z3, z4]
+        self._hist = [x1, x2, x3, x4]
+        self._mwi_pos, self._mwi_sum = pos, total
+        self._prev, self._rising = prev, rising
+        self._r_value, self._r_time = r_value, r_time
+        self._learn_until = learn_until
+        self._spk, self._npk = spk, npk
+        self._last_beat, self._candidate = last_beat, candidate
+        self._primed = primed
+        if times:
+            self.advance(times[-1])
+        return out
+
+    def _beat(self, t, last_beat):
+        """Enregistre un battement au temps `t` ; retourne le RR (ms) s'il est plausible."""
+        self.beats += 1
+        self.last_beat_time = t
+        if last_beat is None:
+            return None
+        rr = (t - last_beat) * 1000.0
+        if not _RR_MIN_MS <= rr <= _RR_MAX_MS:
+            self._prev_rr = None
+            return None
+        if self._prev_rr is not None:
+            diff = (rr - self._prev_rr) ** 2
+            self._diffs.append((t, diff))
+            self._diff_sum += diff
+        self.last_rr = self._prev_rr = rr
+        self._rr_recent.append(rr)
+        self._rr.append((t, rr))
+        self._rr_sum += rr
+        self._rr_sq += rr * rr
+        self._prune(t - self.window)
+        return rr
+
+    def _prune(self, horizon):
+        """Retire des fenêtres glissantes les RR antérieurs à `horizon` (secondes)."""
+        while self._rr and self._rr[0][0] < horizon:
+            _, old = self._rr.popleft()
+            self._rr_sum -= old
+            self._rr_sq -= old * old
+        while self._diffs and self._diffs[0][0] < horizon:
+            self._diff_sum -= self._diffs.popleft()[1]
+        if not self._rr:
+            self._rr_sum = self._rr_sq = 0.0  # Pas de dérive des sommes
+        if not self._diffs:
+            self._diff_sum = 0.0
+
+    @property
+    def bpm(self):
+        """BPM d'après les derniers RR, ou None (aucun battement récent)."""
+        if not self._rr_recent:
+            return None
+        return 60000.0 * len(self._rr_recent) / sum(self._rr_recent)
+
+    def metrics(self):
+        """{'bpm', 'rr_ms', 'rmssd', 'sdnn', 'beats', 'rr_count', 'sample_rate'} (None si inconnu ou rythme perdu)."""
+        count = len(self._rr)
+        sdnn = rmssd = None
+        if not self._rr_recent:
+            count = 0  # Rythme perdu : la VFC de la fenêtre n'est plus celle du moment
+        if count >= 2:
+            mean = self._rr_sum / count
+            sdnn = math.sqrt(max(0.0, (self._rr_sq - count * mean * mean) / (count - 1)))
+        if count and self._diffs:
+            rmssd = math.sqrt(max(0.0, self._diff_sum / len(self._diffs)))
+        bpm = self.bpm
+        return {
+            'bpm': round(bpm, 1) if bpm is not None else None,
+            'rr_ms': round(self.last_rr, 1) if self.last_rr is not None else None,
+            'rmssd': round(rmssd, 1) if rmssd is not None else None,
+            'sdnn': round(sdnn, 1) if sdnn is not None else None,
+            'beats': self.beats,
+            'rr_count': count,
+            'sample_rate': self.sample_rate,
+        }
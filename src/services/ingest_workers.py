@@ -0,0 +1,183 @@
+"""Ingestion UDP multi-processus (SO_REUSEPORT)
+
+N processus ouvrent chacun un socket sur le même port UDP avec SO_REUSEPORT : le
+noyau répartit les datagrammes entre eux. Chaque processus décode et classe sa
+part des paquets, puis transmet les échantillons normalisés au processus
+Socket.IO par un socket Unix datagramme local (un message par lot).
+Un paquet qui fait échouer la normalisation est journalisé et ignoré ; un worker
+arrêté malgré tout est relancé par le serveur (`IngestWorkerPool.supervise`).
+
+Lancement d'un worker seul :
+    python -m src.services.ingest_workers <host> <port> <socket_unix>
+"""
+
+import logging
+import os
+import socket
+import subprocess
+import sys
+import time
+
+from src.services.logs import setup_logging
+from src.services.packets import decode_datagram, normalize_packet, pack_samples, unpack_samples
+from src.services.udp_batch import configure_socket, drain
+
+PROJECT_ROOT = os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+_FORWARD_BUFFER = 4 * 1024 * 1024
+_MAX_MESSAGE = 64 * 1024
+_SUPERVISE_INTERVAL = 1.0  # Secondes entre deux vérifications des workers
+
+log = logging.getLogger(__name__)
+
+
+def _send(out, forward_path, samples):
+    """Envoie les échantillons au serveur, en découpant si le message est trop gros."""
+    data = pack_samples(samples)
+    if len(data) > _MAX_MESSAGE and len(samples) > 1:
+        half = len(samples) // 2
+        _send(out, forward_path, samples[:half])
+        _send(out, forward_path, samples[half:])
+        return
+    try:
+        out.sendto(data, forward_path)
+    except OSError as e:
+        # Serveur absent ou file pleine : le lot est perdu, on continue
+        log.warning("⚠️  Worker %d: envoi impossible (%s)", os.getpid(), e)
+
+
+def worker_main(host, port, forward_path, batch_size=64, rcvbuf=None):
+    """Boucle d'un worker : lecture par lots, normalisation, transfert."""
+    sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+    sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+    sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEPORT, 1)
+    configure_socket(sock, rcvbuf)
+    sock.bind((host, port))
+    sock.settimeout(1.0)
+
+    out = socket.socket(socket.AF_UNIX, socket.SOCK_DGRAM)
+    out.setsockopt(socket.SOL_SOCKET, socket.SO_SNDBUF, _FORWARD_BUFFER)
+    parent = os.getppid()
+    log.info("📡 Worker d'ingestion %d sur %s:%s -> %s", os.getpid(), host, port, forward_path)
+
+    while True:
+        try:
+            batch = drain(sock, batch_size)
+        except socket.timeout:
+            # Arrêt si le serveur parent a disparu
+            if os.getppid() != parent:
+                return
+            continue
+        samples = []
+        for data, addr in batch:
+            try:
+                packets = decode_datagram(data)
+            except Exception as e:
+                log.exception("❌ Worker %d: datagramme illisible de %s: %s", os.getpid(), addr, e)
+                continue
+            for packet in packets:
+                try:
+                    samples.append(normalize_packet(packet, addr))
+                except (TypeError, ValueError):
+                    continue
+                except Exception as e:
+                    # Un paquet inattendu ne doit pas arrêter le worker (sa part du port serait perdue)
+                    log.exception("❌ Worker %d: paquet ignoré de %s: %s", os.getpid(), addr, e)
+        if samples:
+            _send(out, forward_path, samples)
+
+
+class IngestWorkerPool:
+    """
+    Démarre les workers et reçoit leurs lots côté serveur.
+
+    Le socket Unix est lié avant le lancement des workers pour qu'aucun lot ne
+    soit perdu au démarrage. `receive` vérifie les workers au plus toutes les
+    secondes et relance ceux qui se sont arrêtés.
+    """
+
+    def __init__(self, workers, host, port, forward_path, batch_size=64, rcvbuf=None):
+        self.workers = workers
+        self.host = host
+        self.port = port
+        self.forward_path = forward_path
+        self.batch_size = batch_size
+        self.rcvbuf = rcvbuf
+        self.processes = []
+        self.restarts = 0
+        self.sock = None
+        self._next_check = 0.0
+
+    def _spawn(self):
+        return subprocess.Popen(
+            [sys.executable, '-m', 'src.services.ingest_workers',
+             self.host, str(self.port), self.forward_path,
+             str(self.batch_size), str(self.rcvbuf or 0)],
+            cwd=PROJECT_ROOT,
+        )
+
+    def start(self):
+        if os.path.exists(self.forward_path):
+            os.unlink(self.forward_path)
+        self.sock = socket.socket(socket.AF_UNIX, socket.SOCK_DGRAM)
+        self.sock.setsockopt(socket.SOL_SOCKET, socket.SO_RCVBUF, _FORWARD_BUFFER)
+        self.sock.bind(self.forward_path)
+        self.sock.settimeout(_SUPERVISE_INTERVAL)
+        for _ in range(self.workers):
+            self.processes.append(self._spawn())
+        self._next_check = time.monotonic() + _SUPERVISE_INTERVAL
+        return self
+
+    def supervise(self):
+        """Relance les workers arrêtés ; retourne le nombre de workers relancés."""
+        restarted = 0
+        for i, process in enumerate(self.processes):
+            code = process.poll()
+            if code is None:
+                continue
+            log.error("❌ Worker d'ingestion %d arrêté (code %s) : relance", process.pid, code)
+            self.processes[i] = self._spawn()
+            restarted += 1
+        self.restarts += restarted
+        return restarted
+
+    def receive(self):
+        """Bloque jusqu'au prochain lot et retourne la liste d'échantillons (workers surveillés)."""
+        while True:
+            now = time.monotonic()
+            if now >= self._next_check:
+                self._next_check = now + _SUPERVISE_INTERVAL
+                self.supervise()
+            try:
+                data = self.sock.recv(_MAX_MESSAGE)
+            except socket.timeout:
+                continue
+            return unpack_samples(data)
+
+    def stop(self):
+        for process in self.processes:
+            process.terminate()
+        for process in self.processes:
+            try:
+                process.wait(timeout=5)
+            except subprocess.TimeoutExpired:
+                process.kill()
+        self.processes = []
+        if self.sock is not None:
+            self.sock.close()
+            self.sock = None
+        if os.path.exists(self.forward_path):
+            os.unlink(self.forward_path)
+
+
+if __name__ == '__main__':
+    args = sys.argv[1:]
+    if len(args) < 3:
+        print(__doc__)
+        sys.exit(1)
+    setup_logging()
+    try:
+        worker_main(args[0], int(args[1]), args[2],
+                    batch_size=int(args[3]) if len(args) > 3 else 64,
+                    rcvbuf=int(args[4]) if len(args) > 4 else None)
+    except KeyboardInterrupt:
+        pass
@@ -0,0 +1,212 @@
+"""Historique multi-résolution (niveaux de détail)
+
+Pyramide min/max maintenue incrémentalement au-dessus d'un TimeSeriesRing :
+chaque niveau L regroupe `factor`^(L+1) échantillons bruts en un seau qui garde,
+par canal, le minimum et le maximum dans leur ordre d'apparition. Une requête
+« N points sur [t0, t1] » choisit le niveau le plus fin qui tient dans N points,
+ce qui coûte O(N) quelle que soit la durée de la session.
+"""
+
+from src.services.ringstore import NAN, TimeSeriesRing, from_epoch
+
+
+class _Bucket:
+    """Accumulateur min/max d'un seau en cours de remplissage."""
+
+    __slots__ = ('count', 't_start', 't_end', 'mn', 'mx', 't_mn', 't_mx')
+
+    def __init__(self, width):
+        self.count = 0
+        self.t_start = self.t_end = None
+        self.mn = [NAN] * width
+        self.mx = [NAN] * width
+        self.t_mn = [0.0] * width
+        self.t_mx = [0.0] * width
+
+    def add(self, t, values):
+        if self.count == 0:
+            self.t_start = t
+        self.t_end = t
+        self.count += 1
+        mn, mx = self.mn, self.mx
+        for i, v in enumerate(values):
+            if v is None or v != v:
+                continue
+            if not v >= mn[i]:  # vrai aussi quand mn[i] est NaN
+                mn[i] = v
+                self.t_mn[i] = t
+            if not v <= mx[i]:
+                mx[i] = v
+                self.t_mx[i] = t
+
+    def merge(self, other):
+        if self.count == 0:
+            self.t_start = other.t_start
+        self.t_end = other.t_end
+        self.count += other.count
+        for i in range(len(self.mn)):
+            v = other.mn[i]
+            if v == v and not v >= self.mn[i]:
+                self.mn[i] = v
+                self.t_mn[i] = other.t_mn[i]
+            v = other.mx[i]
+            if v == v and not v <= self.mx[i]:
+                self.mx[i] = v
+                self.t_mx[i] = other.t_mx[i]
+
+    def ordered(self):
+        """Valeurs (premier extremum, second extremum) par canal, dans l'ordre temporel."""
+        first, second = [], []
+        for mn, mx, t_mn, t_mx in zip(self.mn, self.mx, self.t_mn, self.t_mx):
+            if t_mn <= t_mx:
+                first.append(mn)
+                second.append(mx)
+            else:
+                first.append(mx)
+                second.append(mn)
+        return first, second
+
+
+def decimate(times, series, points):
+    """
+    Réduit des séries alignées sur `times` à environ `points` points en gardant,
+    par seau, le minimum et le maximum de chaque série dans leur ordre
+    d'apparition (None pour une valeur absente) -> (temps, [séries]).
+    """
+    count = len(times)
+    if count <= points:
+        return list(times), [list(values) for values in series]
+    width = len(series)
+    buckets = max(1, points // 2)
+    out_times, out = [], [[] for _ in range(width)]
+    for b in range(buckets):
+        bucket = _Bucket(width)
+        for i in range(b * count // buckets, (b + 1) * count // buckets):
+            bucket.add(times[i], [NAN if values[i] is None else values[i] for values in series])
+        if bucket.count == 0:
+            continue
+        for t, values in zip((bucket.t_start, bucket.t_end), bucket.ordered()):
+            out_times.append(t)
+            for column, value in zip(out, values):
+                column.append(None if value != value else value)
+    return out_times, out
+
+
+class MinMaxPyramid:
+    """
+    Pyramide de décimation alimentée en même temps que le buffer brut.
+
+    `append` remplace `raw.append` : l'échantillon est ajouté au buffer brut puis
+    propagé dans les seaux en cours, en O(1) amorti.
+    """
+
+    def __init__(self, raw, factor=4, levels=6, capacity=2048):
+        self.raw = raw
+        self.factor = factor
+        self.channels = raw.columns[1:]
+        width = len(self.channels)
+        columns = ('t_end',) + tuple(f'{c}_first' for c in self.channels) \
+            + tuple(f'{c}_second' for c in self.channels)
+        self.levels = [
+            TimeSeriesRing(f'{raw.name}_lod{level}', columns, retention_samples=capacity,
+                           spill_chunk=min(capacity, 256))
+            for level in range(levels)
+        ]
+        self._pending = [_Bucket(width) for _ in range(levels)]
+        self._children = [0] * levels
+
+    def append(self, timestamp, *values):
+        index = self.raw.append(timestamp, *values)
+        self._pending[0].add(timestamp, values)
+        self._children[0] += 1
+        level = 0
+        while level < len(self.levels) and self._children[level] >= self.factor:
+            self._close(level)
+            level += 1
+        return index
+
+    def _close(self, level):
+        bucket = self._pending[level]
+        first, second = bucket.ordered()
+        self.levels[level].append(bucket.t_start, bucket.t_end, *first, *second)
+        if level + 1 < len(self.levels):
+            self._pending[level + 1].merge(bucket)
+            self._children[level + 1] += 1
+        self._pending[level] = _Bucket(len(self.channels))
+        self._children[level] = 0
+
+    @staticmethod
+    def _covers(ring, t0):
+        """Vrai si le ring contient encore des données remontant jusqu'à t0."""
+        if len(ring) == 0:
+            return False
+        return ring.first_index == 0 or ring.column('time', ring.first_index,
+                                                    ring.first_index + 1)[0] <= t0
+
+    def _point(self, t, values):
+        point = {'time': from_epoch(t)}
+        for name, v in zip(self.channels, values):
+            point[name] = None if v != v else v
+        return point
+
+    def window(self, t0, t1, points):
+        """
+        Au plus ~`points` points sur [t0, t1) : données brutes si elles tiennent,
+        sinon paires min/max du niveau le plus fin qui tient.
+        Retourne (niveau, liste de dicts) ; niveau = -1 pour les données brutes.
+        """
+        raw = self.raw
+        start, stop = raw.index_at(t0), raw.index_at(t1)
+        if stop - start <= points and (len(raw) == 0 or self._covers(raw, t0)):
+            return -1, raw.records(start, stop)
+
+        width = len(self.channels)
+        chosen = len(self.levels) - 1
+        for level, ring in enumerate(self.levels):
+            a, b = ring.index_at(t0), ring.index_at(t1)
+            if 2 * (b - a) <= points and self._covers(ring, t0):
+                chosen = level
+                break
+
+        ring = self.levels[chosen]
+        a, b = ring.index_at(t0), ring.index_at(t1)
+        # Niveau le plus grossier encore trop dense : fusion par pas régulier
+        step = max(1, -(-2 * (b - a) // max(points, 2)))
+        out = []
+        for row in self._merged_rows(ring, a, b, step, width):
+            t_start, t_end = row[0], row[1]
+            out.append(self._point(t_start, row[2:2 + width]))
+            out.append(self._point(t_end, row[2 + width:]))
+
+        # Seaux encore ouverts (du plus grossier au plus fin) : données les plus récentes
+        for level in range(chosen, -1, -1):
+            bucket = self._pending[level]
+            if bucket.count and t0 <= bucket.t_start < t1:
+                first, second = bucket.ordered()
+                out.append(self._point(bucket.t_start, first))
+                out.append(self._point(bucket.t_end, second))
+        return chosen, out
+
+    @staticmethod
+    def _merged_rows(ring, a, b, step, width):
+        if step == 1:
+            yield from ring.rows(a, b)
+            return
+        group = []
+        for row in ring.rows(a, b):
+            group.append(row)
+            if len(group) == step:
+                yield MinMaxPyramid._merge_group(group, width)
+                group = []
+        if group:
+            yield MinMaxPyramid._merge_group(group, width)
+
+    @staticmethod
+    def _merge_group(group, width):
+        """Fusionne des seaux consécutifs en gardant min puis max (ordre approché)."""
+        firsts, seconds = [], []
+        for i in range(width):
+            values = [v for row in group for v in (row[2 + i], row[2 + width + i]) if v == v]
+            firsts.append(min(values) if values else NAN)
+            seconds.append(max(values) if values else NAN)
+        return (group[0][0], group[-1][1], *firsts, *seconds)
@@ -0,0 +1,202 @@
+"""Journalisation structurée asynchrone
+
+- niveaux configurables (LOG_LEVEL, défaut INFO) et format texte ou JSON (LOG_FORMAT) ;
+- les handlers d'écriture tournent dans un thread système dédié, alimenté par une
+  file bornée : le chemin d'ingestion ne fait jamais d'I/O console (si la file est
+  pleine, l'enregistrement est compté puis abandonné) ;
+- RateLimitFilter échantillonne les lignes par paquet (N par seconde et par modèle
+  de message) ;
+- PeriodicSummary remplace ces lignes par un résumé agrégé périodique
+  (paquets/s, anomalies/min, ...).
+"""
+
+import json
+import logging
+import logging.handlers
+import os
+import sys
+import time
+
+try:
+    # Sous eventlet, les threads et files « verts » bloqueraient la boucle : on
+    # utilise les modules d'origine pour le thread d'écriture.
+    from eventlet import patcher as _patcher
+    _threading = _patcher.original('threading')
+    _queue = _patcher.original('queue')
+except ImportError:
+    import queue as _queue
+    import threading as _threading
+
+_STANDARD_ATTRS = set(vars(logging.makeLogRecord({}))) | {'message', 'asctime', 'suppressed'}
+
+_listener = None
+
+
+class JsonFormatter(logging.Formatter):
+    """Une ligne JSON par enregistrement, champs `extra` inclus."""
+
+    def format(self, record):
+        entry = {
+            'ts': self.formatTime(record, '%Y-%m-%dT%H:%M:%S'),
+            'level': record.levelname,
+            'logger': record.name,
+            'msg': record.getMessage(),
+        }
+        for key, value in vars(record).items():
+            if key not in _STANDARD_ATTRS:
+                entry[key] = value
+        if getattr(record, 'suppressed', 0):
+            entry['suppressed'] = record.suppressed
+        if record.exc_info:
+            entry['exc'] = self.formatException(record.exc_info)
+        return json.dumps(entry, default=str, ensure_ascii=False)
+
+
+class TextFormatter(logging.Formatter):
+    def format(self, record):
+        text = super().format(record)
+        if getattr(record, 'suppressed', 0):
+            text += f" (+{record.suppressed} similaires)"
+        return text
+
+
+class DroppingQueueHandler(logging.handlers.QueueHandler):
+    """QueueHandler qui n'attend jamais : file pleine = enregistrement abandonné."""
+
+    def __init__(self, log_queue):
+        super().__init__(log_queue)
+        self.dropped = 0
+
+    def enqueue(self, record):
+        try:
+            self.queue.put_nowait(record)
+        except _queue.Full:
+            self.dropped += 1
+
+
+class RateLimitFilter(logging.Filter):
+    """
+    Laisse passer au plus `rate` enregistrements par seconde (rafale `burst`) pour
+    chaque modèle de message ; les suivants sont comptés et signalés sur la
+    prochaine ligne émise. Ne s'applique qu'aux niveaux < `max_level`.
+    """
+
+    def __init__(self, rate=5.0, burst=10, max_level=logging.INFO):
+        super().__init__()
+        self.rate = rate
+        self.burst = burst
+        self.max_level = max_level
+        self._buckets = {}  # modèle -> [jetons, dernier instant, supprimés]
+
+    def filter(self, record):
+        if record.levelno >= self.max_level:
+            return True
+        now = time.monotonic()
+        key = (record.name, record.msg)
+        bucket = self._buckets.get(key)
+        if bucket is None:
+            bucket = self._buckets[key] = [float(self.burst), now, 0]
+        tokens = min(self.burst, bucket[0] + (now - bucket[1]) * self.rate)
+        bucket[1] = now
+        if tokens < 1.0:
+            bucket[0] = tokens
+            bucket[2] += 1
+            return False
+        bucket[0] = tokens - 1.0
+        record.suppressed = bucket[2]
+        bucket[2] = 0
+        return True
+
+
+class PeriodicSummary:
+    """
+    Compteurs agrégés publiés toutes les `interval` secondes sur un logger.
+    `incr` est un simple ajout dans un dict : utilisable dans le chemin critique.
+    """
+
+    def __init__(self, logger, interval=60.0, rates=None):
+        self.logger = logger
+        self.interval = interval
+        # Compteur -> (libellé, unité de temps en secondes) pour les débits affichés
+        self.rates = rates or {}
+        self._counts = {}
+        self._last = time.monotonic()
+        self._thread = None
+
+    def incr(self, name, n=1):
+        self._counts[name] = self._counts.get(name, 0) + n
+
+    def flush(self):
+        now = time.monotonic()
+        elapsed = max(now - self._last, 1e-6)
+        counts, self._counts = self._counts, {}
+        self._last = now
+        if not counts:
+            return None
+        parts = []
+        for name, value in sorted(counts.items()):
+            if name in self.rates:
+                label, unit = self.rates[name]
+                parts.append(f"{label}: {value * unit / elapsed:.1f}")
+            else:
+                parts.append(f"{name}: {value}")
+        self.logger.info("📊 Résumé %.0fs | %s", elapsed, " | ".join(parts), extra={'summary': counts})
+        return counts
+
+    def _run(self):
+        while True:
+            time.sleep(self.interval)
+            try:
+                self.flush()
+            except Exception:
+                self.logger.exception("Erreur résumé périodique")
+
+    def start(self):
+        if self._thread is None:
+            self._thread = _threading.Thread(target=self._run, name='log-summary', daemon=True)
+            self._thread.start()
+        return self
+
+
+def setup_logging(level=None, fmt=None, queue_size=10000, packet_rate=None):
+    """
+    Configure le logger racine : QueueHandler borné -> thread d'écriture -> stdout.
+    Idempotent ; retourne le DroppingQueueHandler (compteur `dropped`).
+    """
+    global _listener
+    root = logging.getLogger()
+    for handler in root.handlers:
+        if isinstance(handler, DroppingQueueHandler):
+            return handler
+
+    level = level or os.environ.get('LOG_LEVEL', 'INFO')
+    fmt = fmt or os.environ.get('LOG_FORMAT', 'text')
+    packet_rate = float(os.environ.get('LOG_PACKET_RATE', '2') if packet_rate is None else packet_rate)
+
+    stream = logging.StreamHandler(sys.stdout)
+    if fmt == 'json':
+        stream.setFormatter(JsonFormatter())
+    else:
+        stream.setFormatter(TextFormatter('%(asctime)s %(levelname)-7s %(name)s: %(message)s',
+                                          '%H:%M:%S'))
+
+    log_queue = _queue.Queue(maxsize=queue_size)
+    queue_handler = DroppingQueueHandler(log_queue)
+    queue_handler.addFilter(RateLimitFilter(rate=packet_rate, burst=max(1, int(packet_rate * 2))))
+    root.addHandler(queue_handler)
+    root.setLevel(level.upper() if isinstance(level, str) else level)
+
+    # QueueListener crée son thread avec le module threading courant : on le
+    # démarre nous-mêmes avec un vrai thread système.
+    _listener = logging.handlers.QueueListener(log_queue, stream, respect_handler_level=True)
+    _listener._thread = _threading.Thread(target=_listener._monitor, name='log-writer', daemon=True)
+    _listener._thread.start()
+    return queue_handler
+
+
+def stop_logging():
+    """Vide la file et arrête le thread d'écriture."""
+    global _listener
+    if _listener is not None and _listener._thread is not None:
+        _listener.stop()
+    _listener = None
@@ -0,0 +1,91 @@
+"""Décodage et normalisation des paquets ESP32
+
+Transforme un datagramme UDP (JSON ou trame binaire, voir wire.py) en
+échantillons normalisés (dicts à clés fixes), sans toucher à l'état du serveur.
+Utilisé en direct par flask_app et par les processus d'ingestion, qui renvoient
+les échantillons sous forme compacte (SAMPLE_FIELDS).
+"""
+
+import json
+from datetime import datetime
+
+from src.services.classification import classifier_anomalie, validate_bpm
+from src.services.devices import resolve_device_id
+from src.services.wire import decode_frame, is_binary
+
+# Ordre des champs pour l'encodage compact (liste JSON) entre processus
+SAMPLE_FIELDS = (
+    'device_id', 'seq', 'timestamp', 'ecg', 'bpm', 'accel_x', 'accel_y', 'accel_z',
+    'alert', 'classification', 'anomaly_type', 'anomaly_severity',
+    'bpm_valid', 'signal_valid', 'signal_quality',
+)
+
+
+def decode_datagram(data):
+    """
+    Retourne la liste des paquets (dicts) contenus dans le datagramme :
+    un seul pour du JSON, `count` pour une trame binaire, aucun s'il est invalide.
+    """
+    if is_binary(data):
+        try:
+            return decode_frame(data)
+        except ValueError:
+            return []
+    try:
+        packet = json.loads(data.decode('utf-8').strip())
+    except (UnicodeDecodeError, json.JSONDecodeError):
+        return []
+    return [packet] if isinstance(packet, dict) else []
+
+
+def normalize_packet(packet, addr):
+    """Extrait ECG/BPM/accéléromètre et classe l'alerte éventuelle d'un paquet ESP32."""
+    # ECG (Signal cardiaque brut) - L'ESP32 envoie 'signal'
+    ecg_value = packet.get('signal') or packet.get('ecg')
+    if ecg_value is not None:
+        try:
+            ecg_value = int(ecg_value)
+        except (ValueError, TypeError):
+            ecg_value = None
+
+    # Accéléromètre (±2.0g) - L'ESP32 envoie 'acc_x', 'acc_y', 'acc_z'
+    accel_x = packet.get('acc_x') or packet.get('x', 0.0)
+    accel_y = packet.get('acc_y') or packet.get('y', 0.0)
+    accel_z = packet.get('acc_z') or packet.get('z', 0.0)
+
+    is_alert = bool(packet.get('alert', False))
+
+    # Type et sévérité : textes attendus (classification, logs) ; autre type JSON converti
+    for field in ('anomaly_type', 'anomaly_severity'):
+        value = packet.get(field)
+        if value is not None and not isinstance(value, str):
+            packet = dict(packet, **{field: str(value)})
+
+    return {
+        'device_id': resolve_device_id(packet, addr),
+        'seq': packet.get('seq'),
+        'timestamp': packet.get('timestamp', datetime.now().isoformat()),
+        'ecg': ecg_value,
+        'bpm': validate_bpm(packet.get('bpm')),  # 40-180 ou None
+        'accel_x': max(-2.0, min(2.0, float(accel_x))),
+        'accel_y': max(-2.0, min(2.0, float(accel_y))),
+        'accel_z': max(-2.0, min(2.0, float(accel_z))),
+        'alert': is_alert,
+        'classification': classifier_anomalie(packet) if is_alert else None,
+        'anomaly_type': packet.get('anomaly_type', 'N/A'),
+        'anomaly_severity': packet.get('anomaly_severity', 'N/A'),
+        'bpm_valid': packet.get('bpm_valid', False),
+        'signal_valid': packet.get('signal_valid', False),
+        'signal_quality': packet.get('signal_quality', 0),
+    }
+
+
+def pack_samples(samples):
+    """Encode une liste d'échantillons en octets (listes JSON à champs positionnels)."""
+    return json.dumps([[sample[f] for f in SAMPLE_FIELDS] for sample in samples],
+                      separators=(',', ':')).encode('utf-8')
+
+
+def unpack_samples(data):
+    """Inverse de pack_samples."""
+    return [dict(zip(SAMPLE_FIELDS, row)) for row in json.loads(data)]
@@ -0,0 +1,218 @@
+"""Enregistreurs bufferisés avec rotation (CSV ou colonnaire)
+
+Le chemin d'ingestion ne fait qu'ajouter un lot de lignes dans une file bornée
+(pas de lock fichier, pas de flush par paquet). Un thread système dédié écrit
+les lignes et applique les politiques :
+- flush quand `flush_rows` lignes sont en attente ou après `flush_interval` s ;
+- fsync au plus toutes les `fsync_interval` s (0 = jamais) ;
+- rotation du segment au-delà de `rotate_bytes` octets ou `rotate_seconds` s ;
+- compression gzip optionnelle des segments fermés (`.csv.gz`).
+Si la file est pleine, le lot est abandonné et compté (`rows_dropped`).
+
+ColumnarRecorder écrit les mêmes lignes au format .ecol (voir columnar.py).
+"""
+
+import csv
+import gzip
+import logging
+import os
+import shutil
+import time
+from datetime import datetime
+
+from src.services.columnar import EXTENSION as COLUMNAR_EXTENSION, ColumnarWriter
+
+try:
+    # Sous eventlet, l'écriture disque doit se faire dans un vrai thread système
+    from eventlet import patcher as _patcher
+    _threading = _patcher.original('threading')
+    _queue = _patcher.original('queue')
+except ImportError:
+    import queue as _queue
+    import threading as _threading
+
+log = logging.getLogger(__name__)
+
+_STOP = object()
+
+
+class CsvRecorder:
+    """Segments CSV `{prefix}_{AAAAMMJJ_HHMMSS}.csv` écrits par un thread de fond."""
+
+    extension = '.csv'
+
+    def __init__(self, header, prefix='data_esp32', directory='.', queue_size=10000,
+                 flush_rows=500, flush_interval=1.0, fsync_interval=10.0,
+                 rotate_bytes=None, rotate_seconds=None, compress=False):
+        self.header = list(header)
+        self.prefix = prefix
+        self.directory = directory
+        self.queue_size = queue_size
+        self.flush_rows = flush_rows
+        self.flush_interval = flush_interval
+        self.fsync_interval = fsync_interval
+        self.rotate_bytes = rotate_bytes
+        self.rotate_seconds = rotate_seconds
+        self.compress = compress
+        self.filename = None  # Segment en cours d'écriture
+        self.segments = []    # Segments fermés (après compression éventuelle)
+        self.rows_written = 0
+        self.rows_dropped = 0
+        self._queue = None
+        self._thread = None
+        self._file = None
+        self._writer = None
+        self._opened_at = 0.0
+
+    @property
+    def recording(self):
+        return self._thread is not None
+
+    def start(self):
+        """Ouvre le premier segment et démarre le thread d'écriture ; retourne son nom."""
+        if self.recording:
+            return self.filename
+        self._queue = _queue.Queue(maxsize=self.queue_size)
+        self._open_segment()
+        self._thread = _threading.Thread(target=self._run, name='csv-recorder', daemon=True)
+        self._thread.start()
+        return self.filename
+
+    def stop(self, timeout=10.0):
+        """Écrit les lignes en attente, ferme (et compresse) le dernier segment."""
+        if not self.recording:
+            return
+        thread, self._thread = self._thread, None
+        self._queue.put(_STOP)
+        thread.join(timeout)
+
+    def write_rows(self, rows):
+        """Met en file un lot de lignes (listes de valeurs) ; ne bloque jamais."""
+        if not self.recording or not rows:
+            return False
+        try:
+            self._queue.put_nowait(rows)
+            return True
+        except _queue.Full:
+            self.rows_dropped += len(rows)
+            return False
+
+    def stats(self):
+        return {
+            'csv_file': self.filename,
+            'csv_rows_written': self.rows_written,
+            'csv_rows_dropped': self.rows_dropped,
+            'csv_queue': self._queue.qsize() if self._queue is not None else 0,
+            'csv_segments': len(self.segments),
+        }
+
+    def _segment_path(self):
+        stamp = datetime.now().strftime('%Y%m%d_%H%M%S')
+        path = os.path.join(self.directory, f'{self.prefix}_{stamp}{self.extension}')
+        suffix = 1
+        while os.path.exists(path) or os.path.exists(path + '.gz'):
+            path = os.path.join(self.directory, f'{self.prefix}_{stamp}_{suffix}{self.extension}')
+            suffix += 1
+        return path
+
+    # Opérations propres au format (redéfinies par ColumnarRecorder)
+
+    def _open_file(self, path):
+        self._file = open(path, 'w', newline='')
+        self._writer = csv.writer(self._file)
+        self._writer.writerow(self.header)
+        self._file.flush()
+
+    def _write(self, rows):
+        self._writer.writerows(rows)
+
+    def _close_file(self):
+        self._file.flush()
+        os.fsync(self._file.fileno())
+        self._file.close()
+        self._file = self._writer = None
+
+    def _open_segment(self):
+        os.makedirs(self.directory, exist_ok=True)
+        self.filename = self._segment_path()
+        self._open_file(self.filename)
+        self._opened_at = time.monotonic()
+
+    def _close_segment(self):
+        path = self.filename
+        self._close_file()
+        if self.compress:
+            try:
+                with open(path, 'rb') as src, gzip.open(path + '.gz', 'wb') as dst:
+                    shutil.copyfileobj(src, dst)
+                os.remove(path)
+                path += '.gz'
+            except OSError as e:
+                log.error("❌ Erreur compression %s: %s", path, e)
+        self.segments.append(path)
+        log.info("📦 Segment fermé: %s", path)
+
+    def _should_rotate(self, now):
+        if self.rotate_seconds and now - self._opened_at >= self.rotate_seconds:
+            return True
+        return bool(self.rotate_bytes) and self._file.tell() >= self.rotate_bytes
+
+    def _run(self):
+        pending = 0
+        last_flush = last_fsync = time.monotonic()
+        running = True
+        while running:
+            timeout = max(0.0, self.flush_interval - (time.monotonic() - last_flush))
+            try:
+                item = self._queue.get(timeout=timeout if pending else self.flush_interval)
+            except _queue.Empty:
+                item = None
+            try:
+                if item is _STOP:
+                    running = False
+                elif item is not None:
+                    self._write(item)
+                    pending += len(item)
+                    self.rows_written += len(item)
+
+                now = time.monotonic()
+                if pending and (not running or pending >= self.flush_rows
+                                or now - last_flush >= self.flush_interval):
+                    self._file.flush()
+                    pending = 0
+                    last_flush = now
+                    if self.fsync_interval and now - last_fsync >= self.fsync_interval:
+                        os.fsync(self._file.fileno())
+                        last_fsync = now
+                if running and self._should_rotate(now):
+                    self._close_segment()
+                    self._open_segment()
+            except Exception as e:
+                log.error("❌ Erreur CSV: %s", e)
+        try:
+            self._close_segment()
+        except Exception as e:
+            log.error("❌ Erreur fermeture CSV: %s", e)
+
+
+class ColumnarRecorder(CsvRecorder):
+    """
+    Même politique de file, flush et rotation, segments au format colonnaire
+    `.ecol`. Les lignes suivent `schema` (nom, type) ; le bloc en cours reste en
+    mémoire jusqu'à `chunk_rows` lignes (relu sans pied si la session est coupée).
+    """
+
+    extension = COLUMNAR_EXTENSION
+
+    def __init__(self, schema, chunk_rows=4096, **options):
+        options['compress'] = False  # Blocs déjà compressés
+        super().__init__([name for name, _ in schema], **options)
+        self.schema = schema
+        self.chunk_rows = chunk_rows
+
+    def _open_file(self, path):
+        # ColumnarWriter expose flush/fileno/tell/close comme un fichier
+        self._file = self._writer = ColumnarWriter(path, self.schema, chunk_rows=self.chunk_rows)
+
+    def _write(self, rows):
+        self._writer.write_rows(rows)
@@ -0,0 +1,180 @@
+"""Rétention et compactage de esp32_data.db
+
+Un thread de fond applique périodiquement :
+- des durées de conservation par type de mesure (`accel=7,ecg=30,*=90`, en
+  jours ; `*` = types non listés) et par résolution de rollup ;
+- des suppressions par blocs de `chunk_size` lignes, envoyées à l'écrivain
+  SQLite une par une (on attend la validation d'un bloc avant le suivant) :
+  les insertions s'intercalent entre les blocs au lieu d'attendre une longue
+  transaction ;
+- un `PRAGMA incremental_vacuum(N)` quand la base est en auto_vacuum
+  INCREMENTAL et que des pages libres s'accumulent : le fichier rétrécit petit
+  à petit, sans VACUUM complet bloquant.
+`stats()` donne la taille de la base (fichier + WAL), les pages libres et le
+débit de la dernière purge (lignes/s).
+"""
+
+import logging
+import math
+import os
+import sqlite3
+import time
+
+from src.services.rollups import rollup_table
+from src.services.schema import schema_version, ts_expr
+
+try:
+    from eventlet import patcher as _patcher
+    _threading = _patcher.original('threading')
+except ImportError:
+    import threading as _threading
+
+log = logging.getLogger(__name__)
+
+_AUTO_VACUUM_MODES = {0: 'none', 1: 'full', 2: 'incremental'}
+
+
+def parse_ttls(spec, allowed=None):
+    """
+    'accel=7,ecg=30,*=90' -> {'accel': 7.0, 'ecg': 30.0, '*': 90.0} (jours).
+    ValueError si une entrée est illisible, négative ou hors de `allowed`.
+    """
+    ttls = {}
+    for part in (spec or '').split(','):
+        if not part.strip():
+            continue
+        name, sep, days = part.partition('=')
+        name = name.strip()
+        try:
+            days = float(days) if sep and name else None
+        except ValueError:
+            days = None
+        if days is None or not days >= 0 or math.isinf(days):
+            raise ValueError(f"durée de conservation invalide: {part.strip()!r}")
+        if allowed is not None and name not in allowed:
+            raise ValueError(f"{name!r} inconnu (attendu: {', '.join(allowed)})")
+        ttls[name] = days
+    return ttls
+
+
+class RetentionManager:
+    """Purge par blocs et compactage incrémental, en arrière-plan."""
+
+    def __init__(self, writer, db_path, ttls=None, rollup_ttls=None, chunk_size=2000,
+                 interval=300.0, vacuum_pages=1000, vacuum_threshold=1000):
+        self.writer = writer
+        self.db_path = db_path
+        self.ttls = dict(ttls or {})
+        self.rollup_ttls = dict(rollup_ttls or {})
+        self.chunk_size = chunk_size
+        self.interval = interval
+        self.vacuum_pages = vacuum_pages
+        self.vacuum_threshold = vacuum_threshold
+        self.rows_deleted = 0
+        self.pages_vacuumed = 0
+        self.last_run = None
+        self.last_rows = 0
+        self.last_rate = 0.0
+        self._thread = None
+
+    def start(self):
+        if self._thread is None and (self.ttls or self.rollup_ttls or self.vacuum_pages):
+            self._thread = _threading.Thread(target=self._run, name='retention', daemon=True)
+            self._thread.start()
+        return self
+
+    def _run(self):
+        while True:
+            try:
+                self.run_once()
+            except Exception as e:
+                log.error("❌ Erreur rétention: %s", e)
+            time.sleep(self.interval)
+
+    def _connect(self):
+        conn = sqlite3.connect(self.db_path, timeout=30)
+        conn.execute("PRAGMA busy_timeout=30000")
+        return conn
+
+    def _purge(self, conn, table, where, params):
+        """Supprime les lignes `where` de `table` par blocs validés un à un ; retourne le nombre."""
+        rows = conn.execute(f"SELECT COUNT(*) FROM {table} WHERE {where}", params).fetchone()[0]
+        key = 'rowid' if table == 'sensor_data' else 'device, metric, bucket'
+        sql = (f"DELETE FROM {table} WHERE ({key}) IN "
+               f"(SELECT {key} FROM {table} WHERE {where} LIMIT ?)")
+        for _ in range(math.ceil(rows / self.chunk_size)):
+            self.writer.wait(self.writer.execute(sql, (*params, self.chunk_size)))
+        return rows
+
+    def run_once(self, now_ms=None):
+        """Une passe complète (purges puis compactage) ; retourne le nombre de lignes supprimées."""
+        now_ms = int(time.time() * 1000) if now_ms is None else now_ms
+        started = time.monotonic()
+        deleted = 0
+        conn = self._connect()
+        try:
+            ts = ts_expr(schema_version(conn))
+            listed = [name for name in self.ttls if name != '*']
+            for name, days in self.ttls.items():
+                cutoff = now_ms - int(days * 86400 * 1000)
+                if name == '*':
+                    marks = ', '.join('?' * len(listed))
+                    where = f"{ts} < ?" + (f" AND type NOT IN ({marks})" if listed else '')
+                    deleted += self._purge(conn, 'sensor_data', where, (cutoff, *listed))
+                else:
+                    deleted += self._purge(conn, 'sensor_data', f"type = ? AND {ts} < ?", (name, cutoff))
+            for resolution, days in self.rollup_ttls.items():
+                cutoff = now_ms - int(days * 86400 * 1000)
+                deleted += self._purge(conn, rollup_table(resolution), "bucket < ?", (cutoff,))
+            self._vacuum(conn)
+        finally:
+            conn.close()
+
+        elapsed = max(time.monotonic() - started, 1e-6)
+        self.rows_deleted += deleted
+        self.last_run = time.time()
+        self.last_rows = deleted
+        self.last_rate = deleted / elapsed
+        if deleted:
+            log.info("🧹 Rétention: %d ligne(s) supprimée(s) en %.1fs (%.0f lignes/s)",
+                     deleted, elapsed, self.last_rate)
+        return deleted
+
+    def _vacuum(self, conn):
+        if not self.vacuum_pages:
+            return
+        mode = conn.execute("PRAGMA auto_vacuum").fetchone()[0]
+        if mode != 2:
+            return
+        free = conn.execute("PRAGMA freelist_count").fetchone()[0]
+        if free < self.vacuum_threshold:
+            return
+        # Libère au plus vacuum_pages pages : verrou d'écriture bref (busy_timeout côté écrivain)
+        # (executescript : execute() ne ferait qu'un pas, soit une seule page)
+        pages = min(free, self.vacuum_pages)
+        conn.executescript(f"PRAGMA incremental_vacuum({pages});")
+        self.pages_vacuumed += pages
+
+    def stats(self):
+        conn = self._connect()
+        try:
+            page_size = conn.execute("PRAGMA page_size").fetchone()[0]
+            page_count = conn.execute("PRAGMA page_count").fetchone()[0]
+            free = conn.execute("PRAGMA freelist_count").fetchone()[0]
+            mode = conn.execute("PRAGMA auto_vacuum").fetchone()[0]
+        finally:
+            conn.close()
+        wal = self.db_path + '-wal'
+        return {
+            'db_size_bytes': page_size * page_count,
+            'wal_size_bytes': os.path.getsize(wal) if os.path.exists(wal) else 0,
+            'free_bytes': page_size * free,
+            'auto_vacuum': _AUTO_VACUUM_MODES.get(mode, mode),
+            'ttls_days': self.ttls,
+            'rollup_ttls_days': self.rollup_ttls,
+            'rows_deleted': self.rows_deleted,
+            'pages_vacuumed': self.pages_vacuumed,
+            'last_run': self.last_run,
+            'last_rows_deleted': self.last_rows,
+            'last_rows_per_second': round(self.last_rate, 1),
+        }
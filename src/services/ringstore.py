@@ -0,0 +1,204 @@
+"""Stockage circulaire de séries temporelles
+
+Remplace les deque() illimitées de dicts par des colonnes `array('d')` préallouées
+(une colonne de temps + une colonne par valeur). La rétention est fixée en nombre
+d'échantillons ou en secondes ; les échantillons les plus anciens sont déversés
+sur disque par blocs (fichiers binaires float64, un par colonne) avant d'être
+écrasés, au lieu de rester en RAM.
+"""
+
+import logging
+import math
+import os
+from array import array
+from datetime import datetime
+
+NAN = float('nan')
+
+log = logging.getLogger(__name__)
+
+
+def to_epoch(timestamp, default=None):
+    """Convertit un timestamp (ISO, secondes ou millisecondes epoch) en secondes epoch."""
+    if isinstance(timestamp, str):
+        try:
+            return datetime.fromisoformat(timestamp.replace('Z', '+00:00')).timestamp()
+        except ValueError:
+            pass
+    elif isinstance(timestamp, (int, float)) and not isinstance(timestamp, bool):
+        if timestamp > 1e11:
+            return timestamp / 1000.0
+        if timestamp > 1e9:
+            return float(timestamp)
+    if default is not None:
+        return default
+    return datetime.now().timestamp()
+
+
+def from_epoch(seconds):
+    """Secondes epoch -> ISO local (même format que datetime.now().isoformat())."""
+    return datetime.fromtimestamp(seconds).isoformat()
+
+
+class TimeSeriesRing:
+    """
+    Buffer circulaire colonnaire à capacité fixe.
+
+    Les index exposés sont absolus (0 = premier échantillon de la session), ce qui
+    permet de garder un repère stable même après que le buffer a tourné.
+    """
+
+    def __init__(self, name, columns, retention_samples=None, retention_seconds=None,
+                 sample_rate=10, spill_dir=None, spill_chunk=1024):
+        if retention_samples is None:
+            if retention_seconds is None:
+                raise ValueError("retention_samples ou retention_seconds requis")
+            retention_samples = int(retention_seconds * sample_rate)
+        # Capacité arrondie à un multiple du bloc de déversement
+        chunks = max(1, math.ceil(retention_samples / spill_chunk))
+        self.name = name
+        self.columns = ('time',) + tuple(columns)
+        self.capacity = chunks * spill_chunk
+        self.spill_dir = spill_dir
+        self.spill_chunk = spill_chunk
+        self.spilled = 0
+        self._data = [array('d', bytes(8 * self.capacity)) for _ in self.columns]
+        self._head = 0
+        self._floor = 0       # Premier index conservé lors du dernier agrandissement
+        self._spilled_to = 0  # Index absolu jusqu'auquel les échantillons sont sur disque
+        self._spill_prefix = None
+
+    def __len__(self):
+        return min(self._head, self.capacity)
+
+    @property
+    def total(self):
+        """Nombre d'échantillons reçus depuis le début (y compris ceux évincés)."""
+        return self._head
+
+    @property
+    def nbytes(self):
+        """Mémoire occupée par les colonnes (octets)."""
+        return 8 * self.capacity * len(self.columns)
+
+    @property
+    def first_index(self):
+        return max(self._floor, self._head - self.capacity)
+
+    def grow(self, retention_samples):
+        """
+        Agrandit la capacité (jamais réduite) en gardant les échantillons et leurs
+        index absolus ; retourne True si le buffer a été réalloué. Le déversement
+        reprend à `_spilled_to` (bloc partiel compris), quel que soit l'alignement.
+        """
+        capacity = max(1, math.ceil(retention_samples / self.spill_chunk)) * self.spill_chunk
+        if capacity <= self.capacity:
+            return False
+        first = self.first_index
+        data = []
+        for name in self.columns:
+            values = self.column(name, first, self._head)
+            out = array('d', bytes(8 * capacity))
+            a = first % capacity
+            split = min(len(values), capacity - a)
+            out[a:a + split] = values[:split]
+            out[0:len(values) - split] = values[split:]
+            data.append(out)
+        self._data = data
+        self.capacity = capacity
+        self._floor = first
+        return True
+
+    def append(self, timestamp, *values):
+        """Ajoute un échantillon ; None est stocké comme NaN."""
+        pos = self._head % self.capacity
+        if self._head >= self.capacity and pos % self.spill_chunk == 0:
+            # Bloc [evicted, evicted + spill_chunk) bientôt écrasé
+            evicted = self._head - self.capacity
+            self._spill(max(evicted, self._floor), evicted + self.spill_chunk)
+        data = self._data
+        data[0][pos] = timestamp
+        for i, value in enumerate(values, 1):
+            data[i][pos] = NAN if value is None else value
+        self._head += 1
+        return self._head - 1
+
+    def _spill(self, start, stop):
+        """Écrit sur disque les index absolus [start, stop) pas encore déversés, avant qu'ils ne soient écrasés."""
+        start = max(start, self._spilled_to)
+        if not self.spill_dir or start >= stop:
+            return
+        try:
+            if self._spill_prefix is None:
+                os.makedirs(self.spill_dir, exist_ok=True)
+                stamp = datetime.now().strftime('%Y%m%d_%H%M%S')
+                self._spill_prefix = os.path.join(self.spill_dir, f'{self.name}_{stamp}')
+            ranges = self._positions(start, stop)
+            for column, data in zip(self.columns, self._data):
+                with open(f'{self._spill_prefix}.{column}.f64', 'ab') as f:
+                    for a, b in ranges:
+                        data[a:b].tofile(f)
+            self.spilled += stop - start
+            self._spilled_to = stop
+        except OSError as e:
+            log.error("❌ Erreur déversement %s: %s", self.name, e)
+
+    def _positions(self, start, stop):
+        """Plages physiques [(a, b), ...] correspondant aux index absolus [start, stop)."""
+        if start >= stop:
+            return []
+        a = start % self.capacity
+        b = a + (stop - start)
+        if b <= self.capacity:
+            return [(a, b)]
+        return [(a, self.capacity), (0, b - self.capacity)]
+
+    def _clamp(self, start, stop):
+        first = self.first_index
+        start = first if start is None else max(first, start)
+        stop = self._head if stop is None else min(self._head, stop)
+        return start, stop
+
+    def column(self, name, start=None, stop=None):
+        """Copie (array) d'une colonne sur la plage absolue [start, stop)."""
+        start, stop = self._clamp(start, stop)
+        data = self._data[self.columns.index(name)]
+        out = array('d')
+        for a, b in self._positions(start, stop):
+            out.extend(data[a:b])
+        return out
+
+    def rows(self, start=None, stop=None):
+        """Itère sur les tuples (time, *valeurs) de la plage absolue [start, stop)."""
+        start, stop = self._clamp(start, stop)
+        data = self._data
+        for a, b in self._positions(start, stop):
+            for pos in range(a, b):
+                yield tuple(col[pos] for col in data)
+
+    def records(self, start=None, stop=None):
+        """Dicts prêts pour le JSON : time en ISO, NaN -> None."""
+        names = self.columns
+        return [
+            {
+                name: (from_epoch(v) if name == 'time' else (None if v != v else v))
+                for name, v in zip(names, row)
+            }
+            for row in self.rows(start, stop)
+        ]
+
+    def tail(self, n):
+        """Les n derniers échantillons sous forme de dicts (sans copier le reste)."""
+        return self.records(max(self.first_index, self._head - n), self._head)
+
+    def index_at(self, timestamp):
+        """Premier index absolu dont le temps est >= timestamp (recherche dichotomique)."""
+        times = self._data[0]
+        lo, hi = self.first_index, self._head
+        while lo < hi:
+            mid = (lo + hi) // 2
+            if times[mid % self.capacity] < timestamp:
+                lo = mid + 1
+            else:
+                hi = mid
+        return lo
@@ -0,0 +1,157 @@
+"""Agrégats incrémentaux (rollups) de sensor_data
+
+Pour chaque appareil et chaque métrique (bpm, norme de l'accélération), trois
+tables de seaux à 1 s, 1 min et 1 h : count, min, max, sum, sumsq (moyenne et
+variance s'en déduisent). Les seaux sont accumulés en mémoire au fil des
+échantillons ; un seau est écrit (upsert additif) dès qu'il est fermé, et les
+seaux encore ouverts sont écrits périodiquement sous forme de deltas. Toutes
+les écritures passent par l'écrivain SQLite (lots, group commit).
+
+La purge des lignes brutes (voir retention.py) ne touche pas aux rollups :
+les séries longues restent disponibles après purge.
+"""
+
+import json
+import logging
+import math
+import time
+
+try:
+    from eventlet import patcher as _patcher
+    _threading = _patcher.original('threading')
+except ImportError:
+    import threading as _threading
+
+log = logging.getLogger(__name__)
+
+# Nom -> durée du seau en ms
+RESOLUTIONS = (('1s', 1000), ('1m', 60 * 1000), ('1h', 3600 * 1000))
+METRICS = ('bpm', 'accel')
+
+
+def rollup_table(resolution):
+    return f'sensor_rollup_{resolution}'
+
+
+def create_rollup_tables(conn):
+    for name, _ in RESOLUTIONS:
+        conn.execute(f"""
+        CREATE TABLE IF NOT EXISTS {rollup_table(name)} (
+            device TEXT NOT NULL,
+            metric TEXT NOT NULL,
+            bucket INTEGER NOT NULL,
+            count INTEGER NOT NULL,
+            min REAL,
+            max REAL,
+            sum REAL,
+            sumsq REAL,
+            PRIMARY KEY (device, metric, bucket)
+        ) WITHOUT ROWID;
+        """)
+
+
+def _upsert_sql(resolution):
+    return (f"INSERT INTO {rollup_table(resolution)} (device, metric, bucket, count, min, max, sum, sumsq) "
+            "VALUES (?, ?, ?, ?, ?, ?, ?, ?) "
+            "ON CONFLICT(device, metric, bucket) DO UPDATE SET "
+            "count = count + excluded.count, min = MIN(min, excluded.min), max = MAX(max, excluded.max), "
+            "sum = sum + excluded.sum, sumsq = sumsq + excluded.sumsq")
+
+
+class RollupEngine:
+    """Accumulateur en mémoire des seaux ouverts, vidé vers l'écrivain SQLite."""
+
+    def __init__(self, writer, flush_interval=5.0):
+        self.writer = writer
+        self.flush_interval = flush_interval
+        self._sql = {name: _upsert_sql(name) for name, _ in RESOLUTIONS}
+        # (résolution, appareil, métrique) -> [seau, count, min, max, sum, sumsq]
+        self._open = {}
+        self._lock = _threading.Lock()
+        self._thread = None
+
+    def add(self, device, ts_ms, bpm=None, x=None, y=None, z=None):
+        """Ajoute un échantillon (appelé une fois par paquet)."""
+        values = []
+        if bpm is not None:
+            values.append(('bpm', float(bpm)))
+        if x is not None and y is not None and z is not None:
+            values.append(('accel', math.sqrt(x * x + y * y + z * z)))
+        if not values:
+            return
+        if self._thread is None:
+            self.start()
+        with self._lock:
+            for name, size in RESOLUTIONS:
+                bucket = ts_ms - ts_ms % size
+                for metric, value in values:
+                    key = (name, device, metric)
+                    acc = self._open.get(key)
+                    if acc is not None and acc[0] != bucket:
+                        # Seau fermé (ou échantillon hors ordre) : écrit tel quel
+                        self._emit(key, acc)
+                        acc = None
+                    if acc is None or acc[1] == 0:
+                        self._open[key] = [bucket, 1, value, value, value, value * value]
+                        continue
+                    acc[1] += 1
+                    if value < acc[2]:
+                        acc[2] = value
+                    if value > acc[3]:
+                        acc[3] = value
+                    acc[4] += value
+                    acc[5] += value * value
+
+    def _emit(self, key, acc):
+        if acc[1]:
+            name, device, metric = key
+            self.writer.execute(self._sql[name], (device, metric, acc[0], acc[1], acc[2], acc[3], acc[4], acc[5]))
+
+    def flush(self):
+        """Écrit les seaux ouverts sous forme de deltas (ils restent ouverts, remis à zéro)."""
+        with self._lock:
+            for key, acc in self._open.items():
+                self._emit(key, acc)
+                acc[1] = 0
+
+    def start(self):
+        with self._lock:
+            if self._thread is None:
+                self._thread = _threading.Thread(target=self._run, name='rollups', daemon=True)
+                self._thread.start()
+        return self
+
+    def _run(self):
+        while True:
+            time.sleep(self.flush_interval)
+            try:
+                self.flush()
+            except Exception as e:
+                log.error("❌ Erreur rollups: %s", e)
+
+
+def iter_rollup(conn, resolution, device=None, metric=None, start=None, end=None, limit=10000):
+    """Seaux d'une résolution en NDJSON : count, min, max, mean, variance."""
+    clauses, params = [], []
+    if device:
+        clauses.append("device = ?")
+        params.append(device)
+    if metric:
+        clauses.append("metric = ?")
+        params.append(metric)
+    if start is not None:
+        clauses.append("bucket >= ?")
+        params.append(start)
+    if end is not None:
+        clauses.append("bucket < ?")
+        params.append(end)
+    cur = conn.execute(
+        f"SELECT device, metric, bucket, count, min, max, sum, sumsq FROM {rollup_table(resolution)}"
+        f"{' WHERE ' + ' AND '.join(clauses) if clauses else ''} ORDER BY bucket, device, metric LIMIT ?",
+        params + [int(limit)])
+    for device_id, metric_name, bucket, count, min_, max_, sum_, sumsq in cur:
+        mean = sum_ / count
+        yield json.dumps({
+            'device': device_id, 'metric': metric_name, 'bucket': bucket, 'count': count,
+            'min': min_, 'max': max_, 'mean': mean, 'variance': max(0.0, sumsq / count - mean * mean),
+        }, separators=(',', ':')) + '\n'
@@ -0,0 +1,94 @@
+"""Schéma de la table sensor_data
+
+v1 : table sans clé ni index, `timestamp` ISO TEXT, copie JSON complète `raw`.
+v2 : `seq INTEGER PRIMARY KEY` (alias du rowid, donc rowid inchangés),
+     `ts INTEGER` en millisecondes epoch UTC, index (id, ts) et (type, ts),
+     `raw` optionnel (NULL si non conservé). PRAGMA user_version = 2.
+
+Les lecteurs ne supposent pas la version : `ts_expr` / `timestamp_expr` donnent
+l'expression SQL équivalente pour la version détectée par `schema_version`.
+
+Convention : un timestamp ISO sans fuseau est en UTC, aussi bien en SQL (v1,
+`julianday`) qu'en Python (`to_epoch_ms`, migration, paramètres de requête) ;
+les timestamps générés par le serveur portent déjà le suffixe Z.
+"""
+
+from datetime import datetime, timezone
+
+from src.services.ringstore import to_epoch
+
+SCHEMA_VERSION = 2
+TABLE = 'sensor_data'
+
+# Colonnes v2 hors seq, dans l'ordre d'insertion
+V2_COLUMNS = ('id', 'type', 'ts', 'x', 'y', 'z', 'bpm', 'ir', 'ecg', 'raw')
+
+
+def create_v2(conn, table=TABLE):
+    """Crée la table v2 et ses index (sans toucher à user_version)."""
+    conn.execute(f"""
+    CREATE TABLE IF NOT EXISTS {table} (
+        seq INTEGER PRIMARY KEY,
+        id TEXT,
+        type TEXT,
+        ts INTEGER NOT NULL,
+        x REAL,
+        y REAL,
+        z REAL,
+        bpm REAL,
+        ir INTEGER,
+        ecg INTEGER,
+        raw TEXT
+    );
+    """)
+    create_indexes(conn, table)
+
+
+def create_indexes(conn, table=TABLE):
+    """Index nommés d'après sensor_data (y compris sur la table de migration, renommée ensuite)."""
+    conn.execute(f"CREATE INDEX IF NOT EXISTS idx_{TABLE}_id_ts ON {table} (id, ts)")
+    conn.execute(f"CREATE INDEX IF NOT EXISTS idx_{TABLE}_type_ts ON {table} (type, ts)")
+
+
+def table_columns(conn, table=TABLE):
+    return [row[1] for row in conn.execute(f"PRAGMA table_info({table})")]
+
+
+def schema_version(conn, table=TABLE):
+    """2 si la table a la colonne ts (même sans user_version), 1 sinon, 0 si absente."""
+    columns = table_columns(conn, table)
+    if not columns:
+        return 0
+    return SCHEMA_VERSION if 'ts' in columns else 1
+
+
+def iso_to_epoch_ms(value):
+    """ISO -> millisecondes epoch, sans fuseau = UTC (comme ts_expr v1) ; ValueError si illisible."""
+    parsed = datetime.fromisoformat(value.replace('Z', '+00:00'))
+    if parsed.tzinfo is None:
+        parsed = parsed.replace(tzinfo=timezone.utc)
+    return int(round(parsed.timestamp() * 1000))
+
+
+def to_epoch_ms(timestamp):
+    """Timestamp (ISO, s ou ms epoch) -> millisecondes epoch (maintenant si illisible)."""
+    if isinstance(timestamp, str):
+        try:
+            return iso_to_epoch_ms(timestamp)
+        except ValueError:
+            pass
+    return int(round(to_epoch(timestamp) * 1000))
+
+
+def ts_expr(version):
+    """Expression SQL du temps en ms epoch (v1 : ISO TEXT interprété en UTC)."""
+    if version >= 2:
+        return 'ts'
+    return "CAST(ROUND((julianday(timestamp) - 2440587.5) * 86400000) AS INTEGER)"
+
+
+def timestamp_expr(version):
+    """Expression SQL du timestamp ISO (v2 : reconstruit depuis ts, suffixe Z)."""
+    if version >= 2:
+        return "strftime('%Y-%m-%dT%H:%M:%fZ', ts / 1000.0, 'unixepoch')"
+    return 'timestamp'
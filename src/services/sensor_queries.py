@@ -0,0 +1,167 @@
+"""Requêtes de lecture sur sensor_data (plages de temps, agrégats)
+
+Les résultats sont produits ligne par ligne en NDJSON (un objet JSON par ligne)
+à partir d'un curseur SQLite lu par paquets : une journée de données se
+parcourt sans tout charger en mémoire.
+
+Pagination par curseur (keyset) :
+- plages : (ts, seq) de la dernière ligne envoyée, encodé "ts:seq" ;
+- agrégats : début du dernier seau envoyé (ms epoch).
+Quand `limit` est atteint, la dernière ligne NDJSON est {"next_cursor": ...}.
+Les curseurs sont décodés avant la requête (`parse_range_cursor`,
+`parse_bucket_cursor`) : un curseur invalide est refusé avant tout envoi.
+"""
+
+import json
+from datetime import datetime
+
+from src.services.schema import iso_to_epoch_ms, schema_version, timestamp_expr, ts_expr
+
+FIELDS = ('x', 'y', 'z', 'bpm', 'ir', 'ecg')
+AGGREGATES = ('min', 'max', 'mean')
+MAX_LIMIT = 100000
+_FETCH = 500
+
+
+def parse_time(value, local=False):
+    """
+    Paramètre de temps (ISO, secondes ou millisecondes epoch) -> ms epoch, ou None.
+    ISO sans fuseau : UTC comme sensor_data (voir schema), heure locale si `local`.
+    """
+    if value is None or value == '':
+        return None
+    try:
+        number = float(value)
+    except ValueError:
+        try:
+            if local:
+                return int(datetime.fromisoformat(value.replace('Z', '+00:00')).timestamp() * 1000)
+            return iso_to_epoch_ms(value)
+        except ValueError:
+            raise ValueError(f"temps invalide: {value}")
+    return int(number if number > 1e11 else number * 1000)
+
+
+def parse_fields(value, allowed=FIELDS):
+    """Liste 'a,b,c' -> tuple de champs autorisés (tous si vide)."""
+    if not value:
+        return tuple(allowed)
+    fields = tuple(f.strip() for f in value.split(',') if f.strip())
+    unknown = [f for f in fields if f not in allowed]
+    if unknown:
+        raise ValueError(f"champs inconnus: {', '.join(unknown)}")
+    return fields
+
+
+def parse_range_cursor(value):
+    """Curseur de plage "ts:seq" -> (ts, seq), ou None."""
+    if not value:
+        return None
+    try:
+        last_ts, last_seq = (int(part) for part in value.split(':'))
+    except ValueError:
+        raise ValueError(f"curseur invalide: {value}")
+    return last_ts, last_seq
+
+
+def parse_bucket_cursor(value):
+    """Curseur d'agrégat (début du dernier seau, ms epoch) -> int, ou None."""
+    if not value:
+        return None
+    try:
+        return int(value)
+    except ValueError:
+        raise ValueError(f"curseur invalide: {value}")
+
+
+def _filters(version, device, type_, start, end):
+    ts = ts_expr(version)
+    clauses, params = [], []
+    if device:
+        clauses.append("id = ?")
+        params.append(device)
+    if type_:
+        clauses.append("type = ?")
+        params.append(type_)
+    if start is not None:
+        clauses.append(f"{ts} >= ?")
+        params.append(start)
+    if end is not None:
+        clauses.append(f"{ts} < ?")
+        params.append(end)
+    return clauses, params
+
+
+def _ndjson(obj):
+    return json.dumps(obj, separators=(',', ':'), default=str) + '\n'
+
+
+def iter_range(conn, device=None, type_=None, start=None, end=None, cursor=None,
+               limit=10000, fields=FIELDS, include_raw=False):
+    """Lignes brutes triées par (ts, seq), en NDJSON ; `cursor` : (ts, seq) décodé."""
+    version = schema_version(conn)
+    ts = ts_expr(version)
+    limit = max(1, min(int(limit), MAX_LIMIT))
+    clauses, params = _filters(version, device, type_, start, end)
+    if cursor is not None:
+        clauses.append(f"({ts}, rowid) > (?, ?)")
+        params += list(cursor)
+    columns = ['rowid', 'id', 'type', f'{ts}', timestamp_expr(version)] + list(fields)
+    if include_raw:
+        columns.append('raw')
+    sql = (f"SELECT {', '.join(columns)} FROM sensor_data"
+           f"{' WHERE ' + ' AND '.join(clauses) if clauses else ''}"
+           f" ORDER BY {ts}, rowid LIMIT ?")
+    cur = conn.execute(sql, params + [limit + 1])
+    names = ['seq', 'id', 'type', 'ts', 'timestamp'] + list(fields) + (['raw'] if include_raw else [])
+    sent, last = 0, None
+    while True:
+        rows = cur.fetchmany(_FETCH)
+        if not rows:
+            break
+        for row in rows:
+            if sent == limit:
+                yield _ndjson({'next_cursor': f"{last[3]}:{last[0]}"})
+                return
+            yield _ndjson(dict(zip(names, row)))
+            last = row
+            sent += 1
+
+
+def iter_aggregate(conn, bucket_seconds, device=None, type_=None, start=None, end=None,
+                   cursor=None, limit=10000, fields=('bpm', 'x', 'y', 'z')):
+    """
+    Agrégats par seau de `bucket_seconds` : count puis min/max/mean de chaque champ,
+    calculés par SQLite (GROUP BY sur le début du seau), en NDJSON.
+    `cursor` : début du dernier seau envoyé (ms epoch, décodé).
+    """
+    version = schema_version(conn)
+    ts = ts_expr(version)
+    bucket_ms = max(1, int(float(bucket_seconds) * 1000))
+    limit = max(1, min(int(limit), MAX_LIMIT))
+    if cursor is not None:
+        after = cursor + bucket_ms
+        start = after if start is None else max(start, after)
+    clauses, params = _filters(version, device, type_, start, end)
+    aggregates = []
+    for field in fields:
+        aggregates += [f"MIN({field})", f"MAX({field})", f"AVG({field})"]
+    sql = (f"SELECT ({ts} / ?) * ? AS bucket, COUNT(*), {', '.join(aggregates)} FROM sensor_data"
+           f"{' WHERE ' + ' AND '.join(clauses) if clauses else ''}"
+           f" GROUP BY bucket ORDER BY bucket LIMIT ?")
+    cur = conn.execute(sql, [bucket_ms, bucket_ms] + params + [limit + 1])
+    sent, last = 0, None
+    while True:
+        rows = cur.fetchmany(_FETCH)
+        if not rows:
+            break
+        for row in rows:
+            if sent == limit:
+                yield _ndjson({'next_cursor': str(last)})
+                return
+            bucket = {'bucket': row[0], 'seconds': bucket_ms / 1000.0, 'count': row[1]}
+            for i, field in enumerate(fields):
+                bucket[field] = dict(zip(AGGREGATES, row[2 + 3 * i:5 + 3 * i]))
+            yield _ndjson(bucket)
+            last = row[0]
+            sent += 1
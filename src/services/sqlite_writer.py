@@ -0,0 +1,232 @@
+"""Écrivain SQLite par lots (group commit)
+
+Une seule connexion longue durée, en mode WAL, détenue par un thread dédié.
+Les appelants ne touchent jamais au fichier : ils mettent une requête en file et
+repartent. Le thread regroupe les requêtes jusqu'à `batch_rows` lignes ou
+`batch_ms` millisecondes, les exécute avec `executemany` (requêtes identiques
+consécutives) et valide le tout par un seul COMMIT.
+
+Les rowid des insertions sont attribués à l'avance (MAX(rowid) + 1 au
+démarrage, puis incrément) : `insert` retourne immédiatement l'identifiant que
+la ligne aura en base, pour que les événements temps réel puissent la
+référencer. Cela suppose que toutes les écritures de la table passent par cet
+écrivain. Attribution et mise en file se font sous un même verrou (`_order`) :
+les lignes sont validées dans l'ordre de leurs rowid, si bien que MAX(rowid)
+en base couvre toutes les lignes de rowid inférieur. Ce verrou n'est jamais
+pris par le thread d'écriture ; une file pleine bloque donc les producteurs
+sans bloquer l'écrivain.
+
+Les insertions sont décrites par nom de colonne et résolues dans le thread
+d'écriture d'après le schéma réel de la table : les colonnes absentes sont
+ignorées. Après une modification de schéma faite par un autre processus
+(migration en ligne), l'erreur SQLite vide le cache de schéma et le lot est
+rejoué une fois avec les nouvelles colonnes.
+"""
+
+import atexit
+import logging
+import sqlite3
+import time
+
+try:
+    # Sous eventlet, les appels sqlite bloquants doivent rester dans un vrai thread
+    from eventlet import patcher as _patcher
+    _threading = _patcher.original('threading')
+    _queue = _patcher.original('queue')
+except ImportError:
+    import queue as _queue
+    import threading as _threading
+
+log = logging.getLogger(__name__)
+
+_STOP = object()
+
+
+class SqliteWriter:
+    """File d'écriture vers une base SQLite, vidée par un thread unique."""
+
+    def __init__(self, path, batch_rows=500, batch_ms=50, queue_size=50000, synchronous='NORMAL'):
+        self.path = path
+        self.batch_rows = batch_rows
+        self.batch_ms = batch_ms
+        self.queue_size = queue_size
+        self.synchronous = synchronous
+        self.rows_committed = 0
+        self.commits = 0
+        self.errors = 0
+        self._queue = _queue.Queue(maxsize=queue_size)
+        self._order = _threading.Lock()   # Producteurs : numéros, rowid et mise en file
+        self._lock = _threading.Lock()    # Validation (partagé avec le thread d'écriture)
+        self._done = _threading.Condition(self._lock)
+        self._next_rowid = {}  # table -> prochain rowid
+        self._columns = {}     # table -> colonnes réelles (thread d'écriture)
+        self._submitted = 0    # Numéro de la dernière requête mise en file
+        self._committed = 0    # Numéro de la dernière requête validée
+        self._thread = None
+
+    def connect(self):
+        """Connexion configurée comme celle de l'écrivain (WAL, busy_timeout)."""
+        conn = sqlite3.connect(self.path, timeout=30, check_same_thread=False)
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute(f"PRAGMA synchronous={self.synchronous}")
+        conn.execute("PRAGMA busy_timeout=30000")
+        return conn
+
+    def start(self):
+        with self._lock:
+            if self._thread is None:
+                self._thread = _threading.Thread(target=self._run, name='sqlite-writer', daemon=True)
+                self._thread.start()
+                atexit.register(self.stop)
+        return self
+
+    def stop(self, timeout=10.0):
+        """Vide la file, valide et ferme la connexion."""
+        thread = self._thread
+        if thread is None:
+            return
+        self._queue.put(_STOP)
+        thread.join(timeout)
+        self._thread = None
+
+    def _enqueue(self, sql, params):
+        """Met en file (appelant détenteur de `_order`) : l'ordre de la file suit les numéros."""
+        self._submitted += 1
+        ticket = self._submitted
+        self._queue.put((ticket, sql, params))
+        return ticket
+
+    def execute(self, sql, params=()):
+        """Met en file une requête quelconque ; retourne son numéro (voir wait)."""
+        if self._thread is None:
+            self.start()
+        with self._order:
+            return self._enqueue(sql, tuple(params))
+
+    def insert(self, table, columns, values):
+        """
+        Met en file une insertion et retourne le rowid qu'elle aura en base.
+        `columns` est une séquence de noms, `values` les valeurs correspondantes ;
+        les colonnes que la table n'a pas sont ignorées à l'écriture.
+        """
+        if self._thread is None:
+            self.start()
+        with self._order:
+            rowid = self._next_rowid.get(table)
+            if rowid is None:
+                rowid = self._max_rowid(table) + 1
+            self._next_rowid[table] = rowid + 1
+            self._enqueue((table, ('rowid',) + tuple(columns)), (rowid, *values))
+        return rowid
+
+    def reset_rowids(self, table=None):
+        """Oublie les rowid préattribués (après une modification de schéma hors écrivain)."""
+        with self._order:
+            if table is None:
+                self._next_rowid.clear()
+            else:
+                self._next_rowid.pop(table, None)
+
+    def _max_rowid(self, table):
+        conn = sqlite3.connect(self.path, timeout=30)
+        try:
+            return conn.execute(f"SELECT COALESCE(MAX(rowid), 0) FROM {table}").fetchone()[0]
+        finally:
+            conn.close()
+
+    def wait(self, ticket=None, timeout=None):
+        """Attend la validation de la requête `ticket` (par défaut : tout ce qui est en file)."""
+        ticket = self._submitted if ticket is None else ticket
+        with self._lock:
+            return self._done.wait_for(lambda: self._committed >= ticket, timeout)
+
+    flush = wait
+
+    def stats(self):
+        return {
+            'db_queue': self._queue.qsize(),
+            'db_rows_committed': self.rows_committed,
+            'db_commits': self.commits,
+            'db_errors': self.errors,
+        }
+
+    def _collect(self):
+        """Bloque jusqu'à une requête, puis accumule jusqu'à batch_rows ou batch_ms."""
+        item = self._queue.get()
+        batch = [item]
+        if item is _STOP:
+            return batch
+        deadline = time.monotonic() + self.batch_ms / 1000.0
+        while len(batch) < self.batch_rows:
+            remaining = deadline - time.monotonic()
+            try:
+                item = self._queue.get(timeout=remaining) if remaining > 0 else self._queue.get_nowait()
+            except _queue.Empty:
+                break
+            batch.append(item)
+            if item is _STOP:
+                break
+        return batch
+
+    def _run_group(self, conn, key, group):
+        if isinstance(key, str):
+            conn.executemany(key, group)
+            return
+        # Insertion par noms de colonnes : ne garder que celles de la table
+        table, columns = key
+        present = self._columns.get(table)
+        if present is None:
+            present = self._columns[table] = {row[1] for row in conn.execute(f"PRAGMA table_info({table})")}
+        keep = [i for i, column in enumerate(columns) if column == 'rowid' or column in present]
+        sql = (f"INSERT INTO {table} ({', '.join(columns[i] for i in keep)}) "
+               f"VALUES ({', '.join('?' * len(keep))})")
+        conn.executemany(sql, [[params[i] for i in keep] for params in group])
+
+    def _apply(self, conn, items):
+        """Exécute les requêtes (executemany par groupe de requêtes identiques) et valide."""
+        group_key, group = None, []
+        for _, key, params in items:
+            if key != group_key and group:
+                self._run_group(conn, group_key, group)
+                group = []
+            group_key = key
+            group.append(params)
+        if group:
+            self._run_group(conn, group_key, group)
+        conn.commit()
+
+    def _write(self, conn, items, replay=True):
+        try:
+            self._apply(conn, items)
+        except sqlite3.Error as e:
+            conn.rollback()
+            if replay and isinstance(e, sqlite3.OperationalError):
+                # Schéma peut-être modifié par un autre processus : relire et rejouer une fois
+                self._columns.clear()
+                self._write(conn, items, replay=False)
+                return
+            if len(items) == 1:
+                self.errors += 1
+                log.error("❌ Erreur écriture SQLite: %s | %s", e, items[0][1])
+                return
+            # Isoler la ou les requêtes fautives sans perdre le reste du lot
+            for item in items:
+                self._write(conn, [item], replay=False)
+            return
+        self.commits += 1
+        self.rows_committed += len(items)
+
+    def _run(self):
+        conn = self.connect()
+        running = True
+        while running:
+            batch = self._collect()
+            if batch[-1] is _STOP:
+                batch.pop()
+                running = False
+            if batch:
+                self._write(conn, batch)
+                with self._lock:
+                    self._committed = max(self._committed, batch[-1][0])
+                    self._done.notify_all()
+        conn.close()
@@ -0,0 +1,117 @@
+"""Lecture UDP par lots
+
+Vide en une passe non bloquante tous les datagrammes en attente dans le tampon
+noyau (équivalent Python de recvmmsg) et tient des compteurs sur la taille des
+lots et les paquets perdus par le noyau, pour mesurer la marge restante.
+"""
+
+import errno
+import socket
+
+# Erreurs signalant que la file du socket est vide
+_EMPTY_ERRNOS = (errno.EAGAIN, errno.EWOULDBLOCK)
+
+
+def configure_socket(sock, rcvbuf=None):
+    """Agrandit SO_RCVBUF et retourne la taille effectivement accordée par le noyau."""
+    if rcvbuf:
+        try:
+            sock.setsockopt(socket.SOL_SOCKET, socket.SO_RCVBUF, int(rcvbuf))
+        except OSError:
+            pass
+    try:
+        return sock.getsockopt(socket.SOL_SOCKET, socket.SO_RCVBUF)
+    except OSError:
+        return None
+
+
+def drain(sock, max_batch, bufsize=4096):
+    """
+    Retourne une liste [(data, addr), ...] d'au plus max_batch datagrammes.
+
+    Le premier recvfrom est bloquant (le thread cède la main tant que rien n'arrive),
+    les suivants sont non bloquants et s'arrêtent dès que la file noyau est vide.
+    """
+    batch = [sock.recvfrom(bufsize)]
+    timeout = sock.gettimeout()
+    sock.setblocking(False)
+    try:
+        while len(batch) < max_batch:
+            try:
+                batch.append(sock.recvfrom(bufsize))
+            except (BlockingIOError, socket.timeout):
+                break
+            except OSError as e:
+                if e.errno in _EMPTY_ERRNOS:
+                    break
+                raise
+    finally:
+        sock.settimeout(timeout)
+    return batch
+
+
+def kernel_drops(port):
+    """
+    Nombre de datagrammes jetés par le noyau pour le socket UDP local sur `port`
+    (colonne `drops` de /proc/net/udp). Retourne None hors Linux.
+    """
+    total = None
+    port_hex = f":{port:04X}"
+    for path in ('/proc/net/udp', '/proc/net/udp6'):
+        try:
+            with open(path) as f:
+                next(f, None)
+                for line in f:
+                    fields = line.split()
+                    if len(fields) >= 13 and fields[1].endswith(port_hex):
+                        total = (total or 0) + int(fields[12])
+        except (OSError, ValueError):
+            continue
+    return total
+
+
+class IngestCounters:
+    """Compteurs d'ingestion : taille des lots, lots pleins et pertes noyau."""
+
+    def __init__(self, max_batch):
+        self.max_batch = max_batch
+        self.batches = 0
+        self.datagrams = 0
+        self.full_batches = 0
+        self.largest_batch = 0
+        self.kernel_drops = 0
+        self._drops_baseline = None
+
+    def start(self, port):
+        """
+        Référence des pertes noyau, à prendre juste après le bind : les pertes
+        survenues avant le premier lot sont comptées (socket absent : 0).
+        """
+        self._drops_baseline = kernel_drops(port) or 0
+
+    def record_batch(self, size):
+        self.batches += 1
+        self.datagrams += size
+        if size >= self.max_batch:
+            self.full_batches += 1
+        if size > self.largest_batch:
+            self.largest_batch = size
+
+    def update_kernel_drops(self, port):
+        """Relit /proc/net/udp ; les pertes antérieures à `start` (ou à la première lecture) sont ignorées."""
+        drops = kernel_drops(port)
+        if drops is None:
+            return self.kernel_drops
+        if self._drops_baseline is None:
+            self._drops_baseline = drops
+        self.kernel_drops = drops - self._drops_baseline
+        return self.kernel_drops
+
+    def as_dict(self):
+        return {
+            'udp_batches': self.batches,
+            'udp_batch_avg': round(self.datagrams / self.batches, 2) if self.batches else 0,
+            'udp_batch_max': self.largest_batch,
+            'udp_batch_full': self.full_batches,
+            'udp_kernel_drops': self.kernel_drops,
+        }
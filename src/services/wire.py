@@ -0,0 +1,162 @@
+"""Format binaire de télémétrie ESP32 (v1)
+
+Alternative compacte au JSON, détectée automatiquement par son octet magique
+(0xA5 ne peut pas commencer un texte UTF-8). Une trame contient un en-tête fixe
+suivi de `count` échantillons, ce qui permet d'envoyer par ex. l'ECG à 100 Hz en
+trames de 10 échantillons.
+
+En-tête (little-endian, 29 octets) :
+    B  magic        0xA5
+    B  version      1
+    B  flags        bit0 alert, bit1 bpm_valid, bit2 signal_valid
+    B  count        nombre d'échantillons (1-255)
+    I  device_id
+    I  seq          numéro de trame (incrémenté à chaque envoi)
+    Q  t0_ms        epoch ms du premier échantillon (0 = heure de réception)
+    I  period_us    période d'échantillonnage
+    H  bpm_x10      BPM * 10 (0 = absent)
+    B  anomaly_type code (voir ANOMALY_TYPES)
+    B  severity     code (voir SEVERITIES)
+    B  quality      signal_quality * 255
+
+Échantillon (8 octets) :
+    h  ecg          valeur ADC (-32768 = absente)
+    h  x, y, z      accélération en milli-g
+"""
+
+import struct
+import time
+from datetime import datetime
+
+MAGIC = 0xA5
+VERSION = 1
+
+FLAG_ALERT = 0x01
+FLAG_BPM_VALID = 0x02
+FLAG_SIGNAL_VALID = 0x04
+
+ECG_ABSENT = -32768
+
+ANOMALY_TYPES = (
+    'NONE', 'FALL_CRITICAL', 'CONVULSION', 'FALL_DETECTED', 'DIFFICULTY_STANDING',
+    'BPM_CRITICAL_LOW', 'BPM_CRITICAL_HIGH', 'BPM_LOW',
+)
+SEVERITIES = ('NONE', 'MODERATE', 'CRITICAL')
+
+_HEADER = struct.Struct('<BBBBIIQIHBBB')
+_SAMPLE = struct.Struct('<hhhh')
+
+HEADER_SIZE = _HEADER.size
+SAMPLE_SIZE = _SAMPLE.size
+
+
+def is_binary(data):
+    """Vrai si le datagramme est une trame binaire (et non du JSON)."""
+    return len(data) >= 1 and data[0] == MAGIC
+
+
+def decode_frame(data):
+    """
+    Décode une trame en liste de paquets (dicts au format JSON de l'ESP32 :
+    id, seq, timestamp, ecg, bpm, x, y, z, alert, anomaly_type, ...).
+    Lève ValueError si la trame est invalide.
+    """
+    if len(data) < HEADER_SIZE:
+        raise ValueError("trame trop courte")
+    (magic, version, flags, count, device_id, seq, t0_ms, period_us,
+     bpm_x10, type_code, severity_code, quality) = _HEADER.unpack_from(data)
+    if magic != MAGIC:
+        raise ValueError("octet magique invalide")
+    if version != VERSION:
+        raise ValueError(f"version {version} non supportée")
+    if len(data) < HEADER_SIZE + count * SAMPLE_SIZE:
+        raise ValueError("trame tronquée")
+
+    period = period_us / 1e6
+    if t0_ms:
+        t0 = t0_ms / 1000.0
+    else:
+        # Pas d'horloge côté ESP32 : le dernier échantillon est daté à la réception
+        t0 = time.time() - (count - 1) * period
+
+    common = {
+        'id': str(device_id),
+        'seq': seq,
+        'alert': bool(flags & FLAG_ALERT),
+        'bpm_valid': bool(flags & FLAG_BPM_VALID),
+        'signal_valid': bool(flags & FLAG_SIGNAL_VALID),
+        'signal_quality': quality / 255.0,
+        'anomaly_type': ANOMALY_TYPES[type_code] if type_code < len(ANOMALY_TYPES) else f'CODE_{type_code}',
+        'anomaly_severity': SEVERITIES[severity_code] if severity_code < len(SEVERITIES) else 'NONE',
+    }
+    if bpm_x10:
+        common['bpm'] = bpm_x10 / 10.0
+    packets = []
+    for i, (ecg, x, y, z) in enumerate(_SAMPLE.iter_unpack(
+            data[HEADER_SIZE:HEADER_SIZE + count * SAMPLE_SIZE])):
+        packet = dict(common)
+        packet['timestamp'] = datetime.fromtimestamp(t0 + i * period).isoformat()
+        if ecg != ECG_ABSENT:
+            packet['ecg'] = ecg
+        packet['x'] = x / 1000.0
+        packet['y'] = y / 1000.0
+        packet['z'] = z / 1000.0
+        packets.append(packet)
+    return packets
+
+
+def encode_frame(device_id, seq, samples, t0_ms=0, period_us=10000, bpm=None,
+                 alert=False, bpm_valid=False, signal_valid=False, signal_quality=0.0,
+                 anomaly_type='NONE', anomaly_severity='NONE'):
+    """
+    Encode une trame (référence pour le firmware et les simulateurs).
+    samples: liste de tuples (ecg, x, y, z) ; ecg None = absent, accélération en g.
+    """
+    flags = (FLAG_ALERT if alert else 0) | (FLAG_BPM_VALID if bpm_valid else 0) \
+        | (FLAG_SIGNAL_VALID if signal_valid else 0)
+    header = _HEADER.pack(
+        MAGIC, VERSION, flags, len(samples), device_id, seq & 0xFFFFFFFF, t0_ms, period_us,
+        int(round(bpm * 10)) if bpm else 0,
+        ANOMALY_TYPES.index(anomaly_type) if anomaly_type in ANOMALY_TYPES else 0,
+        SEVERITIES.index(anomaly_severity) if anomaly_severity in SEVERITIES else 0,
+        max(0, min(255, int(round(signal_quality * 255)))),
+    )
+    body = b''.join(
+        _SAMPLE.pack(ECG_ABSENT if ecg is None else ecg,
+                     int(round(x * 1000)), int(round(y * 1000)), int(round(z * 1000)))
+        for ecg, x, y, z in samples
+    )
+    return header + body
+
+
+class SequenceTracker:
+    """Détecte les trames perdues à partir des numéros de séquence d'un appareil."""
+
+    __slots__ = ('last_seq', 'frames', 'lost', 'out_of_order')
+
+    def __init__(self):
+        self.last_seq = None
+        self.frames = 0
+        self.lost = 0
+        self.out_of_order = 0
+
+    def update(self, seq):
+        """Enregistre une trame ; retourne le nombre de trames manquantes avant elle."""
+        if seq is None or seq == self.last_seq:
+            return 0
+        self.frames += 1
+        gap = 0
+        if self.last_seq is not None:
+            delta = (seq - self.last_seq) & 0xFFFFFFFF
+            if delta > 0x7FFFFFFF:
+                if seq < 16 and self.last_seq - seq > 256:
+                    # Appareil redémarré : la numérotation repart de zéro
+                    self.last_seq = seq
+                    return 0
+                # Trame en retard
+                self.out_of_order += 1
+                return 0
+            gap = delta - 1
+            self.lost += gap
+        self.last_seq = seq
+        return gap
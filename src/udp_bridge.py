@@ -1,117 +1,105 @@
 """Pont UDP -> SSE
 
-Écoute sur UDP (par défaut 0.0.0.0:3333), décode les charges JSON et les transfère
-dans le pipeline SSE temps réel + BD de l'application.
+Écoute sur UDP (par défaut 0.0.0.0:3333), décode les charges JSON ou les trames
+binaires (voir src/services/wire.py) et les transfère dans le pipeline SSE temps
+réel + BD de l'application.
 """
 
 import os
 import json
+import logging
 import socket
 import threading
 from datetime import datetime
 
 from src.api import realtime
-from src.api.routes import _store_row
+from src.api.routes import _store_event, encode_packet_raw, record_rollup
+from src.config import event_raw
+from src.services.events import SensorEvent, packet_type
+from src.services.wire import decode_frame, is_binary
 
 LISTEN_HOST = os.environ.get("UDP_BRIDGE_HOST", "0.0.0.0")
 LISTEN_PORT = int(os.environ.get("UDP_BRIDGE_PORT", "3333"))
 _BUFFER = 65535
 _started = False
 
+log = logging.getLogger(__name__)
+
 
 def _handle_packet(data, addr):
+    # Trame binaire : plusieurs échantillons par datagramme
+    if is_binary(data):
+        try:
+            payloads = decode_frame(data)
+        except ValueError as e:
+            log.debug("Trame binaire invalide de %s: %s", addr, e)
+            return
+        log.debug("Réception UDP de %s: %d échantillon(s) binaires", addr, len(payloads))
+        for payload in payloads:
+            _handle_payload(payload, addr)
+        return
+
     txt = data.decode("utf-8", errors="ignore")
-    print("Réception UDP de", addr, ":", txt)
+    log.debug("Réception UDP de %s: %s", addr, txt)
     try:
         payload = json.loads(txt)
     except Exception as e:
-        print("JSON invalide de", addr, ":", e)
+        log.debug("JSON invalide de %s: %s", addr, e)
         payload = {"raw": txt}
+    _handle_payload(payload, addr)
 
-    id_ = payload.get("id") or f"{addr[0]}:{addr[1]}"
-    type_ = payload.get("type") or ("ecg" if ("bpm" in payload or "ecg" in payload) else "raw")
-    timestamp = payload.get("timestamp") or datetime.utcnow().isoformat() + "Z"
 
-    # Extraire TOUS les champs numériques
-    x = None
-    y = None
-    z = None
-    bpm = None
-    ir = None
-    ecg = None
-    
+def _number(payload, key, cast):
+    """Champ numérique du paquet, None s'il est absent ou illisible (canal absent)."""
+    if key not in payload:
+        return None
     try:
-        # Accéléromètre
-        x = float(payload.get("x")) if "x" in payload else 0.0
-        y = float(payload.get("y")) if "y" in payload else 0.0
-        z = float(payload.get("z")) if "z" in payload else 0.0
-        
-        # Capteur cardiaque
-        if "bpm" in payload:
-            bpm = float(payload.get("bpm"))
-        if "ir" in payload:
-            ir = int(payload.get("ir"))
-        if "ecg" in payload:
-            ecg = int(payload.get("ecg"))
-    except Exception as e:
-        print(f"Erreur extraction champs: {e}")
-        x, y, z = 0.0, 0.0, 0.0
+        return cast(payload.get(key))
+    except (TypeError, ValueError) as e:
+        log.debug("Erreur extraction champ %s: %s", key, e)
+        return None
 
-    raw = payload
 
-    # Créer DEUX événements : un pour accel, un pour ecg
-    # 1. Événement accéléromètre
-    try:
-        rowid_accel = _store_row(id_, "accel", timestamp, x or 0.0, y or 0.0, z or 0.0, raw,
-                                  bpm=None, ir=None, ecg=None)
-        event_accel = {
-            "id": id_,
-            "type": "accel",
-            "timestamp": timestamp,
-            "x": x or 0.0,
-            "y": y or 0.0,
-            "z": z or 0.0,
-            "bpm": None,
-            "ir": None,
-            "ecg": None,
-            "raw": raw,
-            "rowid": rowid_accel
-        }
-        realtime.publish(event_accel)
-        print(f"Événement accel publié: {event_accel}")
-    except Exception as e:
-        print("Erreur événement accel:", e)
+def _handle_payload(payload, addr):
+    id_ = payload.get("id") or f"{addr[0]}:{addr[1]}"
+    timestamp = payload.get("timestamp") or datetime.utcnow().isoformat() + "Z"
+
+    # Un seul enregistrement multi-canal par paquet : seuls les canaux présents sont remplis
+    x = _number(payload, "x", float)
+    y = _number(payload, "y", float)
+    z = _number(payload, "z", float)
+    if x is None or y is None or z is None:
+        x = y = z = None
+    bpm = _number(payload, "bpm", float)
+    ir = _number(payload, "ir", int)
+    ecg = _number(payload, "ecg", int)
+
+    # Charge brute encodée une seule fois, partagée par la BD et l'événement
+    raw_json = encode_packet_raw(payload)
 
-    # 2. Événement ECG/cardiaque
     try:
-        rowid_ecg = _store_row(id_, "ecg", timestamp, x or 0.0, y or 0.0, z or 0.0, raw,
-                               bpm=bpm, ir=ir, ecg=ecg)
-        event_ecg = {
-            "id": id_,
-            "type": "ecg",
-            "timestamp": timestamp,
-            "x": x or 0.0,
-            "y": y or 0.0,
-            "z": z or 0.0,
-            "bpm": bpm,
-            "ir": ir,
-            "ecg": ecg,
-            "raw": raw,
-            "rowid": rowid_ecg
-        }
-        realtime.publish(event_ecg)
-        print(f"Événement ecg publié: {event_ecg}")
+        event = SensorEvent(id_, None, timestamp, x, y, z, bpm=bpm, ir=ir, ecg=ecg,
+                            raw_json=raw_json if event_raw else None)
+        event.type = packet_type(event.channels)
+        _store_event(event, raw_json)
+        record_rollup(id_, timestamp, x, y, z, bpm)
+        realtime.publish(event)
+        log.debug("Événement %s publié: %s", event.type, event.data)
     except Exception as e:
-        print("Erreur événement ecg:", e)
+        log.error("Erreur événement %s: %s", id_, e)
 
 
 def _listener(host=LISTEN_HOST, port=LISTEN_PORT):
     sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
     sock.bind((host, port))
-    print(f"Pont UDP à l'écoute sur {host}:{port}")
+    log.info("Pont UDP à l'écoute sur %s:%s", host, port)
     while True:
         data, addr = sock.recvfrom(_BUFFER)
-        _handle_packet(data, addr)
+        try:
+            _handle_packet(data, addr)
+        except Exception as e:
+            # Un paquet ne doit jamais arrêter l'écoute
+            log.exception("Erreur paquet de %s: %s", addr, e)
 
 
 def start_udp_bridge(host=LISTEN_HOST, port=LISTEN_PORT):
@@ -125,6 +113,8 @@ def start_udp_bridge(host=LISTEN_HOST, port=LISTEN_PORT):
 
 
 if __name__ == "__main__":
+    from src.services.logs import setup_logging
+    setup_logging()
     start_udp_bridge()
     try:
         import time
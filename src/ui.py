@@ -276,34 +276,24 @@ function pushMeasurement(m){
   const label = m.timestamp ? new Date(m.timestamp).toLocaleTimeString() : new Date().toLocaleTimeString();
   const t = (m.type || '').toLowerCase();
 
-  // For ECG events, do not display them as accelerometer X/Y/Z; show BPM instead
-  if (t === 'ecg') {
-    // Utiliser directement les champs bpm, ir, ecg
-    const bpm = (m.bpm !== undefined && m.bpm !== null) ? m.bpm : 
-                ((m.raw && m.raw.bpm !== undefined) ? m.raw.bpm : '-');
-    const ir = (m.ir !== undefined && m.ir !== null) ? m.ir : 
-               ((m.raw && m.raw.ir !== undefined) ? m.raw.ir : null);
-    const ecg = (m.ecg !== undefined && m.ecg !== null) ? m.ecg : 
-                ((m.raw && m.raw.ecg !== undefined) ? m.raw.ecg : null);
-    
-    if (bpmContainer) { 
-      bpmContainer.style.display = ''; 
-      bpmEl.textContent = bpm !== '-' ? (bpm + ' bpm') : '-'; 
-    }
-    if (accelValuesEl) accelValuesEl.style.display = 'none';
-    xEl.textContent = '-';
-    yEl.textContent = '-';
-    zEl.textContent = '-';
-  } else {
-    if (bpmContainer) bpmContainer.style.display = 'none';
-    if (accelValuesEl) accelValuesEl.style.display = 'flex';
-    xEl.textContent = m.x;
-    yEl.textContent = m.y;
-    zEl.textContent = m.z;
-  }
+  // Un enregistrement par paquet (type accel, ecg ou multi) : chaque canal présent est affiché.
+  // Les anciennes lignes 'ecg' recopiaient x/y/z : elles ne comptent pas comme accéléromètre.
+  const pick = (v, k)=> (v !== undefined && v !== null) ? v : ((m.raw && m.raw[k] !== undefined) ? m.raw[k] : null);
+  const bpmValue = pick(m.bpm, 'bpm');
+  const irValue = pick(m.ir, 'ir');
+  const ecgValue = pick(m.ecg, 'ecg');
+  const hasHeart = t === 'ecg' || bpmValue !== null || irValue !== null || ecgValue !== null;
+  const hasAccel = t !== 'ecg' && m.x !== undefined && m.x !== null &&
+                   m.y !== undefined && m.y !== null && m.z !== undefined && m.z !== null;
 
-  // Only push to accelerometer chart when data is not ECG
-  if (t !== 'ecg' && m.x !== undefined && m.y !== undefined && m.z !== undefined) {
+  if (bpmContainer) bpmContainer.style.display = hasHeart ? '' : 'none';
+  if (hasHeart && bpmEl) bpmEl.textContent = bpmValue !== null ? (bpmValue + ' bpm') : '-';
+  if (accelValuesEl) accelValuesEl.style.display = hasAccel ? 'flex' : 'none';
+  xEl.textContent = hasAccel ? m.x : '-';
+  yEl.textContent = hasAccel ? m.y : '-';
+  zEl.textContent = hasAccel ? m.z : '-';
+
+  if (hasAccel) {
     chart.data.labels.push(label);
     chart.data.datasets[0].data.push(m.x);
     chart.data.datasets[1].data.push(m.y);
@@ -313,69 +303,41 @@ function pushMeasurement(m){
       chart.data.datasets.forEach(ds=>ds.data.shift());
     }
     chart.update('none');
-  }
 
-  let ecgValue = null;
-  if (t === 'ecg') {
-    // Utiliser directement les champs bpm, ir, ecg de la mesure
-    const bpmValue = (m.bpm !== undefined && m.bpm !== null) ? m.bpm : 
-                     ((m.raw && m.raw.bpm !== undefined) ? m.raw.bpm : null);
-    const irValue = (m.ir !== undefined && m.ir !== null) ? m.ir : 
-                    ((m.raw && m.raw.ir !== undefined) ? m.raw.ir : null);
-    const ecgValue = (m.ecg !== undefined && m.ecg !== null) ? m.ecg : 
-                     ((m.raw && m.raw.ecg !== undefined) ? m.raw.ecg : null);
+    const tr = document.createElement('tr');
+    tr.innerHTML = `<td>${m.rowid||''}</td><td>${m.timestamp||''}</td><td>${m.id||''}</td><td>${m.x}</td><td>${m.y}</td><td>${m.z}</td>`;
+    if (accelTableBody) {
+      accelTableBody.insertBefore(tr, accelTableBody.firstChild);
+      while(accelTableBody.children.length > 500) accelTableBody.removeChild(accelTableBody.lastChild);
+    }
+  }
 
-    // Ajouter BPM au dataset 0
-    if(bpmValue !== null && bpmValue !== undefined){
+  if (hasHeart) {
+    // Ajouter BPM au dataset 0, IR au dataset 1 et ECG au dataset 2 (synchro)
+    if(bpmValue !== null){
       ecgChart.data.labels.push(label);
       ecgChart.data.datasets[0].data.push(bpmValue);
-      
-      // Ajouter IR au dataset 1 (synchro)
-      if(irValue !== null && irValue !== undefined){
-        ecgChart.data.datasets[1].data.push(irValue);
-      } else {
-        ecgChart.data.datasets[1].data.push(null);
-      }
-      
-      // Ajouter ECG au dataset 2 (synchro)
-      if(ecgValue !== null && ecgValue !== undefined){
-        ecgChart.data.datasets[2].data.push(ecgValue);
-      } else {
-        ecgChart.data.datasets[2].data.push(null);
-      }
-      
+      ecgChart.data.datasets[1].data.push(irValue);
+      ecgChart.data.datasets[2].data.push(ecgValue);
       while(ecgChart.data.labels.length > maxPointsECG){
         ecgChart.data.labels.shift();
         ecgChart.data.datasets.forEach(ds=>ds.data.shift());
       }
       ecgChart.update('none');
     }
-  }
-  // Ajout d'une ligne dans la table
-  const tr = document.createElement('tr');
-  if (t === 'ecg') {
-    // Pour les lignes ECG, afficher bpm/ir/ecg dans le tableau ECG
-    const bpmCell = (m.bpm !== undefined && m.bpm !== null) ? (m.bpm + ' bpm') : 
-                    ((m.raw && m.raw.bpm !== undefined) ? (m.raw.bpm + ' bpm') : '-');
-    const irCell = (m.ir !== undefined && m.ir !== null) ? m.ir : 
-                   ((m.raw && m.raw.ir !== undefined) ? m.raw.ir : '-');
-    const ecgCell = (m.ecg !== undefined && m.ecg !== null) ? m.ecg : 
-                    ((m.raw && m.raw.ecg !== undefined) ? m.raw.ecg : '-');
-    
-    tr.innerHTML = `<td>${m.rowid||''}</td><td>${m.timestamp||''}</td><td>${m.id||''}</td><td>${bpmCell}</td><td>${irCell}</td><td>${ecgCell}</td>`;
+
+    const tr = document.createElement('tr');
+    tr.innerHTML = `<td>${m.rowid||''}</td><td>${m.timestamp||''}</td><td>${m.id||''}</td><td>${bpmValue !== null ? bpmValue + ' bpm' : '-'}</td><td>${irValue !== null ? irValue : '-'}</td><td>${ecgValue !== null ? ecgValue : '-'}</td>`;
     if (ecgTableBody) {
       ecgTableBody.insertBefore(tr, ecgTableBody.firstChild);
       while(ecgTableBody.children.length > 500) ecgTableBody.removeChild(ecgTableBody.lastChild);
     }
-    prependLog(`id=${m.id||'-'} type=${m.type} bpm=${bpmCell} ir=${irCell} ecg=${ecgCell}`);
-  } else {
-    tr.innerHTML = `<td>${m.rowid||''}</td><td>${m.timestamp||''}</td><td>${m.id||''}</td><td>${m.x}</td><td>${m.y}</td><td>${m.z}</td>`;
-    if (accelTableBody) {
-      accelTableBody.insertBefore(tr, accelTableBody.firstChild);
-      while(accelTableBody.children.length > 500) accelTableBody.removeChild(accelTableBody.lastChild);
-    }
-    prependLog(`id=${m.id||'-'} type=${m.type} x=${m.x} y=${m.y} z=${m.z}`);
   }
+
+  const parts = [];
+  if (hasAccel) parts.push(`x=${m.x} y=${m.y} z=${m.z}`);
+  if (hasHeart) parts.push(`bpm=${bpmValue !== null ? bpmValue : '-'} ir=${irValue !== null ? irValue : '-'} ecg=${ecgValue !== null ? ecgValue : '-'}`);
+  prependLog(`id=${m.id||'-'} type=${m.type} ${parts.join(' ')}`);
 }
 
 function pushECGSamples(samples){
@@ -393,23 +355,50 @@ function pushECGSamples(samples){
 }
 
 let es = null;
+let lastRowid = null;  // reprise sans trou ni doublon après reconnexion (historique BD puis direct)
 function startEventSource(){
   if(es) try{ es.close(); }catch(e){}
-  es = new EventSource('/events');
+  // ?channels=accel,bpm,ir,ecg dans l'URL de la page limite les canaux reçus
+  const params = new URLSearchParams({compact: '1'});
+  const channels = new URLSearchParams(location.search).get('channels');
+  if(channels) params.set('channels', channels);
+  if(lastRowid !== null) params.set('since_rowid', lastRowid);
+  es = new EventSource('/events?' + params.toString());
   es.addEventListener('connected', e=>{
     const d = JSON.parse(e.data);
     statusEl.textContent = 'connected (last=' + d.last_rowid + ')';
     prependLog('connected, last=' + d.last_rowid);
   });
+  const onMeasurement = m=>{
+    if(m.rowid !== undefined && m.rowid !== null) lastRowid = m.rowid;
+    pushMeasurement(m);
+  };
   es.addEventListener('measurement', e=>{
     try{
-      const m = JSON.parse(e.data);
-      pushMeasurement(m);
+      onMeasurement(JSON.parse(e.data));
       statusEl.textContent = 'live';
     }catch(err){
       prependLog('parse error');
     }
   });
+  // Historique compact : {columns: [...], rows: [[...], ...]}
+  es.addEventListener('history', e=>{
+    try{
+      const d = JSON.parse(e.data);
+      d.rows.forEach(row=>{
+        const m = {};
+        d.columns.forEach((name, i)=>{ m[name] = row[i]; });
+        onMeasurement(m);
+      });
+    }catch(err){
+      prependLog('parse error');
+    }
+  });
+  es.addEventListener('gap', e=>{
+    const d = JSON.parse(e.data);
+    if(d.missed_rows) prependLog('skipped ' + d.missed_rows + ' row(s) of history');
+    else prependLog('missed ' + d.missed + ' event(s) (client too slow)');
+  });
   es.onopen = ()=>{ statusEl.textContent = 'connected'; };
   es.onerror = ()=> {
     statusEl.textContent = 'disconnected';
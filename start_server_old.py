@@ -9,9 +9,9 @@ import os
 # Ajouter le répertoire au path
 sys.path.insert(0, os.path.dirname(__file__))
 
-from flask import Flask, Response
+from flask import Flask, Response, request
 from src.api.routes import api_bp
-from src.receive import receive_data
+from src.receive import parse_stream_args, receive_data
 from src.ui import INDEX_HTML
 from src import udp_bridge
 
@@ -24,8 +24,12 @@ def index():
 
 @app.route('/events')
 def events():
+    try:
+        options = parse_stream_args(request.args, request.headers.get('Last-Event-ID'))
+    except ValueError as e:
+        return Response(str(e), status=400)
     return Response(
-        receive_data(),
+        receive_data(**options),
         mimetype='text/event-stream',
         headers={
             'Cache-Control': 'no-cache',
@@ -0,0 +1,56 @@
+import math
+
+from src.services.devices import DeviceSession
+from src.services.ringstore import TimeSeriesRing
+
+RATE = 250
+
+
+def _feed(device, t0, seconds, label=None):
+    """Échantillons à RATE Hz (ECG synthétique) comme handle_sample : moteur cardiaque puis ring de capture."""
+    n = int(seconds * RATE)
+    for i in range(n):
+        t = t0 + i / RATE
+        ecg = 2000 + int(800 * math.exp(-((t % 0.8) / 0.012) ** 2))
+        device.heart.push(t, ecg)
+        device.track_rate()
+        device.capture.append(t, ecg, 72, 0.0, 0.0, 1.0, True, True, 0.9, label)
+    return t0 + n / RATE
+
+
+def test_ring_grow_keeps_absolute_indexes():
+    ring = TimeSeriesRing('t', ('v',), retention_samples=1024, spill_chunk=1024)
+    for i in range(1500):
+        ring.append(float(i), float(i))
+    assert ring.first_index == 1500 - 1024
+    assert ring.grow(4000)
+    assert ring.capacity == 4096
+    assert ring.first_index == 1500 - 1024
+    assert list(ring.column('v', ring.first_index, ring.first_index + 3)) == [476.0, 477.0, 478.0]
+    for i in range(1500, 6000):
+        ring.append(float(i), float(i))
+    assert ring.first_index == 6000 - 4096
+    assert list(ring.column('v')) == [float(i) for i in range(6000 - 4096, 6000)]
+    assert ring.index_at(5000.0) == 5000
+
+
+def test_capture_keeps_pre_and_post_context_at_250hz():
+    device = DeviceSession('esp', retention_seconds=60, sample_rate=10,
+                           capture_options={'pre_seconds': 10, 'post_seconds': 10, 'max_seconds': 120})
+    assert device.capture.ring.capacity < 10 * RATE  # Dimensionné pour 10 Hz au départ
+
+    t = _feed(device, 1_750_000_000.0, 30)
+    assert device.capture.ring.capacity >= device.capture.seconds * RATE
+    trigger_time = t
+    device.capture.trigger(trigger_time)
+    t = _feed(device, t, 100, label={'anomaly_type': 'chute'})
+    device.capture.end(t)
+    _feed(device, t, 10)
+
+    window = device.capture.take()
+    times = window['columns']['timestamp']
+    assert not window['truncated']
+    assert abs(times[window['trigger']] - trigger_time) < 1.0 / RATE
+    assert abs((trigger_time - times[0]) - 10) < 2.0 / RATE
+    assert abs((times[-1] - t) - 10) < 2.0 / RATE
+    assert window['end'] - window['trigger'] == 100 * RATE
@@ -0,0 +1,67 @@
+import json
+import math
+from datetime import datetime
+
+import pytest
+
+from src.services.anomaly_snapshots import SNAPSHOT_SCHEMA, AnomalySnapshots, new_anomaly_id
+
+T0 = 1_700_000_000.0
+NAN = math.nan
+
+
+@pytest.fixture
+def snapshots(tmp_path):
+    return AnomalySnapshots(str(tmp_path), chunk_rows=64, overview_points=50)
+
+
+def _columns(count):
+    columns = {name: [0.0] * count for name, _ in SNAPSHOT_SCHEMA}
+    columns['timestamp'] = [T0 + i / 100 for i in range(count)]
+    columns['ecg'] = [float(i % 50) for i in range(count)]
+    columns['bpm'] = [NAN if i < 10 else 70.0 for i in range(count)]
+    columns['label'] = [NAN] * (count // 2) + [0.0] * (count - count // 2)
+    return columns
+
+
+def test_round_trip_and_window(snapshots):
+    label = {'anomaly_type': 'chute', 'severity': 'critique'}
+    snapshots.save('a1', {'device_id': 'esp', 'trigger': 100}, _columns(400), [label])
+    full = snapshots.load('a1')
+    assert full['rows'] == 400 and not full['decimated']
+    assert full['device_id'] == 'esp' and full['labels'] == [label]
+    assert full['columns']['bpm'][9] is None and full['columns']['bpm'][10] == 70.0
+    window = snapshots.load('a1', t0=T0 + 1, t1=T0 + 1.045, columns=('ecg', 'label'))
+    assert window['columns']['ecg'] == [0.0, 1.0, 2.0, 3.0, 4.0]
+    assert window['columns']['label'] == [None] * 5
+    assert snapshots.load('a1', t0=T0 + 3, columns=('label',))['columns']['label'][0] == 0
+
+
+def test_overview_served_from_footer(snapshots):
+    snapshots.save('a1', {}, _columns(400), [])
+    view = snapshots.load('a1', points=100)
+    assert view['decimated'] and len(view['columns']['timestamp']) <= 50
+    assert max(view['columns']['ecg']) == 49.0 and min(view['columns']['ecg']) == 0.0
+    coarse = snapshots.load('a1', points=20)  # Aperçu trop dense : décimation des données
+    assert coarse['decimated'] and len(coarse['columns']['timestamp']) <= 20
+
+
+def test_legacy_json(snapshots, tmp_path):
+    samples = [{'timestamp': T0 + i, 'ecg': i, 'anomaly_type': 'chute'} for i in range(3)]
+    (tmp_path / 'anomaly_old.json').write_text(json.dumps({'type': 'chute', 'data': samples}))
+    view = snapshots.load('old', t0=T0 + 1)
+    assert view['type'] == 'chute' and view['rows'] == 3
+    assert view['columns']['ecg'] == [1, 2]
+    assert view['labels'][0]['anomaly_type'] == 'chute'
+
+
+def test_unknown_and_unsafe_ids(snapshots):
+    assert snapshots.load('missing') is None
+    assert snapshots.load('../etc/passwd') is None
+    assert snapshots.path('a/b') is None
+
+
+def test_new_anomaly_id_unique():
+    start = datetime(2024, 1, 1, 10, 0, 0)
+    first, second = new_anomaly_id(start), new_anomaly_id(start)
+    assert first.startswith('20240101_100000_') and first != second
@@ -0,0 +1,90 @@
+import csv
+import io
+
+import pytest
+
+from src.services.anomaly_store import AnomalyStore, parse_cursor
+
+
+def _record(i, device='esp', type_='chute', severity='critique', minute=None):
+    minute = i if minute is None else minute
+    return {
+        'id': f'a{i}', 'device_id': device, 'start_time': f'2024-01-01T10:{minute:02d}:00',
+        'end_time': f'2024-01-01T10:{minute:02d}:05', 'duration_seconds': 5.04,
+        'anomaly_type': type_, 'bpm_min': 59.6, 'bpm_max': '', 'severity': severity,
+    }
+
+
+@pytest.fixture
+def store(tmp_path):
+    return AnomalyStore(str(tmp_path / 'anomalies.db')).open()
+
+
+def _pages(store, limit, **filters):
+    cursor, pages = None, []
+    while True:
+        rows, cursor = store.query(limit=limit, cursor=cursor, **filters)
+        pages.append([row['id'] for row in rows])
+        if cursor is None:
+            return pages
+
+
+def test_keyset_pagination_newest_first(store):
+    for i in range(5):
+        store.add(_record(i))
+    for i in (5, 6):
+        store.add(_record(i, minute=2))  # Même début : départagées par seq
+    pages = _pages(store, 3)
+    assert pages == [['a4', 'a3', 'a6'], ['a5', 'a2', 'a1'], ['a0']]
+    row, _ = store.query(limit=1)
+    assert row[0]['duration_seconds'] == 5.0 and row[0]['bpm_min'] == 60 and row[0]['bpm_max'] is None
+
+
+def test_filters(store):
+    store.add(_record(0, type_='chute_lente'))
+    store.add(_record(1, type_='chute', device='other'))
+    store.add(_record(2, type_='bpm_bas', severity='modéré'))
+    assert [r['id'] for r in store.query(type_='chute*')[0]] == ['a1', 'a0']
+    assert [r['id'] for r in store.query(device='other')[0]] == ['a1']
+    assert [r['id'] for r in store.query(severity='modéré')[0]] == ['a2']
+    since = store.get('a1')['start_ts']
+    assert [r['id'] for r in store.query(since=since)[0]] == ['a2', 'a1']
+    assert store.counts() == {'critique': 2, 'modéré': 1, 'all': 3}
+
+
+def test_clear_up_to_max_seq_keeps_newer(store):
+    for i in range(3):
+        store.add(_record(i))
+    exported = store.last_seq()
+    store.add(_record(3))  # Enregistrée pendant l'export
+    assert store.clear(max_seq=exported) == 3
+    assert [r['id'] for r in store.query()[0]] == ['a3']
+    assert store.clear() == 1 and store.last_seq() == 0
+
+
+def test_csv_export_chronological(store):
+    store.add(_record(1))
+    store.add(_record(0))
+    rows = list(csv.reader(io.StringIO(''.join(store.iter_csv()))))
+    assert rows[0][:3] == ['start_time', 'end_time', 'duration_seconds']
+    assert [row[0] for row in rows[1:]] == ['2024-01-01T10:00:00', '2024-01-01T10:01:00']
+    assert rows[1][5] == ''
+
+
+def test_legacy_csv_imported_once(tmp_path):
+    legacy = tmp_path / 'anomalies_log.csv'
+    legacy.write_text('start_time,end_time,anomaly_type,severity\n'
+                      '2024-01-01T09:00:00,2024-01-01T09:00:03,chute,critique\n'
+                      'pas une date,,,\n')
+    path = str(tmp_path / 'anomalies.db')
+    store = AnomalyStore(path, legacy_csv=str(legacy)).open()
+    assert [r['id'] for r in store.query()[0]] == ['20240101_090000']
+    store.clear()
+    assert AnomalyStore(path, legacy_csv=str(legacy)).open().last_seq() == 0
+
+
+def test_parse_cursor():
+    assert parse_cursor('') is None
+    assert parse_cursor('1700000000.5:3') == (1700000000.5, 3)
+    with pytest.raises(ValueError):
+        parse_cursor('3')
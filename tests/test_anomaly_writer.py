@@ -0,0 +1,49 @@
+import threading
+
+from src.services.anomaly_writer import AnomalyWriter
+
+
+def test_worker_results_polled():
+    writer = AnomalyWriter(lambda job: {'id': job}, workers=2).start()
+    assert writer.submit('a') is True and writer.submit('b') is True
+    writer.stop()
+    assert sorted(writer.poll()) == [('a', {'id': 'a'}), ('b', {'id': 'b'})]
+    assert writer.stats()['anomaly_saved'] == 2
+
+
+def test_full_queue_saves_through_offload():
+    release = threading.Event()
+    calls = []
+
+    def save(job):
+        if job == 'busy':
+            release.wait(5)
+        return job
+
+    def offload(fn, *args):
+        calls.append(threading.current_thread())
+        return fn(*args)
+
+    writer = AnomalyWriter(save, workers=1, queue_size=1, offload=offload).start()
+    writer.submit('busy')  # Pris par le thread (bloqué)
+    while writer.stats()['anomaly_queue']:
+        pass
+    writer.submit('queued')
+    assert writer.submit('overflow') == 'overflow'
+    release.set()
+    assert len(calls) == 1
+    writer.stop()
+    stats = writer.stats()
+    assert stats['anomaly_saved_inline'] == 1 and stats['anomaly_saved'] == 3
+
+
+def test_failures_counted():
+    def save(job):
+        if job == 'bad':
+            raise RuntimeError('disque plein')
+        return job
+
+    writer = AnomalyWriter(save)  # Non démarré : enregistrement direct
+    assert writer.submit('bad') is None
+    assert writer.submit('ok') == 'ok'
+    assert writer.stats()['anomaly_save_failed'] == 1
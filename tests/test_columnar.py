@@ -0,0 +1,76 @@
+import math
+import os
+
+import pytest
+
+from src.services.columnar import ColumnarWriter, read_columns, read_index
+
+T0 = 1_700_000_000.0
+
+
+def _rows(start, stop):
+    return [[T0 + i, i, None if i % 5 == 0 else 60.0 + i, 0.5, -0.25, 1.0]
+            for i in range(start, stop)]
+
+
+def _write(path, rows, close=True, chunk_rows=4, meta=None):
+    writer = ColumnarWriter(str(path), chunk_rows=chunk_rows, meta=meta)
+    writer.write_rows(rows)
+    if close:
+        writer.close()
+    else:
+        writer.flush()
+    return writer
+
+
+def test_round_trip_with_footer(tmp_path):
+    path = tmp_path / 'a.ecol'
+    _write(path, _rows(0, 10), meta={'device': 'esp'})
+    index = read_index(str(path))
+    assert index['complete'] and index['rows'] == 10 and len(index['chunks']) == 3
+    assert index['meta'] == {'device': 'esp'}
+    data = read_columns(str(path), ['ecg', 'bpm'], index=index)
+    assert data['timestamp'] == [T0 + i for i in range(10)]
+    assert data['ecg'] == list(range(10))
+    assert data['bpm'][0] is None and data['bpm'][1] == 61.0
+
+
+def test_time_window_skips_chunks(tmp_path):
+    path = tmp_path / 'a.ecol'
+    _write(path, _rows(0, 12))
+    data = read_columns(str(path), ['ecg'], t0=T0 + 5, t1=T0 + 6)
+    assert data['ecg'] == [5, 6]
+    with pytest.raises(KeyError):
+        read_columns(str(path), ['missing'])
+
+
+def test_unclosed_file_is_scanned(tmp_path):
+    path = tmp_path / 'a.ecol'
+    writer = _write(path, _rows(0, 10), close=False)
+    index = read_index(str(path))
+    assert not index['complete']
+    assert index['rows'] == 8  # Le bloc en cours n'est pas encore écrit
+    assert read_columns(str(path), ['ecg'])['ecg'] == list(range(8))
+    writer.close()
+
+
+@pytest.mark.parametrize('cut', [1, 9, 30])
+def test_truncated_last_chunk_is_ignored(tmp_path, cut):
+    path = tmp_path / 'a.ecol'
+    writer = _write(path, _rows(0, 12), close=False)
+    size = os.path.getsize(path)
+    writer.close()
+    with open(path, 'r+b') as f:
+        f.truncate(size - cut)  # Pied perdu, dernier bloc incomplet
+    index = read_index(str(path))
+    assert not index['complete'] and index['rows'] == 8
+    data = read_columns(str(path))
+    assert data['ecg'] == list(range(8))
+    assert math.isclose(data['accel_y'][0], -0.25)
+
+
+def test_not_columnar(tmp_path):
+    path = tmp_path / 'a.ecol'
+    path.write_bytes(b'timestamp,ecg\n')
+    with pytest.raises(ValueError):
+        read_index(str(path))
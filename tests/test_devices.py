@@ -0,0 +1,43 @@
+from src.services.devices import DeviceRegistry
+
+
+def _registry(**options):
+    return DeviceRegistry(retention_seconds=10, sample_rate=10, lod_capacity=64,
+                          capture_options={'max_seconds': 5}, **options)
+
+
+def test_read_does_not_touch_recency():
+    devices = _registry(max_devices=2)
+    devices.get('a')
+    devices.get('b')
+    assert devices.get('a', create=False) is not None
+    assert devices.get('zzz', create=False) is None
+    devices.get('c')  # Évince la moins récemment *ingérée* : 'a'
+    assert [s.device_id for s in devices.sessions()] == ['b', 'c']
+
+
+def test_ingest_touches_recency():
+    devices = _registry(max_devices=2)
+    devices.get('a')
+    devices.get('b')
+    devices.get('a')
+    devices.get('c')
+    assert [s.device_id for s in devices.sessions()] == ['a', 'c']
+    assert devices.latest().device_id == 'c'
+
+
+def test_active_anomaly_not_evicted():
+    devices = _registry(max_devices=1)
+    devices.get('a').anomaly_active = True
+    devices.get('b')
+    assert [s.device_id for s in devices.sessions()] == ['a', 'b']
+
+
+def test_memory_budget_caps_devices():
+    devices = _registry(max_devices=512, memory_budget=1)
+    assert devices.max_devices == 1
+    session_bytes = devices.session_bytes
+    assert session_bytes == devices.get('a').nbytes
+    devices = _registry(max_devices=512, memory_budget=3.5 * session_bytes)
+    assert devices.max_devices == 3
+    assert _registry(max_devices=2, memory_budget=10 * session_bytes).max_devices == 2
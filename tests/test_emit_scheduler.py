@@ -0,0 +1,80 @@
+import json
+
+from src.services.emit_scheduler import EmitScheduler
+
+
+class _SocketIO:
+    def __init__(self):
+        self.emitted = []
+
+    def emit(self, event, payload, to=None, skip_sid=None, namespace=None):
+        self.emitted.append((to, json.loads(payload), skip_sid))
+
+
+def _scheduler(**options):
+    socketio = _SocketIO()
+    return socketio, EmitScheduler(socketio, **options)
+
+
+def test_groups_share_one_frame_per_tick():
+    socketio, scheduler = _scheduler()
+    assert scheduler.subscribe('a', 'devices:all', 33) == (None, 'devices:all@30')
+    scheduler.subscribe('b', 'devices:all', 30)
+    scheduler.subscribe('c', 'device:1', 100)
+    scheduler.push(['devices:all', 'device:1'], {'v': 1})
+    scheduler.tick(now=1.0)
+    assert [(room, frame['samples']) for room, frame, _ in socketio.emitted] == [
+        ('devices:all@30', [{'v': 1}]), ('device:1@60', [{'v': 1}])]
+    scheduler.push(['devices:all'], {'v': 2})
+    scheduler.tick(now=1.01)  # Pas encore à échéance
+    assert len(socketio.emitted) == 2
+    scheduler.tick(now=1.04)
+    assert socketio.emitted[-1][1]['seq'] == 2
+
+
+def test_pending_bounded_keeps_latest():
+    socketio, scheduler = _scheduler(max_batch=3)
+    scheduler.subscribe('a', 'devices:all')
+    scheduler.push(['devices:all'], 0)
+    for v in range(1, 6):
+        scheduler.push(['devices:all'], v)
+    assert scheduler.samples_dropped == 3
+    scheduler.tick(now=1.0)
+    assert socketio.emitted[0][1]['samples'] == [3, 4, 5]
+
+
+def test_ack_flow_control_skips_lagging_client():
+    socketio, scheduler = _scheduler(max_lag=2)
+    scheduler.subscribe('slow', 'devices:all')
+    scheduler.subscribe('fast', 'devices:all')
+    scheduler.ack('slow', 0)
+    for step in range(4):
+        scheduler.push(['devices:all'], step)
+        scheduler.tick(now=float(step))
+    skips = [skip for _, _, skip in socketio.emitted]
+    assert skips == [None, None, ['slow'], ['slow']]
+    assert scheduler.frames_skipped == 2
+    scheduler.ack('slow', 2)
+    scheduler.push(['devices:all'], 4)
+    scheduler.tick(now=10.0)
+    assert socketio.emitted[-1][2] is None
+
+
+def test_no_emit_when_every_member_lags():
+    socketio, scheduler = _scheduler(max_lag=1)
+    scheduler.subscribe('a', 'devices:all')
+    scheduler.ack('a', 0)
+    for step in range(3):
+        scheduler.push(['devices:all'], step)
+        scheduler.tick(now=float(step))
+    assert len(socketio.emitted) == 1
+    assert scheduler.frames_sent == 1
+
+
+def test_unsubscribe_removes_empty_group():
+    _, scheduler = _scheduler()
+    scheduler.subscribe('a', 'device:1', 20)
+    assert scheduler.subscribe('a', 'device:1', 40) == ('device:1@20', 'device:1@40')
+    assert scheduler.forget('a') == 'device:1@40'
+    assert scheduler.stats()['emit_groups'] == 0
+    assert scheduler.client('a') is None
@@ -0,0 +1,146 @@
+import math
+import random
+
+from src.services.heart_rate import HeartRateEngine
+
+T0 = 1_750_000_000.0
+
+
+def synthetic_ecg(rate, seconds, bpm=72, jitter=0.04, noise=30, seed=1):
+    """ECG synthétique (QRS gaussien, onde T, dérive de ligne de base) -> (temps, valeurs, temps des R)."""
+    rng = random.Random(seed)
+    beats, t = [], 0.5
+    while t < seconds:
+        beats.append(t)
+        t += 60.0 / bpm * (1 + rng.uniform(-jitter, jitter))
+    times, values, b = [], [], 0
+    for i in range(int(rate * seconds)):
+        t = i / rate
+        while b + 1 < len(beats) and beats[b + 1] <= t + 0.2:
+            b += 1
+        v = 2000 + 300 * math.sin(2 * math.pi * 0.3 * t) + rng.gauss(0, noise)
+        for r in beats[max(0, b - 1):b + 2]:
+            d = t - r
+            v += (1000 * math.exp(-(d / 0.012) ** 2) - 150 * math.exp(-((d - 0.03) / 0.015) ** 2)
+                  + 200 * math.exp(-((d - 0.25) / 0.05) ** 2))
+        times.append(T0 + t)
+        values.append(int(v))
+    return times, values, [T0 + r for r in beats]
+
+
+def feed(engine, times, values, block=25):
+    """Blocs de `block` échantillons, comme une trame binaire ; retourne les RR (ms)."""
+    rrs = []
+    for i in range(0, len(times), block):
+        rrs += [rr for _, rr in engine.process(times[i:i + block], values[i:i + block])]
+    return rrs
+
+
+def true_rr(beats):
+    return [(b - a) * 1000.0 for a, b in zip(beats, beats[1:])]
+
+
+def test_detects_r_peaks_and_bpm():
+    times, values, beats = synthetic_ecg(250, 120)
+    engine = HeartRateEngine(sample_rate=250)
+    rrs = feed(engine, times, values)
+
+    # Apprentissage (~2,5 s) puis quasiment tous les battements
+    assert engine.beats >= len(beats) - 4
+    expected = true_rr(beats)
+    assert abs(sum(rrs) / len(rrs) - sum(expected) / len(expected)) < 5.0
+    recent = expected[-8:]
+    assert abs(engine.bpm - 60000.0 * len(recent) / sum(recent)) < 1.5
+
+    metrics = engine.metrics()
+    assert metrics['rr_count'] > 60
+    mean = sum(expected) / len(expected)
+    sdnn = math.sqrt(sum((rr - mean) ** 2 for rr in expected) / (len(expected) - 1))
+    assert abs(metrics['sdnn'] - sdnn) < 0.35 * sdnn
+    rmssd = math.sqrt(sum((b - a) ** 2 for a, b in zip(expected, expected[1:])) / (len(expected) - 1))
+    assert abs(metrics['rmssd'] - rmssd) < 0.35 * rmssd
+
+
+def test_push_matches_block_processing():
+    times, values, _ = synthetic_ecg(250, 30)
+    block, single = HeartRateEngine(), HeartRateEngine()
+    rrs = feed(block, times, values)
+    pushed = [rr for rr in (single.push(t, v) for t, v in zip(times, values)) if rr is not None]
+    assert pushed == rrs
+
+
+def test_sample_rate_is_reestimated():
+    times, values, beats = synthetic_ecg(500, 60)
+    engine = HeartRateEngine(sample_rate=250)
+    feed(engine, times, values, block=50)
+    assert engine.sample_rate == 500
+    assert abs(engine.measured_rate - 500) < 1
+    assert engine.beats >= len(beats) - 6
+    assert abs(engine.bpm - 72) < 4
+
+
+def test_unsupported_at_10hz():
+    times, values, _ = synthetic_ecg(10, 60)
+    engine = HeartRateEngine(sample_rate=250)
+    assert feed(engine, times, values, block=1) == []
+    assert not engine.supported
+    assert engine.sample_rate == 10
+    assert engine.bpm is None
+    assert engine.metrics()['beats'] == 0
+
+
+def test_bpm_goes_stale_on_flat_ecg():
+    times, values, _ = synthetic_ecg(250, 30)
+    engine = HeartRateEngine(sample_rate=250)
+    feed(engine, times, values)
+    assert engine.bpm is not None and engine.metrics()['rmssd'] is not None
+
+    # Électrodes décollées : signal plat
+    t = times[-1]
+    flat = [t + (i + 1) / 250.0 for i in range(250)]
+    feed(engine, flat, [2000] * len(flat))
+    assert engine.bpm is not None  # 1 s : encore dans la tolérance
+    flat = [flat[-1] + (i + 1) / 250.0 for i in range(300 * 250)]
+    feed(engine, flat, [2000] * len(flat))
+    metrics = engine.metrics()
+    assert engine.bpm is None
+    assert metrics['bpm'] is None and metrics['rr_ms'] is None
+    assert metrics['rmssd'] is None and metrics['sdnn'] is None
+    assert metrics['rr_count'] == 0
+
+
+def test_bpm_goes_stale_without_ecg_samples():
+    times, values, _ = synthetic_ecg(250, 30)
+    engine = HeartRateEngine(sample_rate=250)
+    feed(engine, times, values)
+    engine.advance(times[-1] + 1.0)
+    assert engine.bpm is not None
+    engine.advance(times[-1] + 5.0)
+    assert engine.bpm is None
+
+
+def test_recovers_after_pause():
+    times, values, _ = synthetic_ecg(250, 30)
+    engine = HeartRateEngine(sample_rate=250)
+    feed(engine, times, values)
+    gap = times[-1] + 10.0 - T0
+    feed(engine, [t + gap for t in times], values)
+    assert abs(engine.bpm - 72) < 4
+
+
+def test_beats_dated_at_r_peaks():
+    times, values, beats = synthetic_ecg(250, 30)
+    engine = HeartRateEngine(sample_rate=250)
+    detected = []
+    for i in range(0, len(times), 25):
+        detected += engine.process(times[i:i + 25], values[i:i + 25])
+    assert len(detected) > 20
+    # Retard constant des filtres (< 60 ms) : RR exacts, chaque battement reste près de son R
+    delays = []
+    for t, rr in detected:
+        nearest = min(beats, key=lambda b: abs(b - t))
+        delays.append(t - nearest)
+        previous = max(b for b in beats if b < nearest)
+        assert abs(rr - (nearest - previous) * 1000.0) < 10
+    assert 0 <= min(delays) and max(delays) < 0.06
+    assert max(delays) - min(delays) < 0.01
@@ -0,0 +1,55 @@
+from src.services.lod import MinMaxPyramid, decimate
+from src.services.ringstore import TimeSeriesRing, from_epoch
+
+
+def _pyramid(samples, factor=4, levels=3, capacity=256):
+    raw = TimeSeriesRing('s', ('v',), retention_samples=capacity, spill_chunk=64)
+    pyramid = MinMaxPyramid(raw, factor=factor, levels=levels, capacity=capacity)
+    for i in range(samples):
+        pyramid.append(float(i), float(i % 7))
+    return pyramid
+
+
+def test_decimate_keeps_extrema_in_order():
+    times = list(range(8))
+    values = [0, 5, 1, 2, -3, 4, None, 1]
+    out_times, (out,) = decimate(times, [values], 4)
+    assert out_times == [0, 3, 4, 7]
+    assert out == [0, 5, -3, 4]  # Max avant min dans le second seau
+
+
+def test_decimate_short_series_untouched():
+    assert decimate([1, 2], [[None, 3]], 10) == ([1, 2], [[None, 3]])
+
+
+def test_levels_close_every_factor():
+    pyramid = _pyramid(70)
+    assert [ring.total for ring in pyramid.levels] == [17, 4, 1]
+    row = next(pyramid.levels[0].rows(0, 1))
+    assert row == (0.0, 3.0, 0.0, 3.0)
+    # Seau de niveau 1 : échantillons 0..15 -> min 0 (t=0), max 6 (t=6)
+    assert next(pyramid.levels[1].rows(0, 1)) == (0.0, 15.0, 0.0, 6.0)
+
+
+def test_window_raw_when_it_fits():
+    pyramid = _pyramid(40)
+    level, points = pyramid.window(10.0, 20.0, 50)
+    assert level == -1
+    assert [p['time'] for p in points] == [from_epoch(float(i)) for i in range(10, 20)]
+
+
+def test_window_picks_finest_fitting_level():
+    pyramid = _pyramid(200)
+    level, points = pyramid.window(0.0, 200.0, 120)
+    assert level == 0
+    assert len(points) <= 120
+    level, points = pyramid.window(0.0, 200.0, 30)
+    assert level == 1
+    assert min(p['v'] for p in points) == 0.0
+    assert max(p['v'] for p in points) == 6.0
+
+
+def test_window_includes_open_buckets():
+    pyramid = _pyramid(66)  # Deux échantillons dans le seau ouvert du niveau 0
+    _, points = pyramid.window(0.0, 100.0, 40)
+    assert points[-1]['time'] == from_epoch(65.0)
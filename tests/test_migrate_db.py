@@ -0,0 +1,68 @@
+import sqlite3
+import time
+from datetime import datetime, timezone
+
+import pytest
+
+from migrate_db import migrate_v2
+from src.services.schema import SCHEMA_VERSION, schema_version, to_epoch_ms, ts_expr
+from src.services.sensor_queries import parse_time
+
+TIMESTAMPS = (
+    '2026-03-01T12:00:00',             # Sans fuseau : UTC
+    '2026-03-01T12:00:00.250',
+    '2026-07-14T23:30:05.125Z',
+    '2026-07-15T01:30:05.125+02:00',
+)
+EXPECTED = (
+    int(datetime(2026, 3, 1, 12, 0, 0, tzinfo=timezone.utc).timestamp() * 1000),
+    int(datetime(2026, 3, 1, 12, 0, 0, tzinfo=timezone.utc).timestamp() * 1000) + 250,
+    int(datetime(2026, 7, 14, 23, 30, 5, tzinfo=timezone.utc).timestamp() * 1000) + 125,
+    int(datetime(2026, 7, 14, 23, 30, 5, tzinfo=timezone.utc).timestamp() * 1000) + 125,
+)
+
+
+@pytest.fixture
+def paris(monkeypatch):
+    """Fuseau local différent d'UTC : un mélange des conventions se verrait."""
+    monkeypatch.setenv('TZ', 'Europe/Paris')
+    time.tzset()
+    yield
+    monkeypatch.undo()
+    time.tzset()
+
+
+def _v1_db(path):
+    conn = sqlite3.connect(path)
+    conn.execute("CREATE TABLE sensor_data (id TEXT, type TEXT, timestamp TEXT, x REAL, y REAL, z REAL, raw TEXT)")
+    conn.executemany("INSERT INTO sensor_data (id, type, timestamp, x, y, z, raw) VALUES ('esp', 'accel', ?, 0, 0, 1, '{}')",
+                     [(ts,) for ts in TIMESTAMPS])
+    conn.commit()
+    return conn
+
+
+def test_naive_timestamps_are_utc(paris):
+    assert [to_epoch_ms(ts) for ts in TIMESTAMPS] == list(EXPECTED)
+    assert [parse_time(ts) for ts in TIMESTAMPS] == list(EXPECTED)
+
+
+def test_migration_round_trip_keeps_epoch(tmp_path, paris):
+    path = str(tmp_path / 'esp32_data.db')
+    conn = _v1_db(path)
+    assert schema_version(conn) == 1
+    v1 = [row[0] for row in conn.execute(f"SELECT {ts_expr(1)} FROM sensor_data ORDER BY rowid")]
+    conn.close()
+    assert v1 == list(EXPECTED)
+
+    migrate_v2(path, pause=0)
+
+    conn = sqlite3.connect(path)
+    assert schema_version(conn) == SCHEMA_VERSION
+    v2 = [row[0] for row in conn.execute(f"SELECT {ts_expr(SCHEMA_VERSION)} FROM sensor_data ORDER BY seq")]
+    # Même plage de temps avant et après migration
+    start, end = parse_time(TIMESTAMPS[0]), parse_time(TIMESTAMPS[1])
+    in_range = conn.execute(f"SELECT COUNT(*) FROM sensor_data WHERE {ts_expr(SCHEMA_VERSION)} BETWEEN ? AND ?",
+                            (start, end)).fetchone()[0]
+    conn.close()
+    assert v2 == v1
+    assert in_range == 2
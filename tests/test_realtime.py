@@ -0,0 +1,90 @@
+import json
+
+from src.api.realtime import Broker, select
+from src.services.events import SensorEvent
+
+
+def _event(rowid, **fields):
+    return SensorEvent('esp', 'multi', '2024-01-01T00:00:00', rowid=rowid, **fields)
+
+
+def _publish(broker, rowid, **fields):
+    source = _event(rowid, **fields)
+    return broker.publish(source.data, source=source)
+
+
+def _rowids(slots):
+    return [slot[4].rowid if slot[4] else None for slot in slots]
+
+
+def _relay(broker, rowid):
+    slots, _, _ = broker.read(broker.seek_rowid(rowid))
+    return _rowids(select(slots, None, after_rowid=rowid))
+
+
+def test_seq_and_frames():
+    broker = Broker(size=4)
+    assert broker.publish(b'{"a":1}') == 1
+    assert broker.publish(b'{"a":2}', event='anomaly') == 2
+    slots, cursor, missed = broker.read(1)
+    assert [slot[0] for slot in slots] == [1, 2] and cursor == 3 and missed == 0
+    assert slots[1][1] == b'id: 2\nevent: anomaly\ndata: {"a":2}\n\n'
+
+
+def test_gap_when_reader_falls_behind():
+    broker = Broker(size=4)
+    for i in range(10):
+        broker.publish(b'%d' % i)
+    assert broker.oldest() == 7
+    slots, cursor, missed = broker.read(2)
+    assert missed == 5 and [slot[0] for slot in slots] == [7, 8, 9, 10] and cursor == 11
+    slots, cursor, missed = broker.read(5, limit=2)
+    assert missed == 2 and slots == [] and cursor == 7
+
+
+def test_last_event_id_resume():
+    broker = Broker(size=8)
+    for i in range(5):
+        broker.publish(b'%d' % i)
+    assert broker.start_cursor('3') == 4
+    assert broker.start_cursor('99') == broker.start_cursor() == 1  # Inconnu : tout l'anneau
+    assert broker.start_cursor('x', backlog=2) == 4
+    assert broker.resume_cursor(None) is None
+
+
+def test_seek_rowid_in_order():
+    broker = Broker(size=16)
+    for rowid in (1, 2, 3, 4):
+        _publish(broker, rowid, bpm=60)
+    assert _relay(broker, 2) == [3, 4]
+    assert _relay(broker, 4) == []
+
+
+def test_seek_rowid_out_of_order_publish():
+    # Deux éditeurs : rowid attribués dans l'ordre, publiés dans le désordre
+    broker = Broker(size=16)
+    for rowid in (1, 3, 2, 5, 4, 6):
+        _publish(broker, rowid, bpm=60)
+    assert sorted(_relay(broker, 2)) == [3, 4, 5, 6]
+    assert sorted(_relay(broker, 4)) == [5, 6]
+    assert _relay(broker, 0) == [1, 3, 2, 5, 4, 6]
+
+
+def test_seek_rowid_keeps_events_without_rowid_after_snapshot():
+    broker = Broker(size=16)
+    broker.publish(b'{"old":1}')
+    _publish(broker, 1, bpm=60)
+    broker.publish(b'{"anomaly":1}')
+    _publish(broker, 2, bpm=61)
+    assert _relay(broker, 1) == [None, 2]
+    assert Broker(size=4).seek_rowid(10) == 1
+
+
+def test_select_channels_reencodes():
+    broker = Broker(size=8)
+    _publish(broker, 1, bpm=60, x=0.5, y=0.1, z=0.2)
+    _publish(broker, 2, bpm=61)
+    slots, _, _ = broker.read(1)
+    (only,) = select(slots, ('accel',))
+    assert only[0] == 1
+    assert 'bpm' not in json.loads(only[3]) and only[1].startswith(b'id: 1\n')
@@ -0,0 +1,70 @@
+import sqlite3
+
+import pytest
+
+from src.services.retention import RetentionManager, parse_ttls
+from src.services.rollups import create_rollup_tables
+from src.services.schema import create_v2
+from src.services.sqlite_writer import SqliteWriter
+
+DAY = 86400 * 1000
+NOW = 1_700_000_000_000
+
+
+@pytest.fixture
+def db(tmp_path):
+    path = str(tmp_path / 'data.db')
+    conn = sqlite3.connect(path)
+    create_v2(conn)
+    create_rollup_tables(conn)
+    rows = [(type_, NOW - age * DAY) for type_ in ('accel', 'ecg', 'bpm') for age in range(10)]
+    conn.executemany("INSERT INTO sensor_data (id, type, ts) VALUES ('esp', ?, ?)", rows)
+    conn.executemany("INSERT INTO sensor_rollup_1s VALUES ('esp', 'bpm', ?, 1, 0, 0, 0, 0)",
+                     [(NOW - age * DAY,) for age in range(5)])
+    conn.commit()
+    conn.close()
+    writer = SqliteWriter(path, batch_ms=1)
+    yield path, writer
+    writer.stop()
+
+
+def _count(path, sql):
+    conn = sqlite3.connect(path)
+    try:
+        return conn.execute(sql).fetchone()[0]
+    finally:
+        conn.close()
+
+
+def test_purge_by_type_in_chunks(db):
+    path, writer = db
+    statements = []
+    execute = writer.execute
+    writer.execute = lambda sql, params=(): statements.append(sql) or execute(sql, params)
+    manager = RetentionManager(writer, path, ttls=parse_ttls('accel=2.5,*=7'),
+                               rollup_ttls={'1s': 1.5}, chunk_size=3, vacuum_pages=0)
+    # accel : âges 3..9 (7 lignes) ; ecg et bpm : âges 8 et 9 (4 lignes) ; rollups : âges 2..4
+    assert manager.run_once(now_ms=NOW) == 7 + 4 + 3
+    assert len(statements) == 3 + 2 + 1  # ceil(7/3) + ceil(4/3) + ceil(3/3) blocs
+    assert _count(path, "SELECT COUNT(*) FROM sensor_data WHERE type = 'accel'") == 3
+    assert _count(path, "SELECT COUNT(*) FROM sensor_data WHERE type = 'ecg'") == 8
+    assert _count(path, "SELECT COUNT(*) FROM sensor_rollup_1s") == 2
+    assert manager.run_once(now_ms=NOW) == 0
+    assert manager.stats()['rows_deleted'] == 14
+
+
+def test_parse_ttls():
+    assert parse_ttls('accel=7, ecg=30 ,*=90,') == {'accel': 7.0, 'ecg': 30.0, '*': 90.0}
+    assert parse_ttls('') == {} and parse_ttls(None) == {}
+    assert parse_ttls('1h=30', allowed=('1s', '1m', '1h')) == {'1h': 30.0}
+
+
+@pytest.mark.parametrize('spec', ['accel', 'accel=x', 'accel=-1', '=3', 'accel=inf', 'ecg=nan'])
+def test_parse_ttls_rejects_bad_entries(spec):
+    with pytest.raises(ValueError):
+        parse_ttls(spec)
+
+
+def test_parse_ttls_rejects_unknown_resolution():
+    with pytest.raises(ValueError):
+        parse_ttls('1d=30', allowed=('1s', '1m', '1h'))
@@ -0,0 +1,81 @@
+import glob
+import math
+from array import array
+
+from src.services.ringstore import TimeSeriesRing, from_epoch, to_epoch
+
+
+def _spilled(directory, column='v'):
+    values = array('d')
+    for path in glob.glob(f'{directory}/*.{column}.f64'):
+        with open(path, 'rb') as f:
+            values.frombytes(f.read())
+    return list(values)
+
+
+def _fill(ring, start, stop):
+    for i in range(start, stop):
+        ring.append(float(i), float(i))
+
+
+def test_retention_and_absolute_indexes():
+    ring = TimeSeriesRing('t', ('v', 'w'), retention_samples=100, spill_chunk=64)
+    assert ring.capacity == 128
+    _fill(ring, 0, 300)
+    assert len(ring) == 128
+    assert ring.total == 300
+    assert ring.first_index == 172
+    assert list(ring.column('v', 290)) == [float(i) for i in range(290, 300)]
+    assert list(ring.column('v', 0, 175)) == [172.0, 173.0, 174.0]  # Plage évincée tronquée
+    assert ring.index_at(250.5) == 251
+
+
+def test_none_stored_as_nan():
+    ring = TimeSeriesRing('t', ('v', 'w'), retention_samples=64, spill_chunk=64)
+    ring.append(1.0, None, 2.0)
+    assert math.isnan(ring.column('v')[0])
+    assert ring.records() == [{'time': from_epoch(1.0), 'v': None, 'w': 2.0}]
+
+
+def test_retention_seconds():
+    ring = TimeSeriesRing('t', ('v',), retention_seconds=10, sample_rate=250, spill_chunk=1024)
+    assert ring.capacity == 3072
+
+
+def test_spill_keeps_every_evicted_sample(tmp_path):
+    ring = TimeSeriesRing('t', ('v',), retention_samples=256, spill_dir=str(tmp_path), spill_chunk=64)
+    _fill(ring, 0, 1000)
+    spilled = _spilled(tmp_path)
+    assert spilled == [float(i) for i in range(len(spilled))]
+    assert len(spilled) >= ring.first_index
+
+
+def test_grow_then_wrap_spills_without_gap(tmp_path):
+    for before in (100, 256, 300, 333, 1000):  # Agrandissement avant/après rotation, aligné ou non
+        directory = tmp_path / str(before)
+        ring = TimeSeriesRing('t', ('v',), retention_samples=256, spill_dir=str(directory), spill_chunk=64)
+        _fill(ring, 0, before)
+        first = ring.first_index
+        assert ring.grow(700)
+        assert ring.first_index == first
+        assert list(ring.column('v')) == [float(i) for i in range(first, before)]
+        _fill(ring, before, before + 3000)
+        # Disque + mémoire : chaque échantillon exactement une fois
+        spilled = _spilled(directory)
+        assert spilled == [float(i) for i in range(len(spilled))]
+        assert len(spilled) >= ring.first_index
+        assert ring.spilled == len(spilled)
+        assert list(ring.column('v')) == [float(i) for i in range(ring.first_index, before + 3000)]
+
+
+def test_grow_never_shrinks():
+    ring = TimeSeriesRing('t', ('v',), retention_samples=256, spill_chunk=64)
+    assert not ring.grow(100)
+    assert ring.capacity == 256
+
+
+def test_to_epoch():
+    assert to_epoch('1970-01-01T00:00:10Z') == 10.0
+    assert to_epoch(1_750_000_000_000) == 1_750_000_000.0
+    assert to_epoch(1_750_000_000) == 1_750_000_000.0
+    assert to_epoch('illisible', default=5.0) == 5.0
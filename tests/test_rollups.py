@@ -0,0 +1,71 @@
+import json
+import sqlite3
+
+import pytest
+
+from src.services.rollups import RollupEngine, create_rollup_tables, iter_rollup
+from src.services.sqlite_writer import SqliteWriter
+
+T0 = 1_700_000_000_000
+
+
+@pytest.fixture
+def engine(tmp_path):
+    path = str(tmp_path / 'rollups.db')
+    conn = sqlite3.connect(path)
+    create_rollup_tables(conn)
+    conn.commit()
+    conn.close()
+    writer = SqliteWriter(path, batch_ms=1)
+    engine = RollupEngine(writer, flush_interval=3600)
+    yield engine
+    writer.stop()
+
+
+def _buckets(engine, resolution, **filters):
+    engine.writer.wait(timeout=10)
+    conn = sqlite3.connect(engine.writer.path)
+    try:
+        return [json.loads(line) for line in iter_rollup(conn, resolution, **filters)]
+    finally:
+        conn.close()
+
+
+def test_closed_buckets_are_written(engine):
+    for i, bpm in enumerate((60, 70, 80)):
+        engine.add('esp', T0 + i * 300, bpm=bpm)
+    engine.add('esp', T0 + 1000, bpm=90)  # Ferme le seau 1 s
+    (bucket,) = _buckets(engine, '1s', metric='bpm')
+    assert bucket['bucket'] == T0 - T0 % 1000
+    assert (bucket['count'], bucket['min'], bucket['max'], bucket['mean']) == (3, 60, 80, 70)
+    assert bucket['variance'] == pytest.approx(200 / 3)
+
+
+def test_flush_deltas_are_additive(engine):
+    engine.add('esp', T0, bpm=60)
+    engine.flush()
+    engine.add('esp', T0 + 10, bpm=100)
+    engine.flush()
+    engine.flush()  # Seau vide : rien d'écrit
+    (bucket,) = _buckets(engine, '1m', metric='bpm')
+    assert (bucket['count'], bucket['min'], bucket['max'], bucket['mean']) == (2, 60, 100, 80)
+
+
+def test_out_of_order_sample_upserts_into_its_bucket(engine):
+    engine.add('esp', T0, bpm=60)
+    engine.add('esp', T0 + 2000, bpm=70)
+    engine.add('esp', T0 + 100, bpm=50)  # En retard : rouvre le premier seau
+    engine.flush()
+    buckets = _buckets(engine, '1s', metric='bpm')
+    assert [(b['count'], b['min']) for b in buckets] == [(2, 50), (1, 70)]
+
+
+def test_accel_norm_and_filters(engine):
+    engine.add('a', T0, x=3.0, y=4.0, z=0.0)
+    engine.add('b', T0, bpm=75, x=None, y=1.0, z=1.0)
+    engine.add('c', T0)  # Rien à agréger
+    engine.flush()
+    assert [(b['device'], b['metric'], b['max']) for b in _buckets(engine, '1h')] == [
+        ('a', 'accel', 5.0), ('b', 'bpm', 75.0)]
+    assert _buckets(engine, '1h', device='b', metric='accel') == []
+    assert _buckets(engine, '1h', start=T0 + 3600 * 1000) == []
@@ -0,0 +1,83 @@
+import json
+import sqlite3
+
+import pytest
+
+from src.services.schema import create_v2
+from src.services.sensor_queries import (
+    iter_aggregate, iter_range, parse_bucket_cursor, parse_range_cursor, parse_time,
+)
+
+T0 = 1_700_000_000_000
+
+
+@pytest.fixture
+def conn():
+    conn = sqlite3.connect(':memory:')
+    create_v2(conn)
+    rows = []
+    for i in range(25):
+        # Deux lignes par milliseconde : le curseur doit départager par seq
+        rows.append(('esp', 'sensor', T0 + (i // 2) * 1000, i, 0.0, 0.0, 60 + i))
+    conn.executemany("INSERT INTO sensor_data (id, type, ts, x, y, z, bpm) VALUES (?, ?, ?, ?, ?, ?, ?)", rows)
+    return conn
+
+
+def _lines(generator):
+    return [json.loads(line) for line in generator]
+
+
+def _pages(fetch):
+    cursor, seen = None, []
+    while True:
+        lines = _lines(fetch(cursor))
+        if lines and 'next_cursor' in lines[-1]:
+            cursor = lines.pop()['next_cursor']
+            seen.append(lines)
+        else:
+            seen.append(lines)
+            return seen
+
+
+def test_range_cursor_pages_without_gaps_or_duplicates(conn):
+    pages = _pages(lambda cursor: iter_range(conn, cursor=parse_range_cursor(cursor), limit=4,
+                                             fields=('x',)))
+    assert [len(page) for page in pages] == [4] * 6 + [1]
+    assert [row['x'] for page in pages for row in page] == list(range(25))
+
+
+def test_range_filters(conn):
+    rows = _lines(iter_range(conn, device='esp', start=T0 + 2000, end=T0 + 4000, fields=('bpm',)))
+    assert [row['bpm'] for row in rows] == [64, 65, 66, 67]
+    assert _lines(iter_range(conn, device='other')) == []
+
+
+def test_aggregate_cursor_pages(conn):
+    pages = _pages(lambda cursor: iter_aggregate(conn, 4, cursor=parse_bucket_cursor(cursor),
+                                                 limit=2, fields=('bpm',)))
+    buckets = [bucket for page in pages for bucket in page]
+    assert [b['count'] for b in buckets] == [8, 8, 8, 1]
+    assert buckets[0]['bpm'] == {'min': 60, 'max': 67, 'mean': 63.5}
+    assert len({b['bucket'] for b in buckets}) == 4
+
+
+@pytest.mark.parametrize('value', ['abc', '12', '1:2:3', '1:x'])
+def test_bad_range_cursor(value):
+    with pytest.raises(ValueError):
+        parse_range_cursor(value)
+
+
+def test_cursor_parsing():
+    assert parse_range_cursor(None) is None and parse_range_cursor('') is None
+    assert parse_range_cursor('17:3') == (17, 3)
+    assert parse_bucket_cursor('1200') == 1200
+    with pytest.raises(ValueError):
+        parse_bucket_cursor('1:2')
+
+
+def test_parse_time():
+    assert parse_time('1700000000') == T0
+    assert parse_time(str(T0)) == T0
+    assert parse_time('2023-11-14T22:13:20') == T0  # Sans fuseau : UTC
+    with pytest.raises(ValueError):
+        parse_time('hier')
@@ -0,0 +1,59 @@
+import sqlite3
+import threading
+
+from src.services.sqlite_writer import SqliteWriter
+
+
+def _create(path):
+    conn = sqlite3.connect(path)
+    conn.execute("CREATE TABLE sensor_data (value INTEGER, producer INTEGER)")
+    conn.commit()
+    conn.close()
+
+
+def test_concurrent_inserts_commit_in_rowid_order(tmp_path):
+    path = str(tmp_path / 'events.db')
+    _create(path)
+    # File minuscule : les producteurs se bloquent sur une file pleine pendant les écritures
+    writer = SqliteWriter(path, batch_rows=7, batch_ms=1, queue_size=3)
+    applied = []
+    apply = writer._apply
+
+    def record(conn, items):
+        applied.extend(params[0] for _, key, params in items if not isinstance(key, str))
+        apply(conn, items)
+
+    writer._apply = record
+    producers, per_producer = 8, 200
+
+    def produce(n):
+        for i in range(per_producer):
+            writer.insert('sensor_data', ('value', 'producer'), (i, n))
+
+    threads = [threading.Thread(target=produce, args=(n,)) for n in range(producers)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join(timeout=30)
+    assert not any(thread.is_alive() for thread in threads), "producteurs bloqués (interblocage)"
+    assert writer.wait(timeout=30)
+    writer.stop()
+
+    total = producers * per_producer
+    assert applied == list(range(1, total + 1))
+    conn = sqlite3.connect(path)
+    assert conn.execute("SELECT COUNT(*), MAX(rowid) FROM sensor_data").fetchone() == (total, total)
+    conn.close()
+
+
+def test_execute_wait_with_full_queue(tmp_path):
+    path = str(tmp_path / 'events.db')
+    _create(path)
+    writer = SqliteWriter(path, batch_rows=2, batch_ms=1, queue_size=1)
+    for i in range(50):
+        writer.execute("INSERT INTO sensor_data (value, producer) VALUES (?, 0)", (i,))
+    assert writer.wait(timeout=10)
+    writer.stop()
+    conn = sqlite3.connect(path)
+    assert conn.execute("SELECT COUNT(*) FROM sensor_data").fetchone()[0] == 50
+    conn.close()
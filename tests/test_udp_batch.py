@@ -0,0 +1,46 @@
+import socket
+
+from src.services import udp_batch
+from src.services.udp_batch import IngestCounters, drain
+
+
+def test_drain_reads_pending_datagrams_in_one_batch():
+    server = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+    server.bind(('127.0.0.1', 0))
+    client = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+    for i in range(10):
+        client.sendto(b'%d' % i, server.getsockname())
+    server.settimeout(1.0)
+    batch = drain(server, 4)
+    assert [data for data, _ in batch] == [b'0', b'1', b'2', b'3']
+    assert server.gettimeout() == 1.0
+    assert len(drain(server, 64)) == 6
+    server.close()
+    client.close()
+
+
+def test_counters_batches():
+    counters = IngestCounters(max_batch=4)
+    for size in (1, 4, 3):
+        counters.record_batch(size)
+    stats = counters.as_dict()
+    assert stats['udp_batches'] == 3
+    assert stats['udp_batch_max'] == 4
+    assert stats['udp_batch_full'] == 1
+    assert stats['udp_batch_avg'] == 2.67
+
+
+def test_kernel_drops_counted_from_bind(monkeypatch):
+    drops = iter([0, 5, 9])
+    monkeypatch.setattr(udp_batch, 'kernel_drops', lambda port: next(drops))
+    counters = IngestCounters(max_batch=4)
+    counters.start(3333)                          # Juste après le bind
+    assert counters.update_kernel_drops(3333) == 5  # Pertes avant le premier lot comprises
+    assert counters.update_kernel_drops(3333) == 9
+
+
+def test_kernel_drops_without_proc(monkeypatch):
+    monkeypatch.setattr(udp_batch, 'kernel_drops', lambda port: None)
+    counters = IngestCounters(max_batch=4)
+    counters.start(3333)
+    assert counters.update_kernel_drops(3333) == 0
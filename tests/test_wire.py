@@ -0,0 +1,66 @@
+from datetime import datetime
+
+import pytest
+
+from src.services.wire import (
+    HEADER_SIZE, SAMPLE_SIZE, SequenceTracker, decode_frame, encode_frame, is_binary,
+)
+
+
+def test_round_trip():
+    frame = encode_frame(7, 42, [(512, 0.0, -1.0, 0.25), (None, 0.001, 0.0, 1.0)],
+                         t0_ms=1_700_000_000_000, period_us=4000, bpm=72.5, alert=True,
+                         bpm_valid=True, signal_quality=1.0,
+                         anomaly_type='FALL_CRITICAL', anomaly_severity='CRITICAL')
+    assert is_binary(frame) and not is_binary(b'{"ecg": 1}')
+    assert len(frame) == HEADER_SIZE + 2 * SAMPLE_SIZE
+    first, second = decode_frame(frame)
+    assert first['id'] == '7' and first['seq'] == 42
+    assert first['ecg'] == 512 and 'ecg' not in second
+    assert (first['x'], first['y'], first['z']) == (0.0, -1.0, 0.25)
+    assert second['x'] == 0.001
+    assert first['bpm'] == 72.5 and first['alert'] and first['bpm_valid']
+    assert not first['signal_valid'] and first['signal_quality'] == 1.0
+    assert first['anomaly_type'] == 'FALL_CRITICAL'
+    assert first['anomaly_severity'] == 'CRITICAL'
+    t0 = datetime.fromisoformat(first['timestamp'])
+    t1 = datetime.fromisoformat(second['timestamp'])
+    assert (t1 - t0).total_seconds() == pytest.approx(0.004)
+
+
+def test_invalid_frames():
+    frame = encode_frame(1, 1, [(1, 0, 0, 0)] * 3)
+    with pytest.raises(ValueError):
+        decode_frame(frame[:HEADER_SIZE - 1])
+    with pytest.raises(ValueError):
+        decode_frame(frame[:-1])
+    with pytest.raises(ValueError):
+        decode_frame(b'\x00' + frame[1:])
+    with pytest.raises(ValueError):
+        decode_frame(frame[:1] + b'\x02' + frame[2:])
+
+
+def test_sequence_gaps_and_duplicates():
+    tracker = SequenceTracker()
+    assert [tracker.update(seq) for seq in (10, 11, 11, 14, 15, None)] == [0, 0, 0, 2, 0, 0]
+    assert tracker.lost == 2
+    assert tracker.frames == 4
+
+
+def test_sequence_late_frame_and_wraparound():
+    tracker = SequenceTracker()
+    tracker.update(100)
+    assert tracker.update(98) == 0
+    assert tracker.out_of_order == 1 and tracker.last_seq == 100
+    tracker = SequenceTracker()
+    tracker.update(0xFFFFFFFE)
+    assert tracker.update(1) == 2  # 0xFFFFFFFF et 0 manquantes
+    assert tracker.lost == 2
+
+
+def test_sequence_device_restart():
+    tracker = SequenceTracker()
+    tracker.update(5000)
+    assert tracker.update(0) == 0
+    assert tracker.lost == 0 and tracker.out_of_order == 0
+    assert tracker.update(2) == 1